@@ -19,6 +19,8 @@ from strelka_ui.blueprints.strelka import strelka
 from strelka_ui.blueprints.ui import ui
 from strelka_ui.models import db
 from strelka_ui.api import api_blueprint
+from strelka_ui.services import json_codec
+from strelka_ui.services.jobs import fail_interrupted_jobs
 
 
 def create_app() -> Flask:
@@ -45,6 +47,12 @@ def create_app() -> Flask:
 
     app.secret_key = app.config["SECRET_KEY"]
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Scan results are large JSON documents, so encode them with orjson when available
+    app.config.setdefault(
+        "SQLALCHEMY_ENGINE_OPTIONS",
+        {"json_serializer": json_codec.dumps, "json_deserializer": json_codec.loads},
+    )
+    app.json = json_codec.FastJSONProvider(app)
     CORS(app, supports_credentials=True)
     db.init_app(app)
 
@@ -71,7 +79,19 @@ if __name__ == "__main__":
 
     main_app: Flask = create_app()
 
-    serve(TransLogger(main_app, setup_console_handler=False), host="0.0.0.0", port=8080)
+    # Jobs run in the process that accepted them, so any left pending were
+    # interrupted by the last shutdown
+    with main_app.app_context():
+        fail_interrupted_jobs()
+
+    # Request lookahead lets waitress notice clients that disconnect mid-request,
+    # so abandoned scans can be cancelled
+    serve(
+        TransLogger(main_app, setup_console_handler=False),
+        host="0.0.0.0",
+        port=8080,
+        channel_request_lookahead=1,
+    )
 
     # uncomment below for local flask app development with hot reloading
     # main_app.run(host="0.0.0.0", port=80, threaded=True)
@@ -19,7 +19,10 @@ api.add_namespace(status_ns)
 
 # Define data models for request/response documentation
 file_enrichment_model = api.model('FileEnrichment', {
-    'virustotal': fields.Integer(description='VirusTotal detection count (-1 if not available)', example=-1),
+    'virustotal': fields.Integer(description='VirusTotal detection count (-1 if not available, -3 if over the lookup limit, -4 while the lookup is pending)', example=-1),
+    'risk': fields.Raw(description='Risk score used to choose files for VirusTotal lookups, with the value of each signal', example={
+        "score": 5.41, "signals": {"yara": 0.333, "unsigned_pe": 1.0, "entropy": 0.45, "mimetype": 1.0, "depth": 0.5, "size": 0.71}
+    }),
 })
 
 file_flavors_model = api.model('FileFlavors', {
@@ -110,9 +113,13 @@ upload_response_model = api.model('UploadResponse', {
     'meta': fields.Nested(api.model('UploadMeta', {
         'file_size': fields.Integer(description='File size in bytes', example=375),
         'iocs': fields.List(fields.Raw, description='List of IOCs', example=[]),
-        'vt_positives': fields.List(fields.Raw, description='VirusTotal positives', example=[])
+        'vt_positives': fields.List(fields.Raw, description='VirusTotal positives', example=[]),
+        'virustotal_pending': fields.Boolean(description='Present when VirusTotal lookups will complete in the background', example=True)
     }), description='Submission metadata'),
     'original_submission_id': fields.String(description='Original submission ID', example='d34db33f-d34d-b33f-d34d-b33fd34db33f'),
+    'members': fields.List(fields.Raw, description='For password-protected archives, the file_id or error of every extracted member', example=[
+        {"file_name": "dropper.exe", "status_code": 200, "file_id": "d34db33f-d34d-b33f-d34d-b33fd34db33f"}
+    ]),
     'response': fields.List(fields.Raw, description='Analysis results (full scan result objects)', example=[
         {
             "enrichment": {
@@ -270,6 +277,95 @@ status_response_model = api.model('StatusResponse', {
     'message': fields.String(description='Status message', example='Strelka is reachable'),
 })
 
+batch_manifest_model = api.model('BatchManifest', {
+    'submitted': fields.Integer(description='Number of files in the request', example=2),
+    'succeeded': fields.Integer(description='Number of files scanned and saved', example=1),
+    'failed': fields.Integer(description='Number of files that failed', example=1),
+    'files': fields.List(fields.Raw, description='Per-file status, in request order', example=[
+        {"file_name": "sample1.exe", "status_code": 200, "file_id": "d34db33f-d34d-b33f-d34d-b33fd34db33f"},
+        {"file_name": "sample2.dll", "status_code": 415, "error": "Failed to submit sample2.dll to strelka."}
+    ]),
+})
+
+hash_import_request_model = api.model('HashImportRequest', {
+    'hashes': fields.List(fields.String, required=True, description='MD5, SHA1 or SHA256 hashes to import',
+                          example=['5da8c98136d98dfec4716edd79c7145f', '3395856ce81f2b7382dee72602f798b642f14140']),
+    'description': fields.String(description='Description applied to every file', example='Threat intel pull'),
+})
+
+hash_import_accepted_model = api.model('HashImportAccepted', {
+    'job_id': fields.String(description='Job identifier', example='d34db33f-d34d-b33f-d34d-b33fd34db33f'),
+    'status': fields.String(description='Job status', example='queued'),
+    'status_url': fields.String(description='URL to poll for the job', example='/api/strelka/jobs/d34db33f-d34d-b33f-d34d-b33fd34db33f'),
+    'accepted': fields.Integer(description='Number of distinct valid hashes queued', example=2),
+    'rejected': fields.List(fields.Raw, description='Malformed hashes, which are not imported', example=[
+        {"hash": "xyz", "status_code": 400, "error": "Hash must be a valid MD5 (32), SHA1 (40), or SHA256 (64) characters long."}
+    ]),
+})
+
+submission_job_model = api.model('SubmissionJob', {
+    'job_id': fields.String(description='Job identifier', example='d34db33f-d34d-b33f-d34d-b33fd34db33f'),
+    'status': fields.String(description='queued, running, succeeded or failed', example='succeeded'),
+    'file_name': fields.String(description='Submitted filename', example='suspicious_file.exe'),
+    'submitted_type': fields.String(description='Submission type', example='api'),
+    'file_id': fields.String(description='Resulting submission ID', example='b33fd34d-d34d-b33f-d34d-b33fd34db33f'),
+    'status_code': fields.Integer(description='Status code of the equivalent synchronous upload', example=200),
+    'result': fields.Raw(description='Upload response body, or error details'),
+    'created_at': fields.String(description='When the job was accepted'),
+    'started_at': fields.String(description='When a worker picked the job up'),
+    'finished_at': fields.String(description='When the job completed'),
+})
+
+strelka_channel_model = api.model('StrelkaChannel', {
+    'index': fields.Integer(description='Channel position in the pool', example=0),
+    'connected': fields.Boolean(description='Whether the channel is currently open', example=True),
+    'in_flight': fields.Integer(description='ScanFile calls currently using the channel', example=1),
+    'calls': fields.Integer(description='Total ScanFile calls made over the channel', example=42),
+    'resets': fields.Integer(description='Times the channel was rebuilt after an error', example=0),
+})
+strelka_aio_client_model = api.model('StrelkaAioClient', {
+    'channels': fields.Integer(description='grpc.aio channels opened to the frontend', example=2),
+    'in_flight': fields.Integer(description='ScanFile calls running on the event loop', example=120),
+    'calls': fields.Integer(description='Total ScanFile calls made by the asynchronous client', example=4200),
+})
+strelka_client_model = api.model('StrelkaClient', {
+    'target': fields.String(description='Strelka frontend host:port', example='strelka_frontend_1:57314'),
+    'secure': fields.Boolean(description='Whether TLS is used', example=False),
+    'in_flight': fields.Integer(description='ScanFile calls in flight across all channels', example=1),
+    'channels': fields.List(fields.Nested(strelka_channel_model), description='Per-channel counters'),
+    'aio': fields.Nested(
+        strelka_aio_client_model,
+        description='Asynchronous client counters, once STRELKA_CLIENT_MODE=aio has been used',
+        skip_none=True,
+    ),
+})
+strelka_endpoint_model = api.model('StrelkaEndpoint', {
+    'target': fields.String(description='Strelka frontend host:port', example='strelka_frontend_1:57314'),
+    'weight': fields.Integer(description='Relative share of traffic', example=1),
+    'state': fields.String(description='healthy, ejected or probing', example='healthy'),
+    'in_flight': fields.Integer(description='ScanFile calls in flight to the frontend', example=1),
+    'calls': fields.Integer(description='Total ScanFile calls made to the frontend', example=42),
+    'failures': fields.Integer(description='Calls that failed because of the frontend', example=0),
+    'consecutive_failures': fields.Integer(description='Failures since the last success', example=0),
+    'ejections': fields.Integer(description='Times the frontend was ejected', example=0),
+    'latency_ms': fields.Float(description='Moving average call latency in milliseconds', example=812.5),
+    'last_latency_ms': fields.Float(description='Latency of the last successful call', example=790.1),
+    'client': fields.Nested(strelka_client_model, description='Channel pool counters'),
+})
+strelka_balancer_model = api.model('StrelkaBalancer', {
+    'name': fields.String(description='Balancer name', example='default'),
+    'policy': fields.String(description='Balancing policy', example='least_outstanding'),
+    'endpoints': fields.List(fields.Nested(strelka_endpoint_model), description='Per-frontend counters'),
+})
+metrics_response_model = api.model('MetricsResponse', {
+    'strelka': fields.List(fields.Nested(strelka_balancer_model), description='Strelka frontend balancers'),
+    'jobs': fields.Raw(description='Asynchronous submission executor counters'),
+    'admission': fields.Raw(description='Submission admission limits and counters'),
+    'coalescing': fields.Raw(description='Scans shared between concurrent identical uploads'),
+    'routing': fields.Raw(description='Submissions routed to each Strelka cluster'),
+    'virustotal': fields.Raw(description='VirusTotal lookup counters, including HTTP client latency, the shared rate limiter, cluster-wide quota, verdict cache hit rate, widget URL cache hits and misses, and deferred enrichment executor'),
+})
+
 vt_api_key_status_model = api.model('VTApiKeyStatus', {
     'apiKeyAvailable': fields.Boolean(description='Whether the API key is available', example=True)
 })
@@ -284,6 +380,38 @@ upload_parser.add_argument('password', type=str, location='form', required=False
                           help='Password for encrypted files (optional)')
 upload_parser.add_argument('hash', type=str, location='form', required=False,
                           help='Hash to analyze (alternative to file upload)')
+upload_parser.add_argument('async', type=bool, location='args', required=False,
+                          help='Return 202 with a job ID and scan in the background (optional)')
+upload_parser.add_argument('bypass_gatekeeper', type=bool, location='args', required=False,
+                          help='Always scan, ignoring cached and recently reused results (optional)')
+upload_parser.add_argument('timeout', type=float, location='args', required=False,
+                          help='Seconds to allow for scanning, up to STRELKA_SCAN_TIMEOUT (optional)')
+
+# Streaming upload parser for multipart/form-data
+stream_upload_parser = reqparse.RequestParser()
+stream_upload_parser.add_argument('file', location='files', type='file', required=True,
+                                 help='File to analyze')
+stream_upload_parser.add_argument('description', type=str, location='form', required=False,
+                                 help='Description for the file submission')
+stream_upload_parser.add_argument('password', type=str, location='form', required=False,
+                                 help='Password for an encrypted archive holding a single file (optional)')
+stream_upload_parser.add_argument('bypass_gatekeeper', type=bool, location='args', required=False,
+                                 help='Always scan, ignoring cached and recently reused results (optional)')
+stream_upload_parser.add_argument('timeout', type=float, location='args', required=False,
+                                 help='Seconds to allow for scanning, up to STRELKA_SCAN_TIMEOUT (optional)')
+
+# Batch upload parser for multipart/form-data
+batch_upload_parser = reqparse.RequestParser()
+batch_upload_parser.add_argument('file', location='files', type='file', required=True, action='append',
+                                help='Files to analyze (repeat the field for each file)')
+batch_upload_parser.add_argument('description', type=str, location='form', required=False,
+                                help='Description applied to every file in the batch')
+batch_upload_parser.add_argument('async', type=bool, location='args', required=False,
+                                help='Return 202 with a job ID and scan in the background (optional)')
+batch_upload_parser.add_argument('bypass_gatekeeper', type=bool, location='args', required=False,
+                                help='Always scan, ignoring cached and recently reused results (optional)')
+batch_upload_parser.add_argument('timeout', type=float, location='args', required=False,
+                                help='Seconds to allow for scanning, up to STRELKA_SCAN_TIMEOUT (optional)')
 
 # Strelka namespace resources
 @strelka_ns.route('/upload')
@@ -294,8 +422,11 @@ class StrelkaUpload(Resource):
         security='apikey',
         responses={
             200: ('File submitted successfully', upload_response_model),
+            202: 'Accepted for asynchronous processing (async=true)',
             400: 'Bad request or validation error',
             413: 'File too large',
+            429: 'Too many submissions in progress; retry after the Retry-After header',
+            504: 'Scan did not finish within its timeout, or VirusTotal did not prepare a hash in VIRUSTOTAL_ZIP_SYNC_MAX_WAIT (use async=true)',
             500: 'Internal server error'
         }
     )
@@ -319,6 +450,10 @@ class StrelkaUpload(Resource):
                  }}'
         ```
         
+        VirusTotal can take minutes to prepare a download, so hashes are best
+        submitted with `async=true`: the response is then 202 with a
+        `status_url` to poll until the job has succeeded or failed.
+        
         **Python Example:**
         ```python
         import requests
@@ -351,6 +486,118 @@ class StrelkaUpload(Resource):
         """
         pass
 
+@strelka_ns.route('/upload/batch')
+class StrelkaBatchUpload(Resource):
+    @strelka_ns.expect(batch_upload_parser)
+    @strelka_ns.doc(
+        description='Submit many files in one request. Files are scanned concurrently and saved in a single transaction.',
+        security='apikey',
+        responses={
+            200: ('Batch processed; see the per-file manifest', batch_manifest_model),
+            202: 'Accepted for asynchronous processing (async=true)',
+            400: 'No files, or too many files, in the request',
+            401: 'Authentication required',
+            429: 'Too many submissions in progress; retry after the Retry-After header'
+        }
+    )
+    def post(self):
+        """Submit a batch of files for analysis
+
+        Repeat the `file` field once per file. Each file gets its own submission,
+        and the response lists every file's `file_id`, or the error that stopped it.
+
+        **cURL Example:**
+        ```bash
+        curl -X POST "http://your-server/api/strelka/upload/batch" -H "X-API-KEY: your-api-key-here" -F "file=@sample1.exe" -F "file=@sample2.dll" -F "description=Nightly backfill"
+        ```
+        """
+        pass
+
+@strelka_ns.route('/upload/hashes')
+class StrelkaHashImport(Resource):
+    @strelka_ns.expect(hash_import_request_model)
+    @strelka_ns.doc(
+        description='Import many files from VirusTotal by hash. Files are downloaded in batches and scanned in the background.',
+        security='apikey',
+        responses={
+            202: ('Accepted; poll the job for the per-hash manifest', hash_import_accepted_model),
+            400: 'No VirusTotal API key, no valid hashes, or too many hashes',
+            401: 'Authentication required',
+            503: 'Submission queue is full; retry after the Retry-After header'
+        }
+    )
+    def post(self):
+        """Import files from VirusTotal by hash
+
+        Hashes are requested from VirusTotal VIRUSTOTAL_ZIP_BATCH_SIZE at a time.
+        Once the job has succeeded, its `result` lists every hash, in request
+        order, with the `file_id` of its submission or the error that stopped it,
+        in the same form as the batch upload manifest.
+
+        **cURL Example:**
+        ```bash
+        curl -X POST "http://your-server/api/strelka/upload/hashes" -H "X-API-KEY: your-api-key-here" -H "Content-Type: application/json" -d '{{"hashes": ["5da8c98136d98dfec4716edd79c7145f"], "description": "Threat intel pull"}}'
+        ```
+        """
+        pass
+
+@strelka_ns.route('/upload/stream')
+class StrelkaStreamUpload(Resource):
+    @strelka_ns.expect(stream_upload_parser)
+    @strelka_ns.doc(
+        description='Submit a file to Strelka and receive its events as they are produced, as newline-delimited JSON.',
+        security='apikey',
+        responses={
+            200: 'Stream of event lines, ending with a result or error line',
+            400: 'Bad request or validation error',
+            401: 'Authentication required',
+            429: 'Too many submissions in progress; retry after the Retry-After header'
+        }
+    )
+    def post(self):
+        """Submit a file and stream the analysis
+
+        The response is `application/x-ndjson`. Each Strelka event is sent as an
+        `{"event": ...}` line as soon as it arrives. The last line is either
+        `{"result": {"file_id": ..., "meta": ...}}` once the submission is saved,
+        or an error with its `status_code`, as the scan may fail after the
+        stream has started.
+
+        **cURL Example:**
+        ```bash
+        curl -N -X POST "http://your-server/api/strelka/upload/stream" -H "X-API-KEY: your-api-key-here" -F "file=@archive.zip" -F "description=Large archive"
+        ```
+        """
+        pass
+
+@strelka_ns.route('/jobs/<string:job_id>')
+class StrelkaJob(Resource):
+    @strelka_ns.doc(
+        description='Retrieve the status and result of an asynchronous submission',
+        security='apikey',
+        params={'job_id': 'Job ID returned by /upload?async=true (UUID format)'},
+        responses={
+            200: ('Job retrieved successfully', submission_job_model),
+            401: 'Authentication required',
+            404: 'Job not found'
+        }
+    )
+    def get(self, job_id):
+        """Get the status of an asynchronous submission
+
+        Uploads sent with `async=true` (query parameter, form field or JSON key)
+        return `202` with a job ID instead of waiting for the scan. Poll this
+        endpoint until `status` is `succeeded` or `failed`. Once succeeded,
+        `result` holds the same body the synchronous upload would have returned.
+
+        **cURL Example:**
+        ```bash
+        curl -X POST "http://your-server/api/strelka/upload?async=true" -H "X-API-KEY: your-api-key-here" -F "file=@suspicious_file.exe" -F "description=Queued sample"
+        curl -X GET "http://your-server/api/strelka/jobs/d34db33f-d34d-b33f-d34d-b33fd34db33f" -H "X-API-KEY: your-api-key-here"
+        ```
+        """
+        pass
+
 @strelka_ns.route('/scans/stats')
 class StrelkaScanStats(Resource):
     @strelka_ns.doc(
@@ -511,6 +758,8 @@ class StrelkaResubmit(Resource):
             200: ('File resubmitted successfully', upload_response_model),
             401: 'Authentication required',
             404: 'Original submission not found',
+            429: 'Too many submissions in progress; retry after the Retry-After header',
+            504: 'Scan did not finish within its timeout',
             500: 'Internal server error'
         }
     )
@@ -603,6 +852,30 @@ class StrelkaDatabaseStatus(Resource):
         """
         pass
 
+@strelka_ns.route('/status/metrics')
+class StrelkaMetrics(Resource):
+    @strelka_ns.doc(
+        description='Runtime counters for the shared Strelka and enrichment clients',
+        security='apikey',
+        responses={
+            200: ('Metrics retrieved successfully', metrics_response_model),
+            401: 'Authentication required'
+        }
+    )
+    def get(self):
+        """Get runtime client metrics
+
+        Returns counters for the clients held by the serving process, such as
+        the in-flight calls on each pooled Strelka gRPC channel. Useful for
+        sizing pools and limits.
+
+        **cURL Example:**
+        ```bash
+        curl -X GET "http://your-server/api/strelka/status/metrics" -H "X-API-KEY: your-api-key-here"
+        ```
+        """
+        pass
+
 @strelka_ns.route('/check_vt_api_key')
 class StrelkaCheckVTAPIKey(Resource):
     @strelka_ns.doc(
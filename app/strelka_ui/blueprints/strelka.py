@@ -1,80 +1,73 @@
 import datetime
 import logging
 import json
-import os
+import re
 from collections import defaultdict
 
-from typing import Dict, Tuple, Union
-
-from flask import Blueprint, jsonify, request, session, Response
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from flask import (
+    Blueprint,
+    Response,
+    after_this_request,
+    current_app,
+    jsonify,
+    request,
+    session,
+    stream_with_context,
+    url_for,
+)
 from sqlalchemy import or_, desc, asc, func, case, cast, String
 from sqlalchemy.orm import joinedload, defer
 
 from strelka_ui.database import db
-from strelka_ui.models import FileSubmission, User, get_request_id
+from strelka_ui.models import FileSubmission, SubmissionJob, User
+from strelka_ui.services.admission import (
+    BULK_LANE,
+    RESUBMISSION_LANE,
+    admission_required,
+    get_admission_stats,
+)
 from strelka_ui.services.auth import auth_required
+from strelka_ui.services.deadline import ScanDeadline, cancel_on_disconnect, get_scan_deadline
 from strelka_ui.services.files import (
     decrypt_file,
     check_file_size,
-    convert_bytesio_to_filestorage,
+    spool_file,
+)
+from strelka_ui.services import json_codec
+from strelka_ui.services.jobs import JobQueueFull, enqueue_submission_job, get_job_stats
+from strelka_ui.services.routing import get_routing_stats
+from strelka_ui.services.strelka import get_db_status, get_frontend_status
+from strelka_ui.services.s3 import is_s3_enabled, download_file, is_file_expired
+from strelka_ui.services.submissions import (
+    download_virustotal_files,
+    get_coalescing_stats,
+    get_enrichment_stats,
+    process_batch,
+    process_submission,
+    process_submissions,
+    process_virustotal_import,
+    process_virustotal_submission,
+    stream_submission,
 )
-from strelka_ui.services.strelka import get_db_status, get_frontend_status, submit_data
-from strelka_ui.services.s3 import upload_file, calculate_expires_at, is_s3_enabled, download_file, is_file_expired
 from strelka_ui.services.virustotal import (
-    get_virustotal_positives,
-    create_vt_zip_and_download,
+    VirusTotalZipTimeout,
+    get_virustotal_stats,
     get_virustotal_widget_url,
 )
 from strelka_ui.services.insights import get_insights
+from strelka_ui.strelka.client import get_strelka_stats
 
 # pylint: disable=no-member
 
 strelka = Blueprint("strelka", __name__, url_prefix="/strelka")
 
-# Define the priority of each mimetype (For VirusTotal Scanning Priorization)
-MIMETYPE_PRIORITY = {
-    "application/x-dosexec": 1,  # Executables
-    "application/x-executable": 1,
-    "application/vnd.microsoft.portable-executable": 1,
-    "application/x-elf": 1,
-    "application/zip": 2,  # Archives
-    "application/x-rar-compressed": 2,
-    "application/x-msi": 2,
-    "application/x-7z-compressed": 2,
-    "application/vnd.ms-cab-compressed": 2,
-    "application/x-tar": 2,
-    "application/gzip": 2,
-    "application/octet-stream": 2,  # Unknown streams
-    "text/plain": 3,  # Scripts and source code
-    "text/x-script": 3,
-    "text/javascript": 3,
-    "application/x-bat": 3,
-    "application/x-sh": 3,
-    "application/x-python": 3,
-    "text/x-python": 3,
-    "text/html": 4,  # Web files
-    "application/xhtml+xml": 4,
-    "text/xml": 4,
-    "text/css": 4,
-    "application/pdf": 5,  # Documents
-    "application/msword": 5,
-    "application/vnd.ms-excel": 5,
-    "application/vnd.ms-powerpoint": 5,
-    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": 5,
-    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": 5,
-    "application/vnd.openxmlformats-officedocument.presentationml.presentation": 5,
-    # Images
-    "image/jpeg": 10,
-    "image/png": 10,
-    "image/gif": 10,
-    "image/webp": 10,
-    "image/tiff": 10,
-    "image/bmp": 10,
-    "image/svg+xml": 10,
-    # Other file types
-    "application/json": 20,  # Data formats
-    "application/xml": 20,
-}
+# An MD5, SHA1 or SHA256 hex digest
+HASH_PATTERN = re.compile(r"[0-9a-f]{32}|[0-9a-f]{40}|[0-9a-f]{64}")
+
+# A color in hex notation without the leading "#", as the VirusTotal widget expects
+COLOR_PATTERN = re.compile(r"[0-9a-fA-F]{6}")
 
 
 @strelka.route("/status/strelka", methods=["GET"])
@@ -113,8 +106,36 @@ def get_database_status() -> Tuple[Response, int]:
         return jsonify({"message": "Database is not reachable"}), 500
 
 
+@strelka.route("/status/metrics", methods=["GET"])
+@auth_required
+def get_metrics(user: User) -> Tuple[Response, int]:
+    """
+    Returns runtime counters for the shared clients used by this process.
+
+    Args:
+        user: The authenticated user.
+
+    Returns:
+        A Flask response object with a JSON-encoded set of counters and a 200 status code.
+    """
+    return (
+        jsonify(
+            {
+                "strelka": get_strelka_stats(),
+                "jobs": get_job_stats(),
+                "admission": get_admission_stats(),
+                "coalescing": get_coalescing_stats(),
+                "routing": get_routing_stats(),
+                "virustotal": dict(get_virustotal_stats(), enrichment=get_enrichment_stats()),
+            }
+        ),
+        200,
+    )
+
+
 @strelka.route("/upload", methods=["POST"])
 @auth_required
+@admission_required()
 def submit_file(
     user: User,
 ) -> Union[tuple[Response, int], tuple[dict[str, Union[Response, str]], int]]:
@@ -126,6 +147,8 @@ def submit_file(
 
     Returns:
         If successful, returns the Strelka analysis results and a 200 status code.
+        Submissions made with `async=true` are scanned in the background,
+        returning a job to poll and a 202 status code.
         If unsuccessful, returns an error message and a 500 status code.
 
     Raises:
@@ -202,211 +225,592 @@ def submit_file(
         submitted_hash = submission["hash"]
         submitted_type = "virustotal"
 
-        if os.environ.get("VIRUSTOTAL_API_KEY"):
-            try:
-                file = create_vt_zip_and_download(
-                    api_key=os.environ.get("VIRUSTOTAL_API_KEY"),
-                    file_hash=[submitted_hash],
-                    password="infected",
-                )
-
-                # Check if response is successful
-                file = convert_bytesio_to_filestorage(file, submission["hash"])
+        if not current_app.config["VIRUSTOTAL_API_KEY"]:
+            return (
+                jsonify(
+                    {
+                        "error": "VirusTotal request was not successful.",
+                        "details": "No VirusTotal API key has been loaded. Check the README for details.",
+                    }
+                ),
+                400,
+            )
 
-                # Decrypt to file prior to submission to Strelka
-                file, message = decrypt_file(file, "infected")
+        # Opt-in asynchronous mode: VirusTotal can take minutes to prepare a
+        # download, so fetch and scan the file on a background worker
+        if is_async_request():
+            return enqueue_or_503(
+                user,
+                submitted_hash,
+                submitted_type,
+                process_virustotal_submission,
+                submitted_hash,
+                submitted_description,
+                request.remote_addr,
+                request.headers.get("User-Agent"),
+                get_bool_param("bypass_gatekeeper"),
+                error="VirusTotal request was not successful.",
+                admit=False,
+            )
 
-                if file:
-                    file = message
+        # Keep the request thread's wait short; longer waits belong in async jobs
+        max_wait = float(current_app.config["VIRUSTOTAL_ZIP_SYNC_MAX_WAIT"])
+        try:
+            file = download_virustotal_files([submitted_hash], max_wait=max_wait)
+        except VirusTotalZipTimeout as e:
+            logging.warning(f"Timed out downloading {submitted_hash} from VirusTotal: {e}")
+            return (
+                jsonify(
+                    {
+                        "error": "VirusTotal request was not successful.",
+                        "details": f"VirusTotal did not prepare the file within {max_wait:g}s. "
+                        "Resubmit with async=true to wait longer in the background.",
+                    }
+                ),
+                504,
+            )
+        except Exception as e:
+            logging.warning(f"Could not download {submitted_hash} from VirusTotal: {e}")
+            return (
+                jsonify(
+                    {
+                        "error": "VirusTotal request was not successful.",
+                        "details": "Hash not found on VirusTotal.",
+                    }
+                ),
+                400,
+            )
 
-            except Exception:
-                return (
-                    jsonify(
-                        {
-                            "error": "VirusTotal request was not successful.",
-                            "details": "Hash not found on VirusTotal.",
-                        }
-                    ),
-                    400,
-                )
-        else:
+        if not file:
             return (
                 jsonify(
                     {
                         "error": "VirusTotal request was not successful.",
-                        "details": "No VirusTotal API key has been loaded. Check the README for details.",
+                        "details": "VirusTotal returned an empty archive.",
                     }
                 ),
                 400,
             )
+
+        # The downloaded files are spooled to temporary files, so release them once answered
+        downloaded = file
+
+        @after_this_request
+        def close_downloaded_files(response: Response) -> Response:
+            for f in downloaded:
+                f.stream.close()
+            return response
+
     if file:
-        response = ""
-        if isinstance(file, list):
-            for f in file:
-                r = submit_to_strelka(
-                    f, user, submitted_hash, submitted_description, submitted_type
+        # Force a fresh scan, skipping both Strelka's gatekeeper and result reuse
+        bypass_gatekeeper = get_bool_param("bypass_gatekeeper")
+
+        # Opt-in asynchronous mode: accept the file and scan it on a background worker
+        if is_async_request():
+            files = file if isinstance(file, list) else [file]
+            return enqueue_or_503(
+                user,
+                files[0].filename,
+                submitted_type,
+                process_submissions,
+                [spool_file(f) for f in files],
+                submitted_hash,
+                submitted_description,
+                submitted_type,
+                request.remote_addr,
+                request.headers.get("User-Agent"),
+                bypass_gatekeeper,
+            )
+
+        deadline, error = get_request_deadline()
+        if error:
+            return error
+
+        # Stop scanning, and skip saving, if the client goes away before the result is ready
+        with cancel_on_disconnect(deadline):
+            if isinstance(file, list):
+                payload, status_code = process_submissions(
+                    user,
+                    file,
+                    submitted_hash,
+                    submitted_description,
+                    submitted_type,
+                    request.remote_addr,
+                    request.headers.get("User-Agent"),
+                    bypass_gatekeeper=bypass_gatekeeper,
+                    deadline=deadline,
                 )
-                if not response:
-                    response = r
-        else:
-            response = submit_to_strelka(
-                file, user, submitted_hash, submitted_description, submitted_type
+                return jsonify(payload), status_code
+
+            return submit_to_strelka(
+                file,
+                user,
+                submitted_hash,
+                submitted_description,
+                submitted_type,
+                bypass_gatekeeper=bypass_gatekeeper,
+                deadline=deadline,
             )
-        return response
 
 
-def submit_to_strelka(
-    file, user, submitted_hash, submitted_description, submitted_type, bypass_gatekeeper=False
-):
+@strelka.route("/upload/stream", methods=["POST"])
+@auth_required
+@admission_required()
+def submit_file_stream(user: User) -> Union[Response, Tuple[Response, int]]:
     """
-    Submit file to Strelka for analysis and save results to the database.
+    Submit a file to Strelka and stream the analysis back as newline-delimited
+    JSON while it runs: one {"event": ...} line per Strelka event as soon as it
+    arrives, then a {"result": ...} line with the saved submission's file_id and
+    metadata, or an error line with its status_code.
 
     Args:
-        file: File object to be submitted.
-        user: User object representing the authenticated user.
-        submitted_hash: Hash of the submitted file.
-        submitted_description: Description of the submitted file.
-        submitted_type: Type of submission (e.g., 'api', 'virustotal', 'resubmission').
-        bypass_gatekeeper: If True, bypasses gatekeeper caching for this request.
+        user: User object representing the authenticated user submitting the file.
 
     Returns:
-        Analysis results and a 200 status code if successful.
-        Error message and a 415 status code if unsuccessful.
+        A streamed application/x-ndjson response, or an error message and a 400
+        status code if the request is invalid.
     """
-    total_scanned_with_hits = []
-    # Submit the file to the Strelka analysis engine.
-    try:
-        # Get the current timestamp and the file description from the request.
-        submitted_at = str(datetime.datetime.utcnow())
+    file = request.files.get("file")
+    if not file or file.filename == "":
+        return (
+            jsonify(
+                {
+                    "error": "Strelka submission was not successful.",
+                    "details": "No file in request.",
+                }
+            ),
+            400,
+        )
 
-        # Submit the file to Strelka and get the analysis results.
-        succeeded, response, file_size = submit_data(
-            file,
-            {
-                "user_name": user.user_cn,
-                "client_user_name": user.user_cn,
-            },
-            submitted_hash,
-            bypass_gatekeeper=bypass_gatekeeper,
+    is_valid_size, file_size = check_file_size(file.stream)
+    if not is_valid_size:
+        return (
+            jsonify(
+                {
+                    "error": "Strelka submission was not successful.",
+                    "details": f"File submitted cannot be larger than 150MB. Actual size: {file_size} bytes.",
+                }
+            ),
+            400,
         )
 
-        # If the Strelka submission was not successful, return an error message.
-        if not succeeded:
+    submitted_password = request.form.get("password", "")
+    if submitted_password:
+        try:
+            unpacked, message = decrypt_file(file, submitted_password)
+        except Exception as e:
+            unpacked, message = None, str(e)
+        if not unpacked:
+            return jsonify({"error": "Failed to unpack file", "details": message}), 400
+        if len(message) != 1:
             return (
-                jsonify({"error": "Failed to submit file", "details": str(response)}),
-                415,
+                jsonify(
+                    {
+                        "error": "Strelka submission was not successful.",
+                        "details": "Archives with several members cannot be streamed. Use /upload instead.",
+                    }
+                ),
+                400,
             )
+        file = message[0]
+
+    deadline, error = get_request_deadline()
+    if error:
+        return error
+
+    # Werkzeug closes the upload when the view returns, before the body is streamed
+    file = spool_file(file)
+
+    submission = stream_submission(
+        file,
+        user,
+        "",
+        request.form.get("description", ""),
+        "api",
+        request.remote_addr,
+        request.headers.get("User-Agent"),
+        bypass_gatekeeper=get_bool_param("bypass_gatekeeper"),
+        deadline=deadline,
+    )
 
-        def get_mimetype_priority(mime_list):
-            # Return the highest priority of the mimetypes in the list
-            return min(MIMETYPE_PRIORITY.get(mime, 9999) for mime in mime_list)
+    def generate():
+        # Stop scanning, and skip saving, if the client goes away mid-stream
+        with file.stream, cancel_on_disconnect(deadline):
+            for record in submission:
+                yield json_codec.dumps(record) + "\n"
 
-        # If VirusTotal API key provided, get positives (VIRUSTOTAL_API_LIMIT determined Max Scans per Request)
-        # -1    = VirusTotal Lookup Error
-        # -2    = VirusTotal API Key Not Provided
-        # >= 0  = Response Positives from VirusTotal
-        if os.environ.get("VIRUSTOTAL_API_KEY"):
-            total_scanned = 0
-            try:
-                # Sort files by the priority of their mimetypes
-                sorted_files = sorted(
-                    response,
-                    key=lambda x: get_mimetype_priority(x["file"]["flavors"]["mime"]),
-                )
-                for scanned_file in sorted_files:
-                    if total_scanned <= int(os.environ.get("VIRUSTOTAL_API_LIMIT")):
-                        scanned_file["enrichment"] = {"virustotal": -2}
-                        scanned_file["enrichment"]["virustotal"] = (
-                            get_virustotal_positives(
-                                api_key=os.environ.get("VIRUSTOTAL_API_KEY"),
-                                file_hash=scanned_file["scan"]["hash"]["sha256"],
-                            )
-                        )
-                        total_scanned += 1.0
-                        if scanned_file["enrichment"]["virustotal"] > 0:
-                            total_scanned_with_hits.append(
-                                {
-                                    "file_sha256": scanned_file["scan"]["hash"][
-                                        "sha256"
-                                    ],
-                                    "positives": scanned_file["enrichment"][
-                                        "virustotal"
-                                    ],
-                                }
-                            )
-                    else:
-                        scanned_file["enrichment"] = {"virustotal": -3}
-            except Exception as e:
-                logging.warning(f"Could not process VirusTotal search with error: {e} ")
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
-        # Get Strelka Submission IoCs
-        # Store a set of IoCs in IoCs field
 
-        # Handle S3 upload if enabled
-        s3_key = None
-        s3_expires_at = None
-        if is_s3_enabled():
-            try:
-                # Create temporary submission ID for S3 key generation
-                temp_submission_id = get_request_id(response[0])
-                success, s3_key, error_msg = upload_file(file, temp_submission_id)
-                if success:
-                    s3_expires_at = calculate_expires_at()
-                    logging.info(f"Successfully uploaded file to S3: {s3_key}")
-                else:
-                    logging.warning(f"Failed to upload file to S3: {error_msg}")
-            except Exception as e:
-                logging.error(f"Unexpected error during S3 upload: {e}")
+@strelka.route("/upload/batch", methods=["POST"])
+@auth_required
+@admission_required(BULK_LANE)
+def submit_batch(user: User) -> Tuple[Response, int]:
+    """
+    Submit many files in one multipart request. Files are scanned concurrently
+    and all resulting submissions are saved in a single transaction.
+
+    Args:
+        user: User object representing the authenticated user submitting the files.
+
+    Returns:
+        A per-file manifest with each file's file_id or error and a 200 status code,
+        202 with a job ID in asynchronous mode, or an error message and a 400 status code.
+    """
+    files = request.files.getlist("file")
+    if not files:
+        return (
+            jsonify(
+                {
+                    "error": "Strelka submission was not successful.",
+                    "details": "No file in request.",
+                }
+            ),
+            400,
+        )
 
-        # Create a new submission object and add it to the database.
-        new_submission = FileSubmission(
-            file.filename,
-            file_size,
-            response,
+    max_files = int(current_app.config["STRELKA_BATCH_MAX_FILES"])
+    if len(files) > max_files:
+        return (
+            jsonify(
+                {
+                    "error": "Strelka submission was not successful.",
+                    "details": f"A batch cannot contain more than {max_files} files. Actual count: {len(files)}.",
+                }
+            ),
+            400,
+        )
+
+    submitted_description = request.form.get("description", "")
+    submitted_type = "api"
+    bypass_gatekeeper = get_bool_param("bypass_gatekeeper")
+
+    # Reject empty or oversized files up front, keeping their place in the manifest
+    accepted = []
+    rejected = {}
+    for index, file in enumerate(files):
+        is_valid_size, file_size = check_file_size(file.stream)
+        if file.filename == "":
+            rejected[index] = "Submitted filename is empty."
+        elif not is_valid_size:
+            rejected[index] = f"File submitted cannot be larger than 150MB. Actual size: {file_size} bytes."
+        else:
+            accepted.append(file)
+
+    if is_async_request() and accepted:
+        return enqueue_or_503(
+            user,
+            f"{len(accepted)} files",
+            submitted_type,
+            process_batch,
+            [spool_file(f) for f in accepted],
+            submitted_description,
             submitted_type,
             request.remote_addr,
             request.headers.get("User-Agent"),
-            user.id,
-            submitted_description,
-            submitted_at,
-            s3_key,
-            s3_expires_at
+            bypass_gatekeeper,
+            extra={
+                "rejected": [
+                    {"file_name": files[index].filename, "status_code": 400, "error": error}
+                    for index, error in rejected.items()
+                ],
+            },
         )
 
-        db.session.add(new_submission)
+    deadline, error = get_request_deadline()
+    if error:
+        return error
+
+    entries = []
+    if accepted:
+        with cancel_on_disconnect(deadline):
+            manifest, _ = process_batch(
+                user,
+                accepted,
+                submitted_description,
+                submitted_type,
+                request.remote_addr,
+                request.headers.get("User-Agent"),
+                bypass_gatekeeper=bypass_gatekeeper,
+                deadline=deadline,
+            )
+        entries = manifest["files"]
+
+    results = iter(entries)
+    manifest_files = [
+        {"file_name": file.filename, "status_code": 400, "error": rejected[index]}
+        if index in rejected
+        else next(results)
+        for index, file in enumerate(files)
+    ]
+    succeeded = sum(1 for entry in manifest_files if entry["status_code"] == 200)
+
+    return (
+        jsonify(
+            {
+                "submitted": len(files),
+                "succeeded": succeeded,
+                "failed": len(files) - succeeded,
+                "files": manifest_files,
+            }
+        ),
+        200,
+    )
+
 
-        # Increase the user's submission count.
-        user.files_submitted += 1
+@strelka.route("/upload/hashes", methods=["POST"])
+@auth_required
+def submit_hashes(user: User) -> Tuple[Response, int]:
+    """
+    Import many files from VirusTotal by hash in one request. The files are
+    downloaded in batches and scanned in the background, and the job's result
+    is a per-hash manifest.
 
-        db.session.flush()
-        db.session.commit()
+    Args:
+        user: User object representing the authenticated user submitting the hashes.
+
+    Returns:
+        202 with a job ID and any rejected hashes, or an error message and a 400 status code.
+    """
+    if not current_app.config["VIRUSTOTAL_API_KEY"]:
+        return (
+            jsonify(
+                {
+                    "error": "VirusTotal request was not successful.",
+                    "details": "No VirusTotal API key has been loaded. Check the README for details.",
+                }
+            ),
+            400,
+        )
 
-        # Return the analysis results and a 200 status code.
+    try:
+        submission = json.loads(request.data)
+        submitted_hashes = submission["hashes"]
+    except (ValueError, TypeError, KeyError):
+        submission, submitted_hashes = {}, None
+    # Hashes may be a list, or a string separated by commas or whitespace
+    if isinstance(submitted_hashes, str):
+        submitted_hashes = submitted_hashes.replace(",", " ").split()
+    if not isinstance(submitted_hashes, list) or not submitted_hashes:
         return (
             jsonify(
                 {
-                    "file_id": str(new_submission.file_id),
-                    "response": response,
-                    "meta": {
-                        "file_size": new_submission.file_size,
-                        "iocs": new_submission.iocs,
-                        "vt_positives": list(total_scanned_with_hits),
-                    },
+                    "error": "VirusTotal request was not successful.",
+                    "details": "Request body must be JSON with a list of hashes.",
                 }
             ),
-            200,
+            400,
         )
-    # If an exception occurs, log the error and return an error message.
-    except Exception as e:
+
+    hashes = []
+    rejected = []
+    for file_hash in dict.fromkeys(str(h).strip().lower() for h in submitted_hashes):
+        if HASH_PATTERN.fullmatch(file_hash):
+            hashes.append(file_hash)
+        else:
+            rejected.append(
+                {
+                    "hash": file_hash,
+                    "status_code": 400,
+                    "error": "Hash must be a valid MD5 (32), SHA1 (40), or SHA256 (64) characters long.",
+                }
+            )
+
+    max_hashes = int(current_app.config["VIRUSTOTAL_IMPORT_MAX_HASHES"])
+    if len(hashes) > max_hashes:
         return (
+            jsonify(
+                {
+                    "error": "VirusTotal request was not successful.",
+                    "details": f"An import cannot contain more than {max_hashes} hashes. Actual count: {len(hashes)}.",
+                }
+            ),
+            400,
+        )
+    if not hashes:
+        return (
+            jsonify(
+                {
+                    "error": "VirusTotal request was not successful.",
+                    "details": "No valid hashes in request.",
+                    "rejected": rejected,
+                }
+            ),
+            400,
+        )
+
+    return enqueue_or_503(
+        user,
+        f"{len(hashes)} hashes",
+        "virustotal",
+        process_virustotal_import,
+        hashes,
+        submission.get("description", ""),
+        request.remote_addr,
+        request.headers.get("User-Agent"),
+        get_bool_param("bypass_gatekeeper"),
+        error="VirusTotal request was not successful.",
+        extra={"accepted": len(hashes), "rejected": rejected},
+        admit=False,
+    )
+
+
+def get_param(name: str) -> Any:
+    """
+    Reads a submission option from the query string, form fields or JSON body.
+
+    Args:
+        name: The name of the option.
+
+    Returns:
+        The option's value, or None if it was not given.
+    """
+    value = request.args.get(name) or request.form.get(name)
+    if value is None and request.data:
+        try:
+            value = json.loads(request.data).get(name)
+        except (ValueError, AttributeError):
+            value = None
+    return value
+
+
+def get_bool_param(name: str) -> bool:
+    """
+    Reads a boolean submission option from the query string, form fields or JSON body.
+
+    Args:
+        name: The name of the option.
+
+    Returns:
+        bool: True if the option is set to 1, true or yes.
+    """
+    return str(get_param(name)).lower() in ("1", "true", "yes")
+
+
+def get_request_deadline() -> Tuple[Optional[ScanDeadline], Optional[Tuple[Response, int]]]:
+    """
+    Builds the scan deadline for this request from STRELKA_SCAN_TIMEOUT and
+    an optional `timeout` option, in seconds, which can only shorten it.
+
+    Returns:
+        The deadline and None, or None and a 400 error response if the timeout is invalid.
+    """
+    timeout = get_param("timeout")
+    try:
+        requested = float(timeout) if timeout not in (None, "") else None
+    except (TypeError, ValueError):
+        return None, (
             jsonify(
                 {
                     "error": "Strelka submission was not successful.",
-                    "details": str(e),
+                    "details": f"Timeout must be a number of seconds. Received: {timeout}.",
                 }
             ),
-            500,
+            400,
+        )
+    return get_scan_deadline(requested), None
+
+
+def is_async_request() -> bool:
+    """
+    Checks whether the client opted in to asynchronous submission, via an
+    `async` query parameter, form field or JSON key.
+
+    Returns:
+        bool: True if the submission should be processed in the background.
+    """
+    return get_bool_param("async")
+
+
+def enqueue_or_503(
+    user: User,
+    file_name: str,
+    submitted_type: str,
+    fn: Callable[..., Tuple[Dict[str, Any], int]],
+    *args: Any,
+    error: str = "Strelka submission was not successful.",
+    extra: Optional[Dict[str, Any]] = None,
+    admit: bool = True,
+) -> Tuple[Response, int]:
+    """
+    Queues a submission job and builds the response for an asynchronous
+    submission: 202 with a Location header pointing at the job, or 503 with
+    Retry-After if the job queue is full.
+
+    Args:
+        user: The authenticated user submitting the file.
+        file_name: The name recorded on the job.
+        submitted_type: The type of submission (e.g., 'api', 'virustotal').
+        fn: The submission function to run, as for enqueue_submission_job.
+        *args: Additional arguments for fn.
+        error: The error message if the job cannot be queued.
+        extra: Additional fields for the 202 response.
+        admit: Whether the job takes a Strelka admission slot before fn runs.
+
+    Returns:
+        Tuple[Response, int]: The response and its status code.
+    """
+    try:
+        job = enqueue_submission_job(
+            user, file_name, submitted_type, fn, *args, admit=admit
+        )
+    except JobQueueFull as e:
+        response = jsonify(
+            {"error": error, "details": f"Submission queue is full: {e}"}
         )
+        response.headers["Retry-After"] = "30"
+        return response, 503
+
+    status_url = url_for("strelka.get_job", job_id=job.job_id)
+    response = jsonify(
+        {
+            "job_id": job.job_id,
+            "status": job.status,
+            "status_url": status_url,
+            **(extra or {}),
+        }
+    )
+    response.headers["Location"] = status_url
+    return response, 202
+
+
+def submit_to_strelka(
+    file,
+    user,
+    submitted_hash,
+    submitted_description,
+    submitted_type,
+    bypass_gatekeeper=False,
+    deadline=None,
+):
+    """
+    Submit file to Strelka for analysis and save results to the database.
+
+    Args:
+        file: File object to be submitted.
+        user: User object representing the authenticated user.
+        submitted_hash: Hash of the submitted file.
+        submitted_description: Description of the submitted file.
+        submitted_type: Type of submission (e.g., 'api', 'virustotal', 'resubmission').
+        bypass_gatekeeper: If True, bypasses gatekeeper caching for this request.
+        deadline: The submission's time budget. Defaults to STRELKA_SCAN_TIMEOUT.
+
+    Returns:
+        Analysis results and a 200 status code if successful.
+        Error message and a 415 status code if unsuccessful.
+    """
+    payload, status_code = process_submission(
+        file,
+        user,
+        submitted_hash,
+        submitted_description,
+        submitted_type,
+        request.remote_addr,
+        request.headers.get("User-Agent"),
+        bypass_gatekeeper=bypass_gatekeeper,
+        deadline=deadline,
+    )
+    return jsonify(payload), status_code
 
 
 def get_request_time(response: dict) -> str:
@@ -520,6 +924,44 @@ def get_scan(user: User, id: str) -> Tuple[Response, int]:
         )
 
 
+@strelka.route("/jobs/<job_id>", methods=["GET"])
+@auth_required
+def get_job(user: User, job_id: str) -> Tuple[Response, int]:
+    """
+    Retrieves the status of an asynchronous submission, and its result once finished.
+
+    Args:
+        user: The authenticated user.
+        job_id: The ID of the job returned by the upload endpoint.
+
+    Returns:
+        A JSON representation of the job and a 200 status code if the job is found,
+        otherwise an error message and a 404 status code.
+    """
+    job = db.session.query(SubmissionJob).filter_by(job_id=job_id).first()
+
+    if not job:
+        return (
+            jsonify(
+                {
+                    "error": "Submission job unable to be retrieved.",
+                    "details": f"Job {job_id} not found.",
+                }
+            ),
+            404,
+        )
+
+    val = job.as_dict()
+    if job.status == "succeeded" and job.file_id:
+        submission = (
+            db.session.query(FileSubmission).filter_by(file_id=job.file_id).first()
+        )
+        if submission:
+            val["result"] = dict(val["result"], response=submission.strelka_response)
+
+    return jsonify(val), 200
+
+
 @strelka.route("/scans", methods=["GET"])
 @auth_required
 def view(user: User) -> Tuple[Dict[str, any], int]:
@@ -694,8 +1136,10 @@ def get_vt_widget_url(resource: str) -> Tuple[Response, int]:
         A JSON response containing the VirusTotal widget url or an error message.
     """
     data = request.get_json()
-    if not data or "resource" not in data:
+    if not isinstance(data, dict) or "resource" not in data:
         return jsonify({"error": "Resource identifier is required"}), 400
+    if not isinstance(data["resource"], str) or not data["resource"]:
+        return jsonify({"error": "Resource identifier must be a non-empty string"}), 400
 
     # Strelka UI Defaults
     fg1 = data.get("fg1", "333333")  # Dark text color
@@ -703,7 +1147,15 @@ def get_vt_widget_url(resource: str) -> Tuple[Response, int]:
     bg2 = data.get("bg2", "F5F5F5")  # Slightly grey background for differentiation
     bd1 = data.get("bd1", "E8E8E8")  # Light grey border color
 
-    api_key = os.getenv("VIRUSTOTAL_API_KEY")
+    # Checked before the colors become part of the widget URL cache key
+    for name, color in (("fg1", fg1), ("bg1", bg1), ("bg2", bg2), ("bd1", bd1)):
+        if not isinstance(color, str) or not COLOR_PATTERN.fullmatch(color):
+            return (
+                jsonify({"error": f"{name} must be a 6-digit hex color, e.g. 333333"}),
+                400,
+            )
+
+    api_key = current_app.config["VIRUSTOTAL_API_KEY"]
     if not api_key:
         return jsonify({"error": "VirusTotal API key is not available."}), 500
 
@@ -725,12 +1177,13 @@ def check_vt_api_key():
     Returns:
         A boolean response containing the VirusTotal widget url or an error message.
     """
-    api_key_exists = bool(os.environ.get("VIRUSTOTAL_API_KEY"))
+    api_key_exists = bool(current_app.config["VIRUSTOTAL_API_KEY"])
     return jsonify({"apiKeyAvailable": api_key_exists}), 200
 
 
 @strelka.route("/resubmit/<submission_id>", methods=["POST"])
 @auth_required
+@admission_required(RESUBMISSION_LANE)
 def resubmit_file(user: User, submission_id: str) -> Tuple[Response, int]:
     """
     Resubmit a file from S3 storage for analysis.
@@ -803,14 +1256,17 @@ def resubmit_file(user: User, submission_id: str) -> Tuple[Response, int]:
         resubmission_file = ResubmissionFile(file_storage, new_description)
         
         # Call the existing submit_to_strelka function
-        response = submit_to_strelka(
-            resubmission_file,
-            user,
-            "",  # No submitted_hash for resubmission
-            new_description,
-            "resubmission",  # Mark as resubmission type
-            bypass_gatekeeper=True  # Bypass gatekeeper for resubmissions
-        )
+        deadline = get_scan_deadline()
+        with cancel_on_disconnect(deadline):
+            response = submit_to_strelka(
+                resubmission_file,
+                user,
+                "",  # No submitted_hash for resubmission
+                new_description,
+                "resubmission",  # Mark as resubmission type
+                bypass_gatekeeper=True,  # Bypass gatekeeper for resubmissions
+                deadline=deadline,
+            )
         
         # Add original submission ID to the response
         if isinstance(response, tuple) and len(response) == 2:
@@ -26,6 +26,46 @@ class Config(object):
     STRELKA_HOST = os.environ.get("STRELKA_HOST", "0.0.0.0")
     STRELKA_PORT = os.environ.get("STRELKA_PORT", "57314")
     STRELKA_CERT = os.environ.get("STRELKA_CERT", "")
+    # Comma-separated host:port[=weight] list; overrides STRELKA_HOST/STRELKA_PORT when set
+    STRELKA_FRONTENDS = os.environ.get("STRELKA_FRONTENDS", "")
+    STRELKA_BALANCING_POLICY = os.environ.get(
+        "STRELKA_BALANCING_POLICY", "least_outstanding"
+    )
+    STRELKA_EJECT_AFTER_FAILURES = os.environ.get("STRELKA_EJECT_AFTER_FAILURES", 3)
+    STRELKA_EJECT_SECONDS = os.environ.get("STRELKA_EJECT_SECONDS", 30)
+    # JSON object of extra cluster names to frontend lists, and JSON list of routing rules
+    STRELKA_CLUSTERS = os.environ.get("STRELKA_CLUSTERS", "")
+    STRELKA_ROUTING_RULES = os.environ.get("STRELKA_ROUTING_RULES", "")
+    STRELKA_CHANNEL_POOL_SIZE = os.environ.get("STRELKA_CHANNEL_POOL_SIZE", 2)
+    # "sync" runs each gRPC call on the calling thread, "aio" on a shared grpc.aio event loop
+    STRELKA_CLIENT_MODE = os.environ.get("STRELKA_CLIENT_MODE", "sync").lower()
+    STRELKA_KEEPALIVE_TIME_MS = os.environ.get("STRELKA_KEEPALIVE_TIME_MS", 300000)
+    STRELKA_KEEPALIVE_TIMEOUT_MS = os.environ.get("STRELKA_KEEPALIVE_TIMEOUT_MS", 20000)
+    STRELKA_SCAN_TIMEOUT = os.environ.get("STRELKA_SCAN_TIMEOUT", 960)
+    STRELKA_CHUNK_SIZE = os.environ.get("STRELKA_CHUNK_SIZE", "auto")
+    STRELKA_ARCHIVE_CONCURRENCY = os.environ.get("STRELKA_ARCHIVE_CONCURRENCY", 8)
+    STRELKA_BATCH_CONCURRENCY = os.environ.get("STRELKA_BATCH_CONCURRENCY", 8)
+    STRELKA_BATCH_MAX_FILES = os.environ.get("STRELKA_BATCH_MAX_FILES", 100)
+    STRELKA_RESULT_REUSE_MAX_AGE = os.environ.get("STRELKA_RESULT_REUSE_MAX_AGE", 0)
+    STRELKA_COALESCE_UPLOADS = (
+        os.environ.get("STRELKA_COALESCE_UPLOADS", "false").lower() == "true"
+    )
+
+    # Asynchronous Submission Details
+    SUBMISSION_JOB_WORKERS = os.environ.get("SUBMISSION_JOB_WORKERS", 4)
+    SUBMISSION_JOB_QUEUE_SIZE = os.environ.get("SUBMISSION_JOB_QUEUE_SIZE", 32)
+
+    # Submission Admission Details
+    SUBMISSION_MAX_IN_FLIGHT = os.environ.get("SUBMISSION_MAX_IN_FLIGHT", 0)
+    SUBMISSION_MAX_IN_FLIGHT_PER_USER = os.environ.get(
+        "SUBMISSION_MAX_IN_FLIGHT_PER_USER", 0
+    )
+    SUBMISSION_ADMISSION_WAIT = os.environ.get("SUBMISSION_ADMISSION_WAIT", 5)
+    # lane=value lists for the interactive, resubmission and bulk lanes, ignored while SUBMISSION_MAX_IN_FLIGHT is 0
+    SUBMISSION_LANE_WEIGHTS = os.environ.get(
+        "SUBMISSION_LANE_WEIGHTS", "interactive=8,resubmission=4,bulk=1"
+    )
+    SUBMISSION_LANE_LIMITS = os.environ.get("SUBMISSION_LANE_LIMITS", "bulk=2")
 
     # Database Details
     DATABASE_HOST = os.environ.get("DATABASE_HOST", "0.0.0.0")
@@ -37,6 +77,45 @@ class Config(object):
     # API Details
     VIRUSTOTAL_API_KEY = os.environ.get("VIRUSTOTAL_API_KEY", "")
     VIRUSTOTAL_API_LIMIT = os.environ.get("VIRUSTOTAL_API_LIMIT", 30)
+    VIRUSTOTAL_CONCURRENCY = os.environ.get("VIRUSTOTAL_CONCURRENCY", 4)
+    # signal=weight list ranking files for lookups; see RISK_SIGNALS in services/risk.py
+    VIRUSTOTAL_RISK_WEIGHTS = os.environ.get(
+        "VIRUSTOTAL_RISK_WEIGHTS", "yara=4,unsigned_pe=3,entropy=2,mimetype=2,depth=1,size=1"
+    )
+    # "inline" looks files up before a submission is saved, "deferred" in the background afterwards
+    VIRUSTOTAL_ENRICHMENT_MODE = os.environ.get("VIRUSTOTAL_ENRICHMENT_MODE", "inline").lower()
+    VIRUSTOTAL_ENRICHMENT_WORKERS = os.environ.get("VIRUSTOTAL_ENRICHMENT_WORKERS", 2)
+    VIRUSTOTAL_ENRICHMENT_QUEUE_SIZE = os.environ.get("VIRUSTOTAL_ENRICHMENT_QUEUE_SIZE", 256)
+    # Lookups per minute across all threads (0 for no limit), and how long a lookup may wait for quota
+    VIRUSTOTAL_REQUESTS_PER_MINUTE = os.environ.get("VIRUSTOTAL_REQUESTS_PER_MINUTE", 0)
+    VIRUSTOTAL_RATE_LIMIT_WAIT = os.environ.get("VIRUSTOTAL_RATE_LIMIT_WAIT", 10)
+    # Lookups per minute and per UTC day across all processes and nodes, tracked in the database (0 for no limit)
+    VIRUSTOTAL_QUOTA_PER_MINUTE = os.environ.get("VIRUSTOTAL_QUOTA_PER_MINUTE", 0)
+    VIRUSTOTAL_QUOTA_PER_DAY = os.environ.get("VIRUSTOTAL_QUOTA_PER_DAY", 0)
+    # Pooled connections, timeouts in seconds, and retries of throttled or failed requests
+    VIRUSTOTAL_POOL_SIZE = os.environ.get("VIRUSTOTAL_POOL_SIZE", 10)
+    VIRUSTOTAL_CONNECT_TIMEOUT = os.environ.get("VIRUSTOTAL_CONNECT_TIMEOUT", 5)
+    VIRUSTOTAL_READ_TIMEOUT = os.environ.get("VIRUSTOTAL_READ_TIMEOUT", 30)
+    VIRUSTOTAL_MAX_RETRIES = os.environ.get("VIRUSTOTAL_MAX_RETRIES", 2)
+    VIRUSTOTAL_RETRY_BACKOFF = os.environ.get("VIRUSTOTAL_RETRY_BACKOFF", 1)
+    VIRUSTOTAL_RETRY_MAX_WAIT = os.environ.get("VIRUSTOTAL_RETRY_MAX_WAIT", 30)
+    # Seconds to cache verdicts for files with detections, without, and unknown to VirusTotal (0 disables)
+    VIRUSTOTAL_CACHE_POSITIVE_TTL = os.environ.get("VIRUSTOTAL_CACHE_POSITIVE_TTL", 86400)
+    VIRUSTOTAL_CACHE_NEGATIVE_TTL = os.environ.get("VIRUSTOTAL_CACHE_NEGATIVE_TTL", 21600)
+    VIRUSTOTAL_CACHE_NOT_FOUND_TTL = os.environ.get("VIRUSTOTAL_CACHE_NOT_FOUND_TTL", 3600)
+    VIRUSTOTAL_CACHE_SIZE = os.environ.get("VIRUSTOTAL_CACHE_SIZE", 10000)
+    # Seconds to cache widget URLs per resource and theme (0 only coalesces concurrent requests)
+    VIRUSTOTAL_WIDGET_CACHE_TTL = os.environ.get("VIRUSTOTAL_WIDGET_CACHE_TTL", 3600)
+    VIRUSTOTAL_WIDGET_CACHE_SIZE = os.environ.get("VIRUSTOTAL_WIDGET_CACHE_SIZE", 1000)
+    # Seconds a hash submission waits for VirusTotal to prepare its download, in a background job or
+    # while the request waits, and the first poll interval
+    VIRUSTOTAL_ZIP_MAX_WAIT = os.environ.get("VIRUSTOTAL_ZIP_MAX_WAIT", 300)
+    VIRUSTOTAL_ZIP_SYNC_MAX_WAIT = os.environ.get("VIRUSTOTAL_ZIP_SYNC_MAX_WAIT", 30)
+    VIRUSTOTAL_ZIP_POLL_INTERVAL = os.environ.get("VIRUSTOTAL_ZIP_POLL_INTERVAL", 2)
+    # Hashes per import request, per VirusTotal ZIP, and ZIPs downloaded ahead of the one being scanned
+    VIRUSTOTAL_IMPORT_MAX_HASHES = os.environ.get("VIRUSTOTAL_IMPORT_MAX_HASHES", 1000)
+    VIRUSTOTAL_ZIP_BATCH_SIZE = os.environ.get("VIRUSTOTAL_ZIP_BATCH_SIZE", 50)
+    VIRUSTOTAL_ZIP_CONCURRENCY = os.environ.get("VIRUSTOTAL_ZIP_CONCURRENCY", 2)
     API_KEY_EXPIRATION = os.environ.get("API_KEY_EXPIRATION", "999")
 
     # LDAP Details
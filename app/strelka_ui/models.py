@@ -35,6 +35,10 @@ class FileSubmission(db.Model):
     """
 
     __tablename__ = "file_submission"
+    __table_args__ = (
+        # Supports hash containment (@>) lookups used to reuse prior results
+        db.Index("ix_file_submission_hashes", "hashes", postgresql_using="gin"),
+    )
 
     # Database Metadata
     id: int = db.Column(db.Integer, primary_key=True)
@@ -400,3 +404,94 @@ class ApiKey(db.Model):
         Returns a string representation of the ApiKey object.
         """
         return f"<ApiKey id={self.id}, user_cn='{self.user_cn}'>"
+
+
+class SubmissionJob(db.Model):
+    """
+    Represents a submission accepted for asynchronous processing.
+
+    Attributes:
+        id (int): The unique identifier of the job row.
+        job_id (str): The public identifier returned to the client.
+        status (str): One of queued, running, succeeded or failed.
+        file_name (str): The name of the submitted file.
+        submitted_type (str): The type of submission (e.g., api, virustotal).
+        submitted_by_user_id (int): The ID of the user who submitted the file.
+        file_id (str): The resulting FileSubmission file_id, once succeeded.
+        status_code (int): The HTTP status code the synchronous endpoint would have returned.
+        result (dict): The submission result or error details, without the Strelka events.
+        created_at (datetime): The date and time the job was accepted.
+        started_at (datetime): The date and time a worker picked the job up.
+        finished_at (datetime): The date and time the job completed.
+    """
+
+    __tablename__ = "submission_job"
+
+    id: int = db.Column(db.Integer, primary_key=True)
+    job_id: str = db.Column(db.String(), unique=True, nullable=False)
+    status: str = db.Column(db.String(), nullable=False, index=True)
+    file_name: str = db.Column(db.String())
+    submitted_type: str = db.Column(db.String())
+    submitted_by_user_id: int = db.Column(
+        db.ForeignKey("user.id"), nullable=False, index=True
+    )
+    file_id: str = db.Column(db.String())
+    status_code: int = db.Column(db.Integer())
+    result: dict = db.Column(db.JSON())
+    created_at: datetime.datetime = db.Column(db.DateTime(), default=func.now())
+    started_at: datetime.datetime = db.Column(db.DateTime())
+    finished_at: datetime.datetime = db.Column(db.DateTime())
+
+    def __repr__(self) -> str:
+        return f"<SubmissionJob job_id={self.job_id}, status={self.status}>"
+
+    def as_dict(self) -> dict:
+        """
+        Returns a dictionary representation of the job.
+
+        Returns:
+            dict: A dictionary representation of the job.
+        """
+        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+
+
+class VirusTotalVerdict(db.Model):
+    """
+    A cached VirusTotal lookup result for a file.
+
+    Attributes:
+        sha256 (str): The SHA256 hash of the file.
+        positives (int): The number of malicious detections, or None if VirusTotal has not seen the file.
+        checked_at (datetime): The date and time VirusTotal was queried.
+        expires_at (datetime): The date and time the result should be looked up again.
+    """
+
+    __tablename__ = "virustotal_verdict"
+
+    sha256: str = db.Column(db.String(), primary_key=True)
+    positives: int = db.Column(db.Integer())
+    checked_at: datetime.datetime = db.Column(db.DateTime(), nullable=False)
+    expires_at: datetime.datetime = db.Column(db.DateTime(), nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"<VirusTotalVerdict sha256={self.sha256}, positives={self.positives}>"
+
+
+class VirusTotalQuota(db.Model):
+    """
+    VirusTotal lookups made by all processes in one minute or day.
+
+    Attributes:
+        period (str): "minute" or "day".
+        window_start (datetime): The start of the minute or day, in UTC.
+        used (int): Lookups reserved in the window.
+    """
+
+    __tablename__ = "virustotal_quota"
+
+    period: str = db.Column(db.String(), primary_key=True)
+    window_start: datetime.datetime = db.Column(db.DateTime(), primary_key=True)
+    used: int = db.Column(db.Integer(), nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"<VirusTotalQuota period={self.period}, window_start={self.window_start}, used={self.used}>"
@@ -0,0 +1,331 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+from typing import Any, Deque, Dict, Hashable, Iterator, Optional
+
+from flask import Response, current_app, jsonify, request, session
+
+from strelka_ui.services.auth import API_KEY_HEADER, SESSION_USER_ID_KEY
+
+# Submission lanes. Analysts in the UI, resubmissions of stored files, and
+# automated traffic (API keys and batch uploads) are scheduled separately.
+INTERACTIVE_LANE = "interactive"
+RESUBMISSION_LANE = "resubmission"
+BULK_LANE = "bulk"
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a submission cannot be admitted within the allowed wait.
+
+    Attributes:
+        retry_after (int): Seconds the client should wait before retrying.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionLane:
+    """
+    A class of submissions with its own share of the admission slots.
+
+    Attributes:
+        name (str): The lane's name.
+        weight (int): The lane's share of freed slots relative to other lanes with waiters.
+        max_in_flight (int): Maximum submissions in progress from this lane, or 0 for no limit.
+    """
+
+    def __init__(self, name: str, weight: int = 1, max_in_flight: int = 0):
+        self.name = name
+        self.weight = max(1, weight)
+        self.max_in_flight = max(0, max_in_flight)
+        self.waiters: Deque[object] = deque()
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        # Stride scheduling: the lane with the lowest pass goes next, and each
+        # admission advances the pass by the inverse of the lane's weight
+        self.pass_value = 0.0
+
+    def has_room(self) -> bool:
+        return not self.max_in_flight or self.in_flight < self.max_in_flight
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "weight": self.weight,
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self.in_flight,
+            "waiting": len(self.waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionController:
+    """
+    Bounds the number of submissions processed at once, both in total and
+    per user, and decides which lane gets a slot when one frees up.
+
+    Requests over the global or their lane's limit wait for a slot for up to
+    max_wait seconds and are then rejected. Waiting requests are admitted in
+    proportion to their lanes' weights, first come first served within a lane.
+    A limit of 0 disables it; lanes only apply while the total limit is set.
+
+    Attributes:
+        max_in_flight (int): Maximum submissions in progress across all users.
+        max_per_user (int): Maximum submissions in progress for a single user.
+        max_wait (float): Seconds a request may wait for a slot.
+        lanes (Dict[str, AdmissionLane]): The lanes, by name.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_per_user: int,
+        max_wait: float,
+        lanes: Optional[Dict[str, AdmissionLane]] = None,
+    ):
+        self.max_in_flight = max(0, max_in_flight)
+        self.max_per_user = max(0, max_per_user)
+        self.max_wait = max(0.0, max_wait)
+        self.lanes = lanes or {}
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._per_user: Dict[Hashable, int] = {}
+        self._virtual_time = 0.0
+
+    def _lane(self, name: str) -> AdmissionLane:
+        if name not in self.lanes:
+            self.lanes[name] = AdmissionLane(name)
+        return self.lanes[name]
+
+    def _has_room(self) -> bool:
+        return not self.max_in_flight or self._in_flight < self.max_in_flight
+
+    def _next_lane(self) -> Optional[AdmissionLane]:
+        # Lanes at their own limit cannot use a free slot, so they do not block the others
+        ready = [l for l in self.lanes.values() if l.waiters and l.has_room()]
+        return min(ready, key=lambda l: l.pass_value) if ready else None
+
+    @contextmanager
+    def admit(
+        self, user_key: Hashable, lane_name: str = INTERACTIVE_LANE, background: bool = False
+    ) -> Iterator[None]:
+        """
+        Context manager holding a submission slot for the duration of the block.
+
+        A user already at their own limit is rejected straight away, since
+        waiting would only tie up another server thread on their behalf.
+        Background work, such as asynchronous jobs, is already bounded by its
+        queue, so it skips the per-user limit and waits as long as it takes.
+
+        Args:
+            user_key: Identifies the user the per-user limit applies to.
+            lane_name: The lane the submission is scheduled in.
+            background: If True, wait without a deadline and ignore the per-user limit.
+
+        Raises:
+            AdmissionRejected: If the user is at their limit, or no slot became
+            free within max_wait seconds.
+        """
+        retry_after = max(1, math.ceil(self.max_wait))
+        deadline = time.monotonic() + self.max_wait
+        ticket = object()
+
+        with self._cond:
+            lane = self._lane(lane_name)
+            user_in_flight = self._per_user.get(user_key, 0)
+            if not background and self.max_per_user and user_in_flight >= self.max_per_user:
+                lane.rejected += 1
+                raise AdmissionRejected(
+                    f"{user_in_flight} submissions already in progress for this user",
+                    retry_after,
+                )
+
+            # Without a total limit there are no slots to share, so there is
+            # nothing to queue for and lanes are not scheduled
+            if self.max_in_flight:
+                # A lane that was idle joins at the current virtual time, so it
+                # cannot claim a backlog of turns it did not use
+                if not lane.waiters:
+                    lane.pass_value = max(lane.pass_value, self._virtual_time)
+                lane.waiters.append(ticket)
+
+                try:
+                    while not (
+                        self._has_room()
+                        and lane.waiters[0] is ticket
+                        and self._next_lane() is lane
+                    ):
+                        if background:
+                            self._cond.wait()
+                            continue
+
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            lane.rejected += 1
+                            raise AdmissionRejected(
+                                f"{self._in_flight} submissions already in progress, "
+                                f"{lane.in_flight} of them in the {lane.name} lane",
+                                retry_after,
+                            )
+                        self._cond.wait(remaining)
+                except BaseException:
+                    lane.waiters.remove(ticket)
+                    self._cond.notify_all()
+                    raise
+
+                lane.waiters.popleft()
+                self._virtual_time = lane.pass_value
+                lane.pass_value += 1.0 / lane.weight
+
+            lane.in_flight += 1
+            lane.admitted += 1
+            self._in_flight += 1
+            self._per_user[user_key] = self._per_user.get(user_key, 0) + 1
+            # The next waiter in line may be able to go too
+            self._cond.notify_all()
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                lane.in_flight -= 1
+                self._in_flight -= 1
+                self._per_user[user_key] -= 1
+                if not self._per_user[user_key]:
+                    del self._per_user[user_key]
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "max_per_user": self.max_per_user,
+                "in_flight": self._in_flight,
+                "users": len(self._per_user),
+                "waiting": sum(len(l.waiters) for l in self.lanes.values()),
+                "admitted": sum(l.admitted for l in self.lanes.values()),
+                "rejected": sum(l.rejected for l in self.lanes.values()),
+                "lanes": {name: l.as_dict() for name, l in self.lanes.items()},
+            }
+
+
+def parse_lane_settings(value: str) -> Dict[str, int]:
+    """
+    Parses a comma-separated list of lane=value settings, e.g. "interactive=8,bulk=1".
+    """
+    settings = {}
+    for entry in value.split(","):
+        name, _, setting = entry.partition("=")
+        if name.strip() and setting.strip():
+            settings[name.strip()] = int(setting)
+    return settings
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Returns the process-wide admission controller, creating it from the Flask
+    application configuration on first use.
+    """
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                config = current_app.config
+                weights = parse_lane_settings(config["SUBMISSION_LANE_WEIGHTS"])
+                limits = parse_lane_settings(config["SUBMISSION_LANE_LIMITS"])
+                lanes = {
+                    name: AdmissionLane(name, weights.get(name, 1), limits.get(name, 0))
+                    for name in (INTERACTIVE_LANE, RESUBMISSION_LANE, BULK_LANE, *weights, *limits)
+                }
+                _controller = AdmissionController(
+                    int(config["SUBMISSION_MAX_IN_FLIGHT"]),
+                    int(config["SUBMISSION_MAX_IN_FLIGHT_PER_USER"]),
+                    float(config["SUBMISSION_ADMISSION_WAIT"]),
+                    lanes,
+                )
+    return _controller
+
+
+def get_admission_stats() -> Dict[str, Any]:
+    """
+    Returns usage counters for the submission admission controller.
+    """
+    return _controller.stats() if _controller is not None else {}
+
+
+def get_submission_lane(user: Any) -> str:
+    """
+    Returns the lane for a submission from its auth principal: users signed in
+    to the UI are interactive, API keys are bulk.
+    """
+    if SESSION_USER_ID_KEY in session and session.get("user_cn") == user.user_cn:
+        return INTERACTIVE_LANE
+    return BULK_LANE
+
+
+def get_submission_key(user: Any) -> Hashable:
+    """
+    Returns the key the per-user limit is counted against: the user for UI
+    sessions, and the API key itself for API requests, so each of a user's
+    keys, and their UI session, has its own limit.
+    """
+    api_key = request.headers.get(API_KEY_HEADER)
+    if api_key and get_submission_lane(user) == BULK_LANE:
+        return ("api_key", api_key)
+    return user.id
+
+
+def admission_required(lane: Optional[str] = None):
+    """
+    Decorator factory to hold a submission slot while a view function runs.
+    Must be applied below auth_required, as it limits per authenticated user.
+    If the view returns a streamed response, the slot is held until the
+    response has been sent.
+
+    Args:
+        lane: The lane to schedule the view's submissions in. If None, the lane
+            is chosen from the auth principal with get_submission_lane.
+
+    Returns:
+        A decorator whose view responds with 429 and Retry-After when no slot is available.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(user, *args, **kwargs):
+            lane_name = lane or get_submission_lane(user)
+            try:
+                with ExitStack() as stack:
+                    stack.enter_context(
+                        get_admission_controller().admit(get_submission_key(user), lane_name)
+                    )
+                    result = f(user, *args, **kwargs)
+                    if isinstance(result, Response) and result.is_streamed:
+                        result.call_on_close(stack.pop_all().close)
+                    return result
+            except AdmissionRejected as e:
+                logging.warning(f"Submission from {user.user_cn} rejected: {e}")
+                response = jsonify(
+                    {
+                        "error": "Too many submissions in progress.",
+                        "details": str(e),
+                    }
+                )
+                response.headers["Retry-After"] = str(e.retry_after)
+                return response, 429
+
+        return decorated_function
+
+    return decorator
@@ -0,0 +1,157 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+
+from flask import current_app, request
+
+# Status code for a request the client abandoned before it completed
+CLIENT_CLOSED_REQUEST = 499
+
+
+class ScanCancelled(Exception):
+    """
+    Raised when a scan is stopped because its deadline passed or its client went away.
+
+    Attributes:
+        status_code (int): 504 for an expired deadline, 499 for a disconnected client.
+    """
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ScanDeadline:
+    """
+    The time budget for scanning one submission, shared by every Strelka call
+    made on its behalf.
+
+    A deadline can also be cancelled early, e.g. when the HTTP client
+    disconnects. Callbacks registered with on_cancel (such as a gRPC call's
+    cancel method) run when that happens.
+
+    Attributes:
+        timeout (float): The budget in seconds.
+        reason (str): Why the deadline was cancelled, if it was.
+        status_code (int): The HTTP status code describing the cancellation.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.reason: Optional[str] = None
+        self.status_code: Optional[int] = None
+        self._expires_at = time.monotonic() + timeout
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def remaining(self) -> float:
+        """
+        Returns the seconds left in the budget, or 0 if it has run out.
+        """
+        return max(0.0, self._expires_at - time.monotonic())
+
+    def cancel(self, reason: str, status_code: int) -> None:
+        """
+        Cancels the deadline and runs the registered callbacks. Later calls are ignored.
+        """
+        with self._lock:
+            if self.cancelled:
+                return
+            self.reason = reason
+            self.status_code = status_code
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Registers a callback to run on cancellation, running it at once if the
+        deadline is already cancelled.
+
+        Returns:
+            A function that unregisters the callback.
+        """
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def expire(self) -> None:
+        """
+        Cancels the deadline because its budget ran out.
+        """
+        self.cancel(f"Scan did not finish within {self.timeout:g} seconds", 504)
+
+    def check(self) -> None:
+        """
+        Raises:
+            ScanCancelled: If the deadline was cancelled or has run out.
+        """
+        if not self.remaining():
+            self.expire()
+        if self.cancelled:
+            raise ScanCancelled(self.reason, self.status_code)
+
+
+def get_scan_deadline(requested: Optional[float] = None) -> ScanDeadline:
+    """
+    Builds a deadline from STRELKA_SCAN_TIMEOUT, shortened to the timeout the
+    client asked for, if any.
+
+    Args:
+        requested: The client's timeout in seconds.
+
+    Returns:
+        ScanDeadline: The deadline for the submission.
+    """
+    timeout = float(current_app.config["STRELKA_SCAN_TIMEOUT"])
+    if requested and requested > 0:
+        timeout = min(timeout, requested)
+    return ScanDeadline(timeout)
+
+
+@contextmanager
+def cancel_on_disconnect(deadline: ScanDeadline, interval: float = 0.5) -> Iterator[None]:
+    """
+    Context manager that cancels the deadline if the HTTP client disconnects
+    while the block runs.
+
+    Relies on waitress' client_disconnected hook, which is only available when
+    the server runs with channel_request_lookahead. Otherwise this does nothing.
+
+    Args:
+        deadline: The deadline to cancel.
+        interval: Seconds between connection checks.
+    """
+    is_disconnected = request.environ.get("waitress.client_disconnected")
+    if is_disconnected is None:
+        yield
+        return
+
+    stop = threading.Event()
+
+    def watch() -> None:
+        while not stop.wait(interval):
+            if is_disconnected():
+                deadline.cancel("Client disconnected", CLIENT_CLOSED_REQUEST)
+                return
+
+    watcher = threading.Thread(target=watch, name="disconnect-watch", daemon=True)
+    watcher.start()
+    try:
+        yield
+    finally:
+        stop.set()
@@ -1,4 +1,6 @@
+import hashlib
 import os
+import shutil
 import tempfile
 import zipfile
 import rarfile
@@ -8,7 +10,7 @@ import magic
 
 from io import BytesIO
 from werkzeug.datastructures import FileStorage
-from typing import Tuple, List, Union
+from typing import Dict, Tuple, List, Union
 
 
 def decrypt_file(
@@ -153,3 +155,121 @@ def convert_bytesio_to_filestorage(file_bytes: BytesIO, filename: str) -> FileSt
     )
 
     return file_storage
+
+
+def spool_file(file_storage: FileStorage, max_memory: int = 1024 * 1024) -> FileStorage:
+    """
+    Copies a file into a spooled temporary file owned by the caller.
+    Werkzeug closes uploaded files when the request ends, so files handed to
+    background workers must be copied first. Small files stay in memory and
+    larger ones roll over to disk.
+
+    Args:
+        file_storage (FileStorage): The file to copy.
+        max_memory (int): The size in bytes above which the copy is written to disk.
+
+    Returns:
+        FileStorage: A FileStorage object backed by the spooled copy.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    file_storage.stream.seek(0)
+    shutil.copyfileobj(file_storage.stream, spooled)
+    spooled.seek(0)
+
+    return FileStorage(
+        stream=spooled,
+        filename=file_storage.filename,
+        content_type=file_storage.content_type,
+    )
+
+
+def unpack_zip_stream(
+        stream, password: str, max_memory: int = 1024 * 1024
+) -> List[FileStorage]:
+    """
+    Unpacks a password-protected zip archive from an open file, decompressing
+    each member straight into a spooled temporary file, without first writing
+    the archive or its members to a temporary directory.
+
+    Args:
+        stream: A seekable binary file holding the archive.
+        password (str): The password the archive was encrypted with.
+        max_memory (int): The size in bytes above which a member is written to disk.
+
+    Returns:
+        List[FileStorage]: A FileStorage object for each file in the archive,
+        owned by the caller.
+
+    Raises:
+        zipfile.BadZipFile: If the stream is not a zip archive.
+        RuntimeError: If the password is wrong.
+    """
+    files = []
+    try:
+        with zipfile.ZipFile(stream, "r") as zfile:
+            for info in zfile.infolist():
+                if info.is_dir():
+                    continue
+                spooled = tempfile.SpooledTemporaryFile(max_size=max_memory)
+                files.append(
+                    FileStorage(
+                        stream=spooled,
+                        filename=os.path.basename(info.filename),
+                        content_type=mimetypes.guess_type(info.filename)[0],
+                    )
+                )
+                with zfile.open(info, pwd=password.encode()) as member:
+                    shutil.copyfileobj(member, spooled)
+                spooled.seek(0)
+    except BaseException:
+        for file in files:
+            file.stream.close()
+        raise
+
+    return files
+
+
+def hash_file(file_storage: FileStorage, chunk: int = 1024 * 1024) -> str:
+    """
+    Computes the SHA256 of a file by reading its stream in chunks, then rewinds it.
+
+    Args:
+        file_storage (FileStorage): The file to hash.
+        chunk (int): The number of bytes to read at a time.
+
+    Returns:
+        str: The hex SHA256 digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    stream = file_storage.stream
+    stream.seek(0)
+    for buffer in iter(lambda: stream.read(chunk), b""):
+        digest.update(buffer)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def file_digests(
+        file_storage: FileStorage,
+        algorithms: Tuple[str, ...] = ("md5", "sha1", "sha256"),
+        chunk: int = 1024 * 1024,
+) -> Dict[str, str]:
+    """
+    Computes several digests of a file in a single pass over its stream, then rewinds it.
+
+    Args:
+        file_storage (FileStorage): The file to hash.
+        algorithms (Tuple[str, ...]): The hashlib algorithms to compute.
+        chunk (int): The number of bytes to read at a time.
+
+    Returns:
+        Dict[str, str]: The hex digest of the file contents for each algorithm.
+    """
+    digests = {name: hashlib.new(name) for name in algorithms}
+    stream = file_storage.stream
+    stream.seek(0)
+    for buffer in iter(lambda: stream.read(chunk), b""):
+        for digest in digests.values():
+            digest.update(buffer)
+    stream.seek(0)
+    return {name: digest.hexdigest() for name, digest in digests.items()}
@@ -0,0 +1,262 @@
+import contextlib
+import datetime
+import logging
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Flask, current_app
+from werkzeug.datastructures import FileStorage
+
+from strelka_ui.database import db
+from strelka_ui.services.admission import BULK_LANE, get_admission_controller
+from strelka_ui.models import SubmissionJob, User
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class BoundedExecutor:
+    """
+    A thread pool that rejects work once a fixed number of tasks are running
+    or waiting, instead of queueing without limit.
+
+    Attributes:
+        max_workers (int): The number of worker threads.
+        max_pending (int): The number of tasks that may run or wait at once.
+    """
+
+    def __init__(self, max_workers: int, max_queued: int, thread_name_prefix: str):
+        self.max_workers = max(1, max_workers)
+        self.max_pending = self.max_workers + max(0, max_queued)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix=thread_name_prefix
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._rejected = 0
+
+    def submit(self, fn: Callable, *args: Any, **kwargs: Any) -> Future:
+        """
+        Schedules fn(*args, **kwargs) on the pool.
+
+        Raises:
+            JobQueueFull: If max_pending tasks are already running or waiting.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise JobQueueFull(
+                    f"{self._pending} tasks are already running or queued"
+                )
+            self._pending += 1
+
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "rejected": self._rejected,
+            }
+
+
+_executor: Optional[BoundedExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_job_executor() -> BoundedExecutor:
+    """
+    Returns the process-wide executor for asynchronous submissions, creating it
+    from the Flask application configuration on first use.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = BoundedExecutor(
+                    int(current_app.config["SUBMISSION_JOB_WORKERS"]),
+                    int(current_app.config["SUBMISSION_JOB_QUEUE_SIZE"]),
+                    "submission-job",
+                )
+    return _executor
+
+
+def get_job_stats() -> Dict[str, int]:
+    """
+    Returns usage counters for the asynchronous submission executor.
+    """
+    return _executor.stats() if _executor is not None else {}
+
+
+def enqueue_submission_job(
+    user: User,
+    file_name: str,
+    submitted_type: str,
+    fn: Callable[..., Tuple[Dict[str, Any], int]],
+    *args: Any,
+    admit: bool = True,
+) -> SubmissionJob:
+    """
+    Records a queued SubmissionJob and schedules fn to run in the background.
+
+    fn is called as fn(user, *args) inside an application context, with the
+    user loaded in the worker's own database session. It must return the
+    response payload and HTTP status code of the equivalent synchronous call.
+
+    Args:
+        user: The authenticated user submitting the file.
+        file_name: The name of the submitted file.
+        submitted_type: The type of submission (e.g., 'api', 'virustotal').
+        fn: The submission function to run.
+        *args: Additional arguments for fn.
+        admit: If False, fn is not given a Strelka admission slot and must
+            take one itself, e.g. after slow work that does not use Strelka.
+
+    Returns:
+        SubmissionJob: The queued job.
+
+    Raises:
+        JobQueueFull: If the executor cannot accept more work.
+    """
+    job = SubmissionJob(
+        job_id=str(uuid.uuid4()),
+        status="queued",
+        file_name=file_name,
+        submitted_type=submitted_type,
+        submitted_by_user_id=user.id,
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    try:
+        get_job_executor().submit(
+            run_submission_job, app, job.job_id, fn, *args, admit=admit
+        )
+    except JobQueueFull:
+        db.session.delete(job)
+        db.session.commit()
+        close_job_files(args)
+        raise
+
+    return job
+
+
+def fail_interrupted_jobs() -> int:
+    """
+    Marks jobs left queued or running by a previous process as failed. Jobs
+    only run on the executor of the process that accepted them, so after a
+    restart nothing will finish them and their clients would poll forever.
+    Must be called in an application context, before any jobs are accepted.
+
+    Returns:
+        int: The number of jobs marked failed.
+    """
+    count = SubmissionJob.query.filter(
+        SubmissionJob.status.in_(("queued", "running"))
+    ).update(
+        {
+            SubmissionJob.status: "failed",
+            SubmissionJob.status_code: 503,
+            SubmissionJob.result: {
+                "error": "Strelka submission was not successful.",
+                "details": "The server restarted before the job finished. Resubmit the file.",
+            },
+            SubmissionJob.finished_at: datetime.datetime.utcnow(),
+        },
+        synchronize_session=False,
+    )
+    db.session.commit()
+    if count:
+        logging.warning(f"Marked {count} submission jobs interrupted by a restart as failed")
+    return count
+
+
+def close_job_files(args: Tuple[Any, ...]) -> None:
+    """
+    Closes the files passed to a job, alone or in a list. They are spooled
+    copies made for the job, so nothing else closes them.
+
+    Args:
+        args: The arguments the job function was given.
+    """
+    for arg in args:
+        for f in arg if isinstance(arg, (list, tuple)) else [arg]:
+            if isinstance(f, FileStorage):
+                try:
+                    f.stream.close()
+                except Exception as e:
+                    logging.warning(f"Error closing job file {f.filename}: {e}")
+
+
+def run_submission_job(
+    app: Flask,
+    job_id: str,
+    fn: Callable[..., Tuple[Dict[str, Any], int]],
+    *args: Any,
+    admit: bool = True,
+) -> None:
+    """
+    Executes a queued submission and records its outcome on the job.
+
+    Args:
+        app: The Flask application to run the job in.
+        job_id: The public identifier of the job.
+        fn: The submission function to run.
+        *args: Additional arguments for fn.
+        admit: Whether to hold a Strelka admission slot while fn runs.
+    """
+    with app.app_context():
+        job = SubmissionJob.query.filter_by(job_id=job_id).first()
+        if not job:
+            logging.error(f"Submission job {job_id} not found")
+            close_job_files(args)
+            return
+
+        job.status = "running"
+        job.started_at = datetime.datetime.utcnow()
+        db.session.commit()
+
+        try:
+            user = db.session.get(User, job.submitted_by_user_id)
+            # Background submissions share Strelka with everyone else, at bulk priority
+            admission = (
+                get_admission_controller().admit(user.id, BULK_LANE, background=True)
+                if admit
+                else contextlib.nullcontext()
+            )
+            with admission:
+                payload, status_code = fn(user, *args)
+        except Exception as e:
+            logging.error(f"Submission job {job_id} failed: {e}")
+            db.session.rollback()
+            payload, status_code = {
+                "error": "Strelka submission was not successful.",
+                "details": str(e),
+            }, 500
+        finally:
+            close_job_files(args)
+
+        # The Strelka events are stored on the FileSubmission, so only keep the rest
+        job.status = "succeeded" if status_code == 200 else "failed"
+        job.status_code = status_code
+        job.file_id = payload.get("file_id")
+        job.result = {k: v for k, v in payload.items() if k != "response"}
+        job.finished_at = datetime.datetime.utcnow()
+        db.session.commit()
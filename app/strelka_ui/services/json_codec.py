@@ -0,0 +1,130 @@
+"""
+JSON encoding and decoding for Strelka events and API responses.
+
+Uses orjson, which parses and serializes large scan results several times
+faster than the standard library, and falls back to the json module if it
+is not installed. orjson only supports 64-bit integers: it reads wider ones
+as floats, losing precision, and cannot write them, so dumps falls back to
+the json module for values containing them. It also writes NaN and Infinity
+as null.
+"""
+
+import json
+from typing import Any, List, Union
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Like the json module, accept non-string keys by converting them
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Parses a JSON document.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # The json module also accepts the NaN and Infinity Python emits
+            pass
+    return json.loads(data)
+
+
+class RawJSON:
+    """
+    JSON text to be written verbatim by dumps, along with the parsed value
+    to write instead if the json module has to be used.
+
+    Attributes:
+        text (str): The JSON text.
+        parsed (Any): The same document, already parsed.
+    """
+
+    __slots__ = ("text", "parsed")
+
+    def __init__(self, text: str, parsed: Any):
+        self.text = text
+        self.parsed = parsed
+
+
+def _orjson_default(obj: Any) -> Any:
+    if isinstance(obj, RawJSON):
+        return orjson.Fragment(obj.text)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, RawJSON):
+        return obj.parsed
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any) -> str:
+    """
+    Serializes a value to compact JSON text.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_orjson_default, option=ORJSON_OPTIONS).decode()
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits, which the json module handles
+            pass
+    return json.dumps(obj, default=_json_default, separators=(",", ":"))
+
+
+def copy_events(events: List[Any]) -> List[Any]:
+    """
+    Deep-copies JSON data, such as a list of Strelka events, by round-tripping
+    it through the encoder, which is much faster than copy.deepcopy.
+    """
+    return loads(dumps(events))
+
+
+def fragment(text: str, parsed: Any) -> Any:
+    """
+    Returns a value that dumps serializes as the given JSON text verbatim, so
+    an event can be passed on without re-encoding it. If dumps has to fall
+    back to the json module, or orjson is not installed, the parsed value is
+    encoded instead.
+
+    Args:
+        text: The JSON text.
+        parsed: The same document, already parsed.
+    """
+    if orjson is not None:
+        return RawJSON(text, parsed)
+    return parsed
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes responses with orjson when it is
+    installed, producing the same output as the default provider: sorted
+    keys and HTTP dates.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or set(kwargs) - {"indent", "separators"}:
+            return super().dumps(obj, **kwargs)
+
+        # Dates go through self.default, which formats them as HTTP dates
+        option = ORJSON_OPTIONS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get("indent"):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        except orjson.JSONEncodeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s: Union[str, bytes], **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return loads(s)
@@ -0,0 +1,73 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket allowing `rate` acquisitions every `per`
+    seconds, with bursts of up to `capacity`.
+
+    Callers reserve tokens in arrival order and then sleep until their token
+    is due, so earlier callers are never overtaken by later ones.
+
+    Attributes:
+        rate (float): Tokens added every `per` seconds.
+        per (float): The refill period in seconds.
+        capacity (float): The most tokens the bucket can hold.
+    """
+
+    def __init__(self, rate: float, per: float = 60.0, capacity: Optional[float] = None):
+        self.rate = rate
+        self.per = per
+        self.capacity = capacity if capacity is not None else rate
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._acquired = 0
+        self._rejected = 0
+        self._waited = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate / self.per
+        )
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Takes a token, waiting for one to become available if necessary.
+
+        Args:
+            timeout: The longest to wait, in seconds. None waits as long as it takes.
+
+        Returns:
+            bool: True if a token was taken, False if none would be available in time.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # A negative balance is tokens already promised to earlier callers
+            wait = max(0.0, (1 - self._tokens) * self.per / self.rate)
+            if timeout is not None and wait > timeout:
+                self._rejected += 1
+                return False
+            self._tokens -= 1
+            self._acquired += 1
+            self._waited += wait
+
+        if wait:
+            time.sleep(wait)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": self.rate,
+                "per_seconds": self.per,
+                "tokens": round(self._tokens, 2),
+                "acquired": self._acquired,
+                "rejected": self._rejected,
+                "waited_seconds": round(self._waited, 2),
+            }
@@ -0,0 +1,180 @@
+import logging
+import math
+from typing import Any, Callable, Dict, List
+
+from flask import current_app
+
+# Define the priority of each mimetype (For VirusTotal Scanning Priorization)
+MIMETYPE_PRIORITY = {
+    "application/x-dosexec": 1,  # Executables
+    "application/x-executable": 1,
+    "application/vnd.microsoft.portable-executable": 1,
+    "application/x-elf": 1,
+    "application/zip": 2,  # Archives
+    "application/x-rar-compressed": 2,
+    "application/x-msi": 2,
+    "application/x-7z-compressed": 2,
+    "application/vnd.ms-cab-compressed": 2,
+    "application/x-tar": 2,
+    "application/gzip": 2,
+    "application/octet-stream": 2,  # Unknown streams
+    "text/plain": 3,  # Scripts and source code
+    "text/x-script": 3,
+    "text/javascript": 3,
+    "application/x-bat": 3,
+    "application/x-sh": 3,
+    "application/x-python": 3,
+    "text/x-python": 3,
+    "text/html": 4,  # Web files
+    "application/xhtml+xml": 4,
+    "text/xml": 4,
+    "text/css": 4,
+    "application/pdf": 5,  # Documents
+    "application/msword": 5,
+    "application/vnd.ms-excel": 5,
+    "application/vnd.ms-powerpoint": 5,
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": 5,
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": 5,
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": 5,
+    # Images
+    "image/jpeg": 10,
+    "image/png": 10,
+    "image/gif": 10,
+    "image/webp": 10,
+    "image/tiff": 10,
+    "image/bmp": 10,
+    "image/svg+xml": 10,
+    # Other file types
+    "application/json": 20,  # Data formats
+    "application/xml": 20,
+}
+
+
+def get_mimetype_priority(mime_list: List[str]) -> int:
+    """
+    Returns the highest priority of the mimetypes in the list.
+    """
+    return min(MIMETYPE_PRIORITY.get(mime, 9999) for mime in mime_list)
+
+
+def yara_signal(event: Dict[str, Any]) -> float:
+    """
+    Scores YARA matches, ignoring informational rules such as MIME type tags.
+    """
+    yara = event.get("scan", {}).get("yara", {})
+    informational = set(yara.get("information") or [])
+    matches = [rule for rule in yara.get("matches") or [] if rule not in informational]
+    return min(1.0, len(matches) / 3)
+
+
+def entropy_signal(event: Dict[str, Any]) -> float:
+    """
+    Scores entropy from 6 bits per byte up, as packed and encrypted content nears 8.
+    """
+    entropy = event.get("scan", {}).get("entropy", {}).get("entropy", 0)
+    return min(1.0, max(0.0, (entropy - 6) / 2))
+
+
+def unsigned_pe_signal(event: Dict[str, Any]) -> float:
+    """
+    Scores PE files without an Authenticode signature.
+    """
+    pe = event.get("scan", {}).get("pe")
+    return 1.0 if pe and not pe.get("security") else 0.0
+
+
+def mimetype_signal(event: Dict[str, Any]) -> float:
+    """
+    Scores files by MIMETYPE_PRIORITY, executables highest.
+    """
+    return 1.0 / get_mimetype_priority(event["file"]["flavors"]["mime"] or [""])
+
+
+def depth_signal(event: Dict[str, Any]) -> float:
+    """
+    Scores the submitted file highest, and files extracted from it less the
+    deeper they are nested.
+    """
+    return 1.0 / (1 + event["file"].get("depth", 0))
+
+
+def size_signal(event: Dict[str, Any]) -> float:
+    """
+    Scores files by the order of magnitude of their size, reaching 1 at 1 MB,
+    so tiny resources and stubs rank below substantial payloads.
+    """
+    size = event["file"].get("size", 0)
+    return min(1.0, math.log10(max(size, 1)) / 6)
+
+
+# Each signal maps a Strelka event to a value from 0 to 1. Add a function here
+# and give it a weight in VIRUSTOTAL_RISK_WEIGHTS to use it.
+RISK_SIGNALS: Dict[str, Callable[[Dict[str, Any]], float]] = {
+    "yara": yara_signal,
+    "entropy": entropy_signal,
+    "unsigned_pe": unsigned_pe_signal,
+    "mimetype": mimetype_signal,
+    "depth": depth_signal,
+    "size": size_signal,
+}
+
+
+def parse_risk_weights(value: str) -> Dict[str, float]:
+    """
+    Parses a comma-separated list of signal=weight settings, e.g. "yara=4,size=1".
+    """
+    weights = {}
+    for entry in value.split(","):
+        name, _, weight = entry.partition("=")
+        if name.strip() and weight.strip():
+            weights[name.strip()] = float(weight)
+    return weights
+
+
+def score_event(event: Dict[str, Any], weights: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Scores how much a Strelka event warrants a VirusTotal lookup.
+
+    Args:
+        event: The Strelka event.
+        weights: The weight of each signal in RISK_SIGNALS to use.
+
+    Returns:
+        A dictionary with the weighted `score` and each signal's value under `signals`.
+    """
+    signals = {}
+    for name, weight in weights.items():
+        signal = RISK_SIGNALS.get(name)
+        if signal is None or not weight:
+            continue
+        try:
+            signals[name] = round(signal(event), 3)
+        except Exception as e:
+            logging.warning(f"Could not compute risk signal {name}: {e}")
+            signals[name] = 0.0
+
+    score = sum(weights[name] * value for name, value in signals.items())
+    return {"score": round(score, 3), "signals": signals}
+
+
+def rank_by_risk(response: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Scores each Strelka event with VIRUSTOTAL_RISK_WEIGHTS and orders them
+    highest risk first. Events with equal scores keep their original order.
+    Each event's score is kept in its enrichment.risk for auditing.
+
+    Args:
+        response: The Strelka events.
+
+    Returns:
+        The events, highest risk first.
+    """
+    weights = parse_risk_weights(current_app.config["VIRUSTOTAL_RISK_WEIGHTS"])
+    scores = []
+    for event in response:
+        risk = score_event(event, weights)
+        event.setdefault("enrichment", {})["risk"] = risk
+        scores.append(risk["score"])
+
+    order = sorted(range(len(response)), key=lambda index: -scores[index])
+    return [response[index] for index in order]
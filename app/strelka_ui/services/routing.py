@@ -0,0 +1,136 @@
+import fnmatch
+import json
+import logging
+import mimetypes
+import os
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from flask import current_app
+
+from strelka_ui.strelka.client import DEFAULT_CLUSTER, get_configured_clusters
+
+# Conditions a routing rule may set. All conditions in a rule must match.
+RULE_CONDITIONS = ("min_size", "max_size", "mime_types", "users", "submitted_types")
+
+
+@lru_cache(maxsize=8)
+def parse_routing_rules(value: str, clusters: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    """
+    Parses and validates the STRELKA_ROUTING_RULES JSON list.
+
+    Each rule names a `cluster` and any of the conditions in RULE_CONDITIONS, e.g.
+    {"cluster": "heavy", "mime_types": ["image/*"], "min_size": 1048576}.
+
+    Args:
+        value (str): The JSON list of rules.
+        clusters (Tuple[str, ...]): The names of the configured clusters.
+
+    Returns:
+        List[Dict[str, Any]]: The rules, in order.
+
+    Raises:
+        ValueError: If the rules are malformed or name an unknown cluster.
+    """
+    rules = json.loads(value) if value.strip() else []
+    if not isinstance(rules, list):
+        raise ValueError("STRELKA_ROUTING_RULES must be a JSON list of rules")
+
+    for index, rule in enumerate(rules):
+        if not isinstance(rule, dict) or "cluster" not in rule:
+            raise ValueError(f"Routing rule {index} must be an object with a cluster")
+        unknown = set(rule) - set(RULE_CONDITIONS) - {"cluster"}
+        if unknown:
+            raise ValueError(f"Routing rule {index} has unknown conditions: {sorted(unknown)}")
+        if rule["cluster"] not in clusters:
+            raise ValueError(f"Routing rule {index} names unknown cluster {rule['cluster']}")
+
+    return rules
+
+
+def get_declared_mime_type(file: Any) -> str:
+    """
+    Returns the MIME type the client declared for the file, falling back to a
+    guess from its file name.
+    """
+    return (
+        getattr(file, "content_type", None)
+        or mimetypes.guess_type(file.filename or "")[0]
+        or "application/octet-stream"
+    )
+
+
+def rule_matches(
+    rule: Dict[str, Any], size: int, mime_type: str, user_cn: str, submitted_type: str
+) -> bool:
+    """
+    Checks whether a submission satisfies every condition of a routing rule.
+    MIME types may use shell-style wildcards, e.g. "image/*".
+    """
+    if "min_size" in rule and size < int(rule["min_size"]):
+        return False
+    if "max_size" in rule and size > int(rule["max_size"]):
+        return False
+    if "mime_types" in rule and not any(
+        fnmatch.fnmatch(mime_type, pattern) for pattern in rule["mime_types"]
+    ):
+        return False
+    if "users" in rule and user_cn not in rule["users"]:
+        return False
+    if "submitted_types" in rule and submitted_type not in rule["submitted_types"]:
+        return False
+    return True
+
+
+_routed = Counter()
+_routed_lock = threading.Lock()
+
+
+def route_submission(file: Any, user_cn: str, submitted_type: str) -> str:
+    """
+    Picks the Strelka cluster for a submission using the first matching rule in
+    STRELKA_ROUTING_RULES, or the default cluster if none match.
+
+    Args:
+        file: File object to be submitted.
+        user_cn: Common name of the submitting user.
+        submitted_type: Type of submission (e.g., 'api', 'virustotal', 'resubmission').
+
+    Returns:
+        str: The name of the cluster to scan the file on.
+    """
+    config = current_app.config
+    rules = parse_routing_rules(
+        config["STRELKA_ROUTING_RULES"], tuple(get_configured_clusters())
+    )
+
+    cluster = DEFAULT_CLUSTER
+    if rules:
+        stream = file.stream
+        position = stream.tell()
+        size = stream.seek(0, os.SEEK_END)
+        stream.seek(position)
+        mime_type = get_declared_mime_type(file)
+
+        for rule in rules:
+            if rule_matches(rule, size, mime_type, user_cn, submitted_type):
+                cluster = rule["cluster"]
+                break
+
+        logging.debug(
+            f"Routing {file.filename} ({mime_type}, {size} bytes, {submitted_type}) to {cluster}"
+        )
+
+    with _routed_lock:
+        _routed[cluster] += 1
+    return cluster
+
+
+def get_routing_stats() -> Dict[str, int]:
+    """
+    Returns the number of submissions routed to each cluster.
+    """
+    with _routed_lock:
+        return dict(_routed)
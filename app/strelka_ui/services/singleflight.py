@@ -0,0 +1,121 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from strelka_ui.services.deadline import ScanDeadline
+
+
+class _Call:
+    """
+    A single in-progress call shared by every caller with the same key.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+        # Set when the call completes, alongside done, to wake each follower
+        self.wakers: List[threading.Event] = []
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running wait for it and receive the same result, or the same
+    exception. A caller with a deadline stops waiting when its own deadline
+    runs out or is cancelled. Nothing is cached once the call completes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._leaders = 0
+        self._followers = 0
+        self._abandoned = 0
+
+    def do(
+        self, key: Hashable, fn: Callable[[], Any], deadline: Optional[ScanDeadline] = None
+    ) -> Tuple[Any, bool]:
+        """
+        Runs fn, or waits for the in-progress call with the same key.
+
+        Args:
+            key: Identifies calls that may share a result.
+            fn: The function to run if no call with this key is in progress.
+            deadline: Limits how long this caller waits for another's call.
+                None waits as long as it takes.
+
+        Returns:
+            The result of fn and whether it was shared from another caller.
+
+        Raises:
+            ScanCancelled: If the deadline ran out or was cancelled while waiting.
+            Exception: Whatever the shared call raised.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self._leaders += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self._followers += 1
+                leader = False
+
+        if not leader:
+            self._wait(call, deadline)
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                call.done.set()
+                for waker in call.wakers:
+                    waker.set()
+
+        return call.result, False
+
+    def _wait(self, call: _Call, deadline: Optional[ScanDeadline]) -> None:
+        if deadline is None:
+            call.done.wait()
+            return
+
+        woken = threading.Event()
+        with self._lock:
+            call.wakers.append(woken)
+            if call.done.is_set():
+                woken.set()
+        unregister = deadline.on_cancel(woken.set)
+        try:
+            while not call.done.is_set():
+                try:
+                    deadline.check()
+                except Exception:
+                    with self._lock:
+                        call.waiters -= 1
+                        self._abandoned += 1
+                    raise
+                woken.wait(deadline.remaining())
+        finally:
+            unregister()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "waiting": sum(c.waiters for c in self._calls.values()),
+                "leaders": self._leaders,
+                "followers": self._followers,
+                # Followers that stopped waiting when their own deadline ran out
+                "abandoned": self._abandoned,
+            }
@@ -1,46 +1,51 @@
 import errno
 import logging
+import os
 import socket
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
 
 from flask import current_app
 
-from strelka_ui.strelka.submit_to_strelka import submit_file_to_strelka
+from strelka_ui.services.deadline import ScanCancelled, ScanDeadline
+from strelka_ui.strelka.client import (
+    StrelkaBalancer,
+    get_configured_frontends,
+    get_strelka_balancer,
+)
+from strelka_ui.strelka.submit_to_strelka import stream_file_to_strelka, submit_file_to_strelka
 
 
 def get_frontend_status() -> bool:
     """
-    Checks if the Strelka frontend is online.
+    Checks if any of the configured Strelka frontends is online.
     This is really only useful if using an external Strelka instance / DB.
     Prone to errors unless someone can figure out how to ping a local strelka container / postgresdb container
 
     Returns:
-        bool: True if the frontend is online, False otherwise.
+        bool: True if a frontend is online, False otherwise.
     """
 
     # Get logger instance for logging messages
     logger = logging.getLogger("waitress")
 
-    # Get Strelka host and port from Flask application configuration
-    strelka_host = current_app.config["STRELKA_HOST"]
-    strelka_port = int(current_app.config["STRELKA_PORT"])
+    # Get the Strelka frontends from Flask application configuration
+    for target, _ in get_configured_frontends():
+        strelka_host, _, strelka_port = target.rpartition(":")
 
-    try:
-        # Create a connection to the Strelka frontend
-        socket.create_connection((strelka_host, strelka_port), timeout=5)
+        try:
+            # Create a connection to the Strelka frontend
+            socket.create_connection((strelka_host, int(strelka_port)), timeout=5)
 
-        # If the connection is successful, return True
-        return True
+            # If the connection is successful, return True
+            return True
 
-    except socket.error as e:
-        # If the connection fails with a connection refused error, return False
-        if e.errno == errno.ECONNREFUSED:
-            return False
+        except socket.error as e:
+            # If the connection fails with any error other than connection refused, log it
+            if e.errno != errno.ECONNREFUSED:
+                logger.error(f"failed to contact {strelka_host} for a health check: {e}")
 
-        # If the connection fails with any other error, log the error and return False
-        else:
-            logger.error(f"failed to contact {strelka_host} for a health check: {e}")
-            return False
+    # No frontend could be reached
+    return False
 
 
 def get_db_status() -> bool:
@@ -78,30 +83,40 @@ def get_db_status() -> bool:
 
 
 def submit_data(
-    file: Any, meta: Dict[str, Any], file_hash: str, bypass_gatekeeper: bool = False
+    file: Any,
+    meta: Dict[str, Any],
+    file_hash: str,
+    bypass_gatekeeper: bool = False,
+    deadline: Optional[ScanDeadline] = None,
+    balancer: Optional[StrelkaBalancer] = None,
 ) -> Tuple[bool, str, int]:
     """
     Submit a file to Strelka for analysis and return the result.
 
     Args:
-        file (Any): The file to be submitted.
+        file (Any): The file to be submitted. Its seekable stream is read in chunks rather than loaded into memory.
         meta (dict): A dictionary of metadata to be included with the submission.
         file_hash (str): Used as a filename if uploading via VirusTotal
         bypass_gatekeeper (bool): If True, bypasses gatekeeper caching for this request.
+        deadline (Optional[ScanDeadline]): The submission's time budget.
+        balancer (Optional[StrelkaBalancer]): The Strelka cluster to submit to. Defaults to the default cluster.
 
     Returns:
         tuple: A tuple containing a boolean indicating whether the submission was successful,
             a dictionary containing the response from Strelka, and an integer representing the
             size of the submitted file.
 
+    Raises:
+        ScanCancelled: If the deadline ran out or was cancelled before the scan finished.
     """
     logger = logging.getLogger("waitress")
 
-    strelka_host = current_app.config["STRELKA_HOST"]
-    strelka_port = current_app.config["STRELKA_PORT"]
-
     if file:
-        sample_data = file.read()
+        # Stream the upload (or its spooled temp file) into Strelka rather than reading it into memory
+        sample_data = file.stream
+        sample_data.seek(0, os.SEEK_END)
+        sample_size = sample_data.tell()
+        sample_data.seek(0)
 
         if file_hash:
             file_name = file_hash
@@ -113,14 +128,16 @@ def submit_data(
             response = submit_file_to_strelka(
                 file_name,
                 sample_data,
-                f"{strelka_host}:{strelka_port}",
+                balancer or get_strelka_balancer(),
                 meta,
                 bypass_gatekeeper=bypass_gatekeeper,
+                size=sample_size,
+                deadline=deadline,
             )
 
             # Return a tuple indicating success, the response from Strelka, and the file size
             if response:
-                return True, response, len(sample_data)
+                return True, response, sample_size
             else:
                 logger.error(
                     f"Failed to submit {file_name} to strelka. Please check the submitted file."
@@ -132,6 +149,9 @@ def submit_data(
                     0,
                 )
 
+        except ScanCancelled:
+            raise
+
         except Exception as e:
             logger.error(f"Failed to submit {file_name} to strelka: {e}")
             # Return a tuple indicating failure, an empty dictionary, and a file size of 0
@@ -143,3 +163,49 @@ def submit_data(
         f"Failed to submit file to strelka. Please check the submitted file.",
         0,
     )
+
+
+def stream_data(
+    file: Any,
+    meta: Dict[str, Any],
+    file_hash: str,
+    bypass_gatekeeper: bool = False,
+    deadline: Optional[ScanDeadline] = None,
+    balancer: Optional[StrelkaBalancer] = None,
+    raw: bool = False,
+) -> Iterator[Union[Dict[str, Any], str]]:
+    """
+    Submit a file to Strelka for analysis, yielding each event as Strelka returns it.
+    Unlike submit_data, failures are raised rather than returned.
+
+    Args:
+        file (Any): The file to be submitted. Its seekable stream is read in chunks rather than loaded into memory.
+        meta (dict): A dictionary of metadata to be included with the submission.
+        file_hash (str): Used as a filename if uploading via VirusTotal
+        bypass_gatekeeper (bool): If True, bypasses gatekeeper caching for this request.
+        deadline (Optional[ScanDeadline]): The submission's time budget.
+        balancer (Optional[StrelkaBalancer]): The Strelka cluster to submit to. Defaults to the default cluster.
+        raw (bool): If True, yield each event's JSON text as Strelka sent it, unparsed.
+
+    Returns:
+        Iterator[Union[Dict[str, Any], str]]: The events generated by Strelka.
+
+    Raises:
+        ScanCancelled: If the deadline ran out or was cancelled before the scan finished.
+        grpc.RpcError: If the scan failed for any other reason.
+    """
+    sample_data = file.stream
+    sample_data.seek(0, os.SEEK_END)
+    sample_size = sample_data.tell()
+    sample_data.seek(0)
+
+    return stream_file_to_strelka(
+        file_hash or file.filename,
+        sample_data,
+        balancer or get_strelka_balancer(),
+        meta,
+        bypass_gatekeeper=bypass_gatekeeper,
+        size=sample_size,
+        deadline=deadline,
+        raw=raw,
+    )
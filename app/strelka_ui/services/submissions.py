@@ -0,0 +1,1372 @@
+import datetime
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from flask import Flask, current_app
+from sqlalchemy import ARRAY, String, cast
+from sqlalchemy.dialects.postgresql import array
+
+from strelka_ui.database import db
+from strelka_ui.models import (
+    FileSubmission,
+    User,
+    get_all_insights,
+    get_highest_vt,
+    get_request_id,
+)
+from strelka_ui.services import json_codec
+from strelka_ui.services.admission import BULK_LANE, get_admission_controller
+from strelka_ui.services.deadline import CLIENT_CLOSED_REQUEST, ScanCancelled, ScanDeadline
+from strelka_ui.services.files import file_digests, hash_file, unpack_zip_stream
+from strelka_ui.services.jobs import BoundedExecutor, JobQueueFull
+from strelka_ui.services.risk import rank_by_risk
+from strelka_ui.services.routing import route_submission
+from strelka_ui.services.s3 import upload_file, calculate_expires_at, is_s3_enabled
+from strelka_ui.services.singleflight import SingleFlight
+from strelka_ui.services.strelka import stream_data, submit_data
+from strelka_ui.services.ratelimit import TokenBucket
+from strelka_ui.services.virustotal import (
+    LIMIT_REACHED,
+    LOOKUP_ERROR,
+    LOOKUP_PENDING,
+    VirusTotalClient,
+    create_vt_zip_and_download,
+    get_virustotal_client,
+    get_virustotal_rate_limiter,
+    query_virustotal_positives,
+)
+from strelka_ui.services.virustotal_cache import get_virustotal_cache
+from strelka_ui.services.virustotal_quota import get_virustotal_quota
+from strelka_ui.strelka.client import DEFAULT_CLUSTER, get_strelka_balancer
+
+# VirusTotal encrypts the ZIPs it prepares with this password
+VIRUSTOTAL_ZIP_PASSWORD = "infected"
+
+class SubmissionError(Exception):
+    """
+    Raised when a file cannot be submitted to Strelka.
+
+    Attributes:
+        payload (dict): The error response body.
+        status_code (int): The HTTP status code to respond with.
+    """
+
+    def __init__(self, payload: Dict[str, Any], status_code: int):
+        super().__init__(payload.get("details", payload.get("error")))
+        self.payload = payload
+        self.status_code = status_code
+
+
+def lookup_virustotal_positives(
+    api_key: str,
+    file_hash: str,
+    client: VirusTotalClient,
+    limiter: Optional[TokenBucket],
+    wait: float,
+) -> Optional[int]:
+    """
+    Queries VirusTotal for a file's positives once the rate limiter allows it.
+    Safe to call outside an application context.
+
+    Returns:
+        Optional[int]: The positives, None if VirusTotal has not seen the file,
+        -1 on error, or -3 if no quota became available within wait seconds
+        or VirusTotal throttled the lookup.
+    """
+    if limiter is not None and not limiter.acquire(timeout=wait):
+        logging.info(f"Skipping VirusTotal lookup of {file_hash}: rate limit reached")
+        return LIMIT_REACHED
+    return query_virustotal_positives(api_key=api_key, file_hash=file_hash, client=client)
+
+
+def enrich_with_virustotal(response: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Adds VirusTotal positives to the Strelka events, riskiest first as ranked
+    by rank_by_risk, up to VIRUSTOTAL_API_LIMIT lookups.
+
+    Cached verdicts are used first and do not count towards the limit. Lookups
+    are then reserved from the quota shared by all processes, and files the
+    quota does not cover are marked as limit reached. Up to
+    VIRUSTOTAL_CONCURRENCY lookups run at once, highest priority first, and all
+    lookups in the process share the VIRUSTOTAL_REQUESTS_PER_MINUTE quota.
+
+    Args:
+        response: The Strelka events. Each looked up event gets enrichment.virustotal set.
+
+    Returns:
+        A list of the files with positive detections, with their SHA256 and positives.
+    """
+    total_scanned_with_hits = []
+
+    # If VirusTotal API key provided, get positives (VIRUSTOTAL_API_LIMIT determined Max Scans per Request)
+    # -1    = VirusTotal Lookup Error, or File Not Found
+    # -2    = VirusTotal API Key Not Provided
+    # -3    = VirusTotal Lookup Limit Reached (per request, per minute, or per day)
+    # -4    = VirusTotal Lookup Pending (VIRUSTOTAL_ENRICHMENT_MODE=deferred)
+    # >= 0  = Response Positives from VirusTotal
+    config = current_app.config
+    api_key = config["VIRUSTOTAL_API_KEY"]
+    if api_key:
+        try:
+
+            # Spend the lookup budget on the riskiest files first
+            sorted_files = rank_by_risk(response)
+            # Files extracted more than once are only looked up once
+            hashes = list(
+                dict.fromkeys(f["scan"]["hash"]["sha256"] for f in sorted_files)
+            )
+
+            cache = get_virustotal_cache()
+            verdicts = cache.get_many(hashes) if cache is not None else {}
+            uncached = [sha256 for sha256 in hashes if sha256 not in verdicts]
+
+            limit = int(config["VIRUSTOTAL_API_LIMIT"] or 30) + 1
+            to_scan = uncached[:limit]
+            quota = get_virustotal_quota()
+            if to_scan and quota is not None:
+                to_scan = to_scan[: quota.reserve(len(to_scan))]
+            if to_scan:
+                client = get_virustotal_client()
+                limiter = get_virustotal_rate_limiter()
+                wait = float(config["VIRUSTOTAL_RATE_LIMIT_WAIT"])
+                workers = min(len(to_scan), max(1, int(config["VIRUSTOTAL_CONCURRENCY"])))
+
+                # Lookups are queued in priority order, so the most important files go first
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="virustotal") as pool:
+                    looked_up = dict(
+                        zip(
+                            to_scan,
+                            pool.map(
+                                lambda sha256: lookup_virustotal_positives(
+                                    api_key,
+                                    sha256,
+                                    client,
+                                    limiter,
+                                    wait,
+                                ),
+                                to_scan,
+                            ),
+                        )
+                    )
+
+                if cache is not None:
+                    cache.put_many(
+                        {
+                            sha256: positives
+                            for sha256, positives in looked_up.items()
+                            if positives is None or positives >= 0
+                        }
+                    )
+                verdicts.update(looked_up)
+
+            for scanned_file in sorted_files:
+                sha256 = scanned_file["scan"]["hash"]["sha256"]
+                # Files past the per-request limit or the quota were not looked up
+                count = verdicts.get(sha256, LIMIT_REACHED)
+                if count is None:
+                    count = LOOKUP_ERROR
+                scanned_file["enrichment"]["virustotal"] = count
+                if count > 0:
+                    total_scanned_with_hits.append(
+                        {
+                            "file_sha256": sha256,
+                            "positives": count,
+                        }
+                    )
+        except Exception as e:
+            logging.warning(f"Could not process VirusTotal search with error: {e} ")
+
+    return total_scanned_with_hits
+
+
+def is_virustotal_deferred() -> bool:
+    """
+    Returns True if VirusTotal lookups are made after submissions are saved.
+    """
+    return bool(current_app.config["VIRUSTOTAL_API_KEY"]) and (
+        current_app.config["VIRUSTOTAL_ENRICHMENT_MODE"] == "deferred"
+    )
+
+
+def has_pending_virustotal(response: List[Dict[str, Any]]) -> bool:
+    """
+    Returns True if any of the Strelka events is awaiting a VirusTotal lookup.
+    """
+    return any(
+        scanned_file.get("enrichment", {}).get("virustotal") == LOOKUP_PENDING
+        for scanned_file in response
+    )
+
+
+_enrichment_executor: Optional[BoundedExecutor] = None
+_enrichment_executor_lock = threading.Lock()
+
+
+def get_enrichment_executor() -> BoundedExecutor:
+    """
+    Returns the process-wide executor for deferred VirusTotal enrichment,
+    creating it from the Flask application configuration on first use.
+    """
+    global _enrichment_executor
+    if _enrichment_executor is None:
+        with _enrichment_executor_lock:
+            if _enrichment_executor is None:
+                _enrichment_executor = BoundedExecutor(
+                    int(current_app.config["VIRUSTOTAL_ENRICHMENT_WORKERS"]),
+                    int(current_app.config["VIRUSTOTAL_ENRICHMENT_QUEUE_SIZE"]),
+                    "virustotal-enrichment",
+                )
+    return _enrichment_executor
+
+
+def get_enrichment_stats() -> Dict[str, int]:
+    """
+    Returns usage counters for the deferred VirusTotal enrichment executor.
+    """
+    return _enrichment_executor.stats() if _enrichment_executor is not None else {}
+
+
+def schedule_virustotal_enrichment(file_id: str, response: List[Dict[str, Any]]) -> None:
+    """
+    Enriches a saved submission in the background if its events are awaiting
+    VirusTotal lookups. If the queue is full, the submission is enriched before
+    returning instead, so that none is left pending.
+
+    Args:
+        file_id: The file_id of the committed FileSubmission.
+        response: The submission's Strelka events.
+    """
+    if not has_pending_virustotal(response):
+        return
+
+    app = current_app._get_current_object()
+    try:
+        get_enrichment_executor().submit(enrich_submission_in_app_context, app, file_id)
+    except JobQueueFull as e:
+        logging.warning(f"Enriching submission {file_id} inline, as the queue is full: {e}")
+        enrich_submission(file_id)
+
+
+def enrich_submission_in_app_context(app: Flask, file_id: str) -> None:
+    """
+    Runs enrich_submission inside an application context, for worker threads.
+    """
+    with app.app_context():
+        enrich_submission(file_id)
+
+
+def enrich_submission(file_id: str) -> None:
+    """
+    Looks up VirusTotal positives for a saved submission's pending events, and
+    updates its highest VirusTotal count and insights to match.
+
+    Args:
+        file_id: The file_id of the FileSubmission to enrich.
+    """
+    try:
+        submission = FileSubmission.query.filter_by(file_id=file_id).first()
+        if submission is None:
+            logging.error(f"Submission {file_id} to enrich with VirusTotal not found")
+            return
+
+        # Replaced rather than modified in place, so the JSON column is saved
+        response = json_codec.copy_events(submission.strelka_response)
+        if not has_pending_virustotal(response):
+            return
+
+        enrich_with_virustotal(response)
+        for scanned_file in response:
+            if scanned_file["enrichment"]["virustotal"] == LOOKUP_PENDING:
+                scanned_file["enrichment"]["virustotal"] = LOOKUP_ERROR
+
+        submission.strelka_response = response
+        submission.highest_vt_count, submission.highest_vt_sha256 = get_highest_vt(response)
+        submission.insights = get_all_insights(response)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"VirusTotal enrichment of submission {file_id} failed: {e}")
+
+
+def find_reusable_scan(sha256: str, max_age: int) -> Optional[Dict[str, Any]]:
+    """
+    Looks up the most recent submission of the same content, if it is recent enough to reuse.
+
+    Args:
+        sha256: SHA256 hash of the submitted file.
+        max_age: Maximum age in seconds of a reusable result.
+
+    Returns:
+        A scan result built from the prior submission, with `reused_from` set to
+        its file_id, or None if there is no fresh-enough prior result.
+    """
+    oldest = datetime.datetime.utcnow() - datetime.timedelta(seconds=max_age)
+    prior = (
+        db.session.query(FileSubmission)
+        .filter(
+            FileSubmission.hashes.op("@>")(cast(array([sha256]), ARRAY(String()))),
+            FileSubmission.submitted_at >= oldest,
+            FileSubmission.strelka_response.isnot(None),
+        )
+        .order_by(FileSubmission.submitted_at.desc())
+        .first()
+    )
+
+    if not prior:
+        return None
+
+    # Copy the events so the new submission's derived fields never alias the prior row
+    response = json_codec.copy_events(prior.strelka_response)
+
+    return {
+        "response": response,
+        "file_size": prior.file_size,
+        "vt_positives": [
+            {
+                "file_sha256": scanned_file["scan"]["hash"]["sha256"],
+                "positives": scanned_file["enrichment"]["virustotal"],
+            }
+            for scanned_file in response
+            if scanned_file.get("enrichment", {}).get("virustotal", 0) > 0
+        ],
+        "s3_key": prior.s3_key,
+        "s3_expires_at": prior.s3_expires_at,
+        "submitted_at": str(datetime.datetime.utcnow()),
+        "reused_from": prior.file_id,
+    }
+
+
+def scan_with_strelka(
+    file: Any,
+    user_cn: str,
+    submitted_hash: str,
+    bypass_gatekeeper: bool = False,
+    deadline: Optional[ScanDeadline] = None,
+    cluster: str = DEFAULT_CLUSTER,
+) -> Dict[str, Any]:
+    """
+    Submits a file to Strelka, enriches the events with VirusTotal and stores
+    the file in S3 if enabled.
+
+    Args:
+        file: File object to be submitted.
+        user_cn: Common name of the submitting user, sent as Strelka metadata.
+        submitted_hash: Hash of the submitted file.
+        bypass_gatekeeper: If True, bypasses gatekeeper caching for this request.
+        deadline: The submission's time budget, shared by its Strelka calls.
+        cluster: The Strelka cluster to scan the file on.
+
+    Returns:
+        A dictionary with the Strelka response, file size, VirusTotal hits,
+        S3 storage details and submission time.
+
+    Raises:
+        SubmissionError: If Strelka did not accept the file, or the scan was cancelled.
+    """
+    # Get the current timestamp and the file description from the request.
+    submitted_at = str(datetime.datetime.utcnow())
+
+    # Submit the file to Strelka and get the analysis results.
+    try:
+        succeeded, response, file_size = submit_data(
+            file,
+            {
+                "user_name": user_cn,
+                "client_user_name": user_cn,
+            },
+            submitted_hash,
+            bypass_gatekeeper=bypass_gatekeeper,
+            deadline=deadline,
+            balancer=get_strelka_balancer(cluster),
+        )
+    except ScanCancelled as e:
+        raise SubmissionError(
+            {"error": "Strelka submission was cancelled.", "details": str(e)},
+            e.status_code,
+        )
+
+    # If the Strelka submission was not successful, return an error message.
+    if not succeeded:
+        raise SubmissionError(
+            {"error": "Failed to submit file", "details": str(response)}, 415
+        )
+
+    return finish_scan(file, response, file_size, submitted_at)
+
+
+def finish_scan(
+    file: Any, response: List[Dict[str, Any]], file_size: int, submitted_at: str
+) -> Dict[str, Any]:
+    """
+    Enriches a completed Strelka response with VirusTotal and stores the file
+    in S3 if enabled. If VirusTotal enrichment is deferred, the events are
+    marked as pending instead, and the caller schedules the lookups with
+    schedule_virustotal_enrichment once the submission is saved.
+
+    Args:
+        file: File object that was scanned.
+        response: The Strelka events.
+        file_size: Size of the scanned file in bytes.
+        submitted_at: When the file was submitted.
+
+    Returns:
+        The scan result, as returned by scan_with_strelka.
+    """
+    if is_virustotal_deferred():
+        for scanned_file in response:
+            scanned_file["enrichment"] = {"virustotal": LOOKUP_PENDING}
+        total_scanned_with_hits = []
+    else:
+        total_scanned_with_hits = enrich_with_virustotal(response)
+
+    # Handle S3 upload if enabled
+    s3_key = None
+    s3_expires_at = None
+    if is_s3_enabled():
+        try:
+            # Create temporary submission ID for S3 key generation
+            temp_submission_id = get_request_id(response[0])
+            success, s3_key, error_msg = upload_file(file, temp_submission_id)
+            if success:
+                s3_expires_at = calculate_expires_at()
+                logging.info(f"Successfully uploaded file to S3: {s3_key}")
+            else:
+                logging.warning(f"Failed to upload file to S3: {error_msg}")
+        except Exception as e:
+            logging.error(f"Unexpected error during S3 upload: {e}")
+
+    return {
+        "response": response,
+        "file_size": file_size,
+        "vt_positives": total_scanned_with_hits,
+        "s3_key": s3_key,
+        "s3_expires_at": s3_expires_at,
+        "submitted_at": submitted_at,
+    }
+
+
+# Concurrent scans of identical content, keyed by SHA256, bypass_gatekeeper and cluster
+_in_flight_scans = SingleFlight()
+
+
+def get_coalescing_stats() -> Dict[str, int]:
+    """
+    Returns counters for scans shared between concurrent identical uploads.
+    """
+    return _in_flight_scans.stats()
+
+
+def scan_submission(
+    file: Any,
+    user_cn: str,
+    submitted_hash: str,
+    bypass_gatekeeper: bool = False,
+    deadline: Optional[ScanDeadline] = None,
+    submitted_type: str = "",
+) -> Dict[str, Any]:
+    """
+    Submits a file to Strelka and enriches the result, without writing to the database.
+    Safe to call from worker threads that have an application context.
+
+    The Strelka cluster is chosen by STRELKA_ROUTING_RULES. If
+    STRELKA_RESULT_REUSE_MAX_AGE is set, a recent result for the same content
+    is reused instead of rescanning, unless bypass_gatekeeper is set. If
+    STRELKA_COALESCE_UPLOADS is set, uploads of the same content that arrive
+    while it is being scanned on the same cluster wait for that scan and share
+    its result. They wait no longer than their own deadline, and scan again
+    themselves if the shared scan fails.
+
+    Args:
+        file: File object to be submitted.
+        user_cn: Common name of the submitting user, sent as Strelka metadata.
+        submitted_hash: Hash of the submitted file.
+        bypass_gatekeeper: If True, bypasses gatekeeper caching for this request.
+        deadline: The submission's time budget, shared by its Strelka calls.
+        submitted_type: Type of submission (e.g., 'api', 'virustotal', 'resubmission'), used for routing.
+
+    Returns:
+        A dictionary with the Strelka response, file size, VirusTotal hits,
+        S3 storage details and submission time, plus `reused_from` when a
+        prior or concurrent result was reused.
+
+    Raises:
+        SubmissionError: If Strelka did not accept the file, or the scan was cancelled.
+    """
+    config = current_app.config
+    reuse_max_age = int(config["STRELKA_RESULT_REUSE_MAX_AGE"])
+    reuse = reuse_max_age > 0 and not bypass_gatekeeper
+    coalesce = config["STRELKA_COALESCE_UPLOADS"]
+    cluster = route_submission(file, user_cn, submitted_type)
+
+    def scan_fresh() -> Dict[str, Any]:
+        return scan_with_strelka(
+            file,
+            user_cn,
+            submitted_hash,
+            bypass_gatekeeper=bypass_gatekeeper,
+            deadline=deadline,
+            cluster=cluster,
+        )
+
+    if not (reuse or coalesce):
+        return scan_fresh()
+
+    sha256 = hash_file(file)
+
+    if reuse:
+        reused = find_reusable_scan(sha256, reuse_max_age)
+        if reused:
+            logging.info(f"Reusing scan result of {reused['reused_from']} for {file.filename}")
+            return reused
+
+    if not coalesce:
+        return scan_fresh()
+
+    led = False
+
+    def lead() -> Dict[str, Any]:
+        nonlocal led
+        led = True
+        return scan_fresh()
+
+    # A follower gets one retry of its own after a shared scan fails with an
+    # error; after a shared scan timed out or was cancelled by its client, it
+    # tries again for as long as its own deadline allows
+    retried = False
+    while True:
+        try:
+            scan, shared = _in_flight_scans.do(
+                (sha256, bypass_gatekeeper, cluster), lead, deadline=deadline
+            )
+            break
+        except ScanCancelled as e:
+            raise SubmissionError(
+                {"error": "Strelka submission was cancelled.", "details": str(e)},
+                e.status_code,
+            )
+        except SubmissionError as e:
+            if led or (deadline and (deadline.cancelled or not deadline.remaining())):
+                raise
+            if e.status_code not in (CLIENT_CLOSED_REQUEST, 504):
+                if retried:
+                    raise
+                retried = True
+            logging.info(f"Shared scan of {file.filename} failed ({e}), scanning again")
+
+    if not shared:
+        return scan
+
+    # The leader keeps the Strelka request ID as its file_id, so point at that
+    reused_from = get_request_id(scan["response"][0])
+    logging.info(f"Sharing in-flight scan {reused_from} with {file.filename}")
+    return dict(
+        scan,
+        response=json_codec.copy_events(scan["response"]),
+        vt_positives=[dict(hit) for hit in scan["vt_positives"]],
+        submitted_at=str(datetime.datetime.utcnow()),
+        reused_from=reused_from,
+    )
+
+
+def check_deadline(deadline: Optional[ScanDeadline]) -> None:
+    """
+    Raises SubmissionError if the submission was cancelled, so results that
+    nobody is waiting for are not saved.
+    """
+    if deadline is not None and deadline.cancelled:
+        raise SubmissionError(
+            {"error": "Strelka submission was cancelled.", "details": deadline.reason},
+            deadline.status_code,
+        )
+
+
+def persist_submission(
+    scan: Dict[str, Any],
+    file: Any,
+    user: User,
+    submitted_description: str,
+    submitted_type: str,
+    submitted_from_ip: str,
+    submitted_from_client: str,
+) -> FileSubmission:
+    """
+    Adds a FileSubmission for a scan result to the session and counts it against
+    the user. The caller is responsible for committing.
+
+    Args:
+        scan: The result of scan_submission.
+        file: File object that was submitted.
+        user: User object representing the authenticated user.
+        submitted_description: Description of the submitted file.
+        submitted_type: Type of submission (e.g., 'api', 'virustotal', 'resubmission').
+        submitted_from_ip: IP address the submission came from.
+        submitted_from_client: User-Agent of the submitting client.
+
+    Returns:
+        FileSubmission: The new, flushed submission.
+    """
+    # Create a new submission object and add it to the database.
+    new_submission = FileSubmission(
+        file.filename,
+        scan["file_size"],
+        scan["response"],
+        submitted_type,
+        submitted_from_ip,
+        submitted_from_client,
+        user.id,
+        submitted_description,
+        scan["submitted_at"],
+        scan["s3_key"],
+        scan["s3_expires_at"],
+    )
+
+    # A reused result shares the prior request ID, so it needs its own file_id
+    if scan.get("reused_from"):
+        new_submission.file_id = str(uuid.uuid4())
+
+    db.session.add(new_submission)
+
+    # Increase the user's submission count.
+    user.files_submitted += 1
+
+    db.session.flush()
+    return new_submission
+
+
+def submission_payload(
+    new_submission: FileSubmission, scan: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Builds the upload response body for a persisted submission.
+    """
+    payload = {
+        "file_id": str(new_submission.file_id),
+        "response": scan["response"],
+        "meta": {
+            "file_size": new_submission.file_size,
+            "iocs": list(new_submission.iocs),
+            "vt_positives": list(scan["vt_positives"]),
+        },
+    }
+    if scan.get("reused_from"):
+        payload["meta"]["reused_from"] = scan["reused_from"]
+    if has_pending_virustotal(scan["response"]):
+        payload["meta"]["virustotal_pending"] = True
+    return payload
+
+
+def process_submission(
+    file,
+    user,
+    submitted_hash,
+    submitted_description,
+    submitted_type,
+    submitted_from_ip,
+    submitted_from_client,
+    bypass_gatekeeper=False,
+    deadline=None,
+):
+    """
+    Submit file to Strelka for analysis and save results to the database.
+    Does not depend on a request context, so it can also run on background workers.
+
+    Args:
+        file: File object to be submitted.
+        user: User object representing the authenticated user.
+        submitted_hash: Hash of the submitted file.
+        submitted_description: Description of the submitted file.
+        submitted_type: Type of submission (e.g., 'api', 'virustotal', 'resubmission').
+        submitted_from_ip: IP address the submission came from.
+        submitted_from_client: User-Agent of the submitting client.
+        bypass_gatekeeper: If True, bypasses gatekeeper caching for this request.
+        deadline: The submission's time budget. Defaults to STRELKA_SCAN_TIMEOUT.
+
+    Returns:
+        The response payload and a 200 status code if successful.
+        Error details and a 415, 499, 504 or 500 status code if unsuccessful.
+    """
+    # Submit the file to the Strelka analysis engine.
+    try:
+        scan = scan_submission(
+            file,
+            user.user_cn,
+            submitted_hash,
+            bypass_gatekeeper=bypass_gatekeeper,
+            deadline=deadline,
+            submitted_type=submitted_type,
+        )
+        check_deadline(deadline)
+        new_submission = persist_submission(
+            scan,
+            file,
+            user,
+            submitted_description,
+            submitted_type,
+            submitted_from_ip,
+            submitted_from_client,
+        )
+        db.session.commit()
+        schedule_virustotal_enrichment(new_submission.file_id, scan["response"])
+
+        # Return the analysis results and a 200 status code.
+        return submission_payload(new_submission, scan), 200
+    except SubmissionError as e:
+        return e.payload, e.status_code
+    # If an exception occurs, log the error and return an error message.
+    except Exception as e:
+        db.session.rollback()
+        return (
+            {
+                "error": "Strelka submission was not successful.",
+                "details": str(e),
+            },
+            500,
+        )
+
+
+def stream_submission(
+    file: Any,
+    user: User,
+    submitted_hash: str,
+    submitted_description: str,
+    submitted_type: str,
+    submitted_from_ip: str,
+    submitted_from_client: str,
+    bypass_gatekeeper: bool = False,
+    deadline: Optional[ScanDeadline] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Submit a file to Strelka, yielding its events as they arrive, and save the
+    result to the database once the scan is complete.
+
+    Yields one {"event": ...} record per Strelka event, then either
+    {"result": ...}, the upload response without the events that were already
+    sent, or an error record with its status_code. A reusable prior result is
+    replayed as if it had just been scanned. Streamed scans are not coalesced
+    with concurrent uploads, since every caller needs its own stream.
+
+    Args:
+        file: File object to be submitted.
+        user: User object representing the authenticated user.
+        submitted_hash: Hash of the submitted file.
+        submitted_description: Description of the submitted file.
+        submitted_type: Type of submission (e.g., 'api', 'virustotal', 'resubmission').
+        submitted_from_ip: IP address the submission came from.
+        submitted_from_client: User-Agent of the submitting client.
+        bypass_gatekeeper: If True, bypasses gatekeeper caching for this request.
+        deadline: The submission's time budget. Defaults to STRELKA_SCAN_TIMEOUT.
+
+    Yields:
+        The event records, then the result or error record.
+    """
+    submitted_at = str(datetime.datetime.utcnow())
+    reuse_max_age = int(current_app.config["STRELKA_RESULT_REUSE_MAX_AGE"])
+
+    try:
+        cluster = route_submission(file, user.user_cn, submitted_type)
+
+        scan = None
+        if reuse_max_age > 0 and not bypass_gatekeeper:
+            scan = find_reusable_scan(hash_file(file), reuse_max_age)
+
+        if scan:
+            logging.info(f"Reusing scan result of {scan['reused_from']} for {file.filename}")
+            for event in scan["response"]:
+                yield {"event": event}
+        else:
+            response = []
+            try:
+                for text in stream_data(
+                    file,
+                    {
+                        "user_name": user.user_cn,
+                        "client_user_name": user.user_cn,
+                    },
+                    submitted_hash,
+                    bypass_gatekeeper=bypass_gatekeeper,
+                    deadline=deadline,
+                    balancer=get_strelka_balancer(cluster),
+                    raw=True,
+                ):
+                    # Parsed once for the database row; the caller gets Strelka's own text
+                    event = json_codec.loads(text)
+                    response.append(event)
+                    yield {"event": json_codec.fragment(text, event)}
+            except ScanCancelled as e:
+                raise SubmissionError(
+                    {"error": "Strelka submission was cancelled.", "details": str(e)},
+                    e.status_code,
+                )
+            except Exception as e:
+                logging.error(f"Failed to submit {file.filename} to strelka: {e}")
+                raise SubmissionError(
+                    {
+                        "error": "Failed to submit file",
+                        "details": f"Failed to submit {file.filename} to strelka: {e}",
+                    },
+                    415,
+                )
+
+            if not response:
+                raise SubmissionError(
+                    {
+                        "error": "Failed to submit file",
+                        "details": f"Failed to submit {file.filename} to strelka. Please check the submitted file.",
+                    },
+                    415,
+                )
+
+            file.stream.seek(0, os.SEEK_END)
+            scan = finish_scan(file, response, file.stream.tell(), submitted_at)
+
+        check_deadline(deadline)
+        new_submission = persist_submission(
+            scan,
+            file,
+            user,
+            submitted_description,
+            submitted_type,
+            submitted_from_ip,
+            submitted_from_client,
+        )
+        db.session.commit()
+        schedule_virustotal_enrichment(new_submission.file_id, scan["response"])
+
+        payload = submission_payload(new_submission, scan)
+        del payload["response"]
+        yield {"result": payload}
+    except SubmissionError as e:
+        yield dict(e.payload, status_code=e.status_code)
+    except Exception as e:
+        db.session.rollback()
+        yield {
+            "error": "Strelka submission was not successful.",
+            "details": str(e),
+            "status_code": 500,
+        }
+
+
+def scan_in_app_context(app: Flask, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+    """
+    Runs scan_submission on a worker thread inside an application context.
+    """
+    with app.app_context():
+        return scan_submission(*args, **kwargs)
+
+
+def scan_submissions(
+    files: List[Any],
+    user_cn: str,
+    submitted_hash: str,
+    concurrency: int,
+    bypass_gatekeeper: bool = False,
+    deadline: Optional[ScanDeadline] = None,
+    submitted_type: str = "",
+) -> List[Union[Dict[str, Any], Exception]]:
+    """
+    Scans several files concurrently with scan_submission, each on a worker
+    thread with its own application context.
+
+    Args:
+        files: List of file objects to be submitted.
+        user_cn: Common name of the submitting user, sent as Strelka metadata.
+        submitted_hash: Hash of the submitted file.
+        concurrency: Maximum number of files scanned at once.
+        bypass_gatekeeper: If True, bypasses gatekeeper caching for this request.
+        deadline: The time budget shared by every file's scan.
+        submitted_type: Type of submission (e.g., 'api', 'virustotal', 'resubmission'), used for routing.
+
+    Returns:
+        For each file, in order, either its scan result or the exception raised while scanning it.
+    """
+    app = current_app._get_current_object()
+    concurrency = min(len(files), max(1, int(concurrency)))
+
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="scan") as pool:
+        futures = [
+            pool.submit(
+                scan_in_app_context,
+                app,
+                f,
+                user_cn,
+                submitted_hash,
+                bypass_gatekeeper=bypass_gatekeeper,
+                deadline=deadline,
+                submitted_type=submitted_type,
+            )
+            for f in files
+        ]
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+
+    return results
+
+
+def scan_error_payload(error: Exception) -> Tuple[Dict[str, Any], int]:
+    """
+    Returns the response body and status code for an exception raised by scan_submission.
+    """
+    if isinstance(error, SubmissionError):
+        return error.payload, error.status_code
+    return {"error": "Strelka submission was not successful.", "details": str(error)}, 500
+
+
+def manifest_entry(file: Any, payload: Dict[str, Any], status_code: int) -> Dict[str, Any]:
+    """
+    Summarizes one file's submission outcome for multi-file responses.
+    """
+    entry = {"file_name": file.filename, "status_code": status_code}
+    if status_code == 200:
+        entry["file_id"] = payload["file_id"]
+    else:
+        entry["error"] = payload.get("details", payload.get("error"))
+    return entry
+
+
+def process_submissions(
+    user,
+    files,
+    submitted_hash,
+    submitted_description,
+    submitted_type,
+    submitted_from_ip,
+    submitted_from_client,
+    bypass_gatekeeper=False,
+    deadline=None,
+):
+    """
+    Submit several files (e.g., the members of an unpacked archive) to Strelka
+    concurrently and save each result to the database.
+
+    Up to STRELKA_ARCHIVE_CONCURRENCY files are scanned at once on worker
+    threads. Results are persisted from the calling thread, in order.
+
+    Args:
+        user: User object representing the authenticated user.
+        files: List of file objects to be submitted.
+        submitted_hash: Hash of the submitted file.
+        submitted_description: Description of the submitted files.
+        submitted_type: Type of submission (e.g., 'api', 'virustotal', 'resubmission').
+        submitted_from_ip: IP address the submission came from.
+        submitted_from_client: User-Agent of the submitting client.
+        bypass_gatekeeper: If True, bypasses gatekeeper caching for this request.
+        deadline: The time budget shared by every file's scan.
+
+    Returns:
+        The payload of the first successful submission with a `members` list
+        giving every file's file_id or error, and its status code. If no file
+        succeeded, the first error and its status code.
+    """
+    if len(files) == 1:
+        return process_submission(
+            files[0],
+            user,
+            submitted_hash,
+            submitted_description,
+            submitted_type,
+            submitted_from_ip,
+            submitted_from_client,
+            bypass_gatekeeper=bypass_gatekeeper,
+            deadline=deadline,
+        )
+
+    scans = scan_submissions(
+        files,
+        user.user_cn,
+        submitted_hash,
+        current_app.config["STRELKA_ARCHIVE_CONCURRENCY"],
+        bypass_gatekeeper=bypass_gatekeeper,
+        deadline=deadline,
+        submitted_type=submitted_type,
+    )
+
+    first_success = None
+    first_error = None
+    members = []
+
+    for f, scan in zip(files, scans):
+        if isinstance(scan, Exception):
+            payload, status_code = scan_error_payload(scan)
+        else:
+            try:
+                check_deadline(deadline)
+                new_submission = persist_submission(
+                    scan,
+                    f,
+                    user,
+                    submitted_description,
+                    submitted_type,
+                    submitted_from_ip,
+                    submitted_from_client,
+                )
+                db.session.commit()
+                schedule_virustotal_enrichment(new_submission.file_id, scan["response"])
+                payload, status_code = submission_payload(new_submission, scan), 200
+            except Exception as e:
+                db.session.rollback()
+                payload, status_code = scan_error_payload(e)
+
+        if status_code == 200:
+            first_success = first_success or payload
+        else:
+            first_error = first_error or (payload, status_code)
+        members.append(manifest_entry(f, payload, status_code))
+
+    if first_success:
+        return dict(first_success, members=members), 200
+
+    payload, status_code = first_error
+    return dict(payload, members=members), status_code
+
+
+def download_virustotal_files(
+    file_hashes: List[str], max_wait: Optional[float] = None
+) -> List[Any]:
+    """
+    Downloads files from VirusTotal as a single ZIP and unpacks them into
+    spooled temporary files, without buffering the archive in memory.
+
+    Args:
+        file_hashes: The hashes of the files to download.
+        max_wait: Seconds to wait for VirusTotal to prepare the ZIP. Defaults
+            to VIRUSTOTAL_ZIP_MAX_WAIT, meant for background jobs.
+
+    Returns:
+        A FileStorage object for each file VirusTotal returned, owned by the caller.
+
+    Raises:
+        VirusTotalZipTimeout: If the ZIP was not ready within max_wait.
+        Exception: If the ZIP cannot be created, downloaded or unpacked.
+    """
+    config = current_app.config
+    if max_wait is None:
+        max_wait = float(config["VIRUSTOTAL_ZIP_MAX_WAIT"])
+    archive = create_vt_zip_and_download(
+        api_key=config["VIRUSTOTAL_API_KEY"],
+        file_hash=file_hashes,
+        password=VIRUSTOTAL_ZIP_PASSWORD,
+        max_wait=max_wait,
+        poll_interval=float(config["VIRUSTOTAL_ZIP_POLL_INTERVAL"]),
+    )
+    with archive:
+        return unpack_zip_stream(archive, VIRUSTOTAL_ZIP_PASSWORD)
+
+
+def download_in_app_context(app: Flask, file_hashes: List[str]) -> List[Any]:
+    """
+    Runs download_virustotal_files on a worker thread inside an application context.
+    """
+    with app.app_context():
+        return download_virustotal_files(file_hashes)
+
+
+def process_virustotal_submission(
+    user,
+    submitted_hash,
+    submitted_description,
+    submitted_from_ip,
+    submitted_from_client,
+    bypass_gatekeeper=False,
+):
+    """
+    Downloads a file from VirusTotal by hash and submits it to Strelka. Meant
+    to run as a background job, as VirusTotal can take a while to prepare the
+    download.
+
+    The download is streamed into a spooled temporary file and unpacked from
+    there, so neither the archive nor its contents are buffered whole in
+    memory. A Strelka admission slot is only held once the files are ready.
+
+    Args:
+        user: User object representing the authenticated user.
+        submitted_hash: The hash to download from VirusTotal.
+        submitted_description: Description of the submitted file.
+        submitted_from_ip: IP address the submission came from.
+        submitted_from_client: User-Agent of the submitting client.
+        bypass_gatekeeper: If True, bypasses gatekeeper caching for this request.
+
+    Returns:
+        The payload and status code of process_submissions, or an error.
+    """
+    try:
+        files = download_virustotal_files([submitted_hash])
+    except Exception as e:
+        logging.warning(f"Could not download {submitted_hash} from VirusTotal: {e}")
+        return {
+            "error": "VirusTotal request was not successful.",
+            "details": f"Could not download {submitted_hash} from VirusTotal: {e}",
+        }, 400
+
+    if not files:
+        return {
+            "error": "VirusTotal request was not successful.",
+            "details": "VirusTotal returned an empty archive.",
+        }, 400
+
+    try:
+        with get_admission_controller().admit(user.id, BULK_LANE, background=True):
+            return process_submissions(
+                user,
+                files,
+                submitted_hash,
+                submitted_description,
+                "virustotal",
+                submitted_from_ip,
+                submitted_from_client,
+                bypass_gatekeeper=bypass_gatekeeper,
+            )
+    finally:
+        for f in files:
+            f.stream.close()
+
+
+def process_batch(
+    user,
+    files,
+    submitted_description,
+    submitted_type,
+    submitted_from_ip,
+    submitted_from_client,
+    bypass_gatekeeper=False,
+    deadline=None,
+):
+    """
+    Scan a batch of independent files concurrently and save every successful
+    result to the database in a single transaction.
+
+    Args:
+        user: User object representing the authenticated user.
+        files: List of file objects to be submitted.
+        submitted_description: Description applied to every file.
+        submitted_type: Type of submission (e.g., 'api').
+        submitted_from_ip: IP address the submission came from.
+        submitted_from_client: User-Agent of the submitting client.
+        bypass_gatekeeper: If True, bypasses gatekeeper caching and result reuse.
+        deadline: The time budget shared by every file's scan.
+
+    Returns:
+        A per-file manifest of file_ids and errors, with a 200 status code.
+    """
+    scans = scan_submissions(
+        files,
+        user.user_cn,
+        "",
+        current_app.config["STRELKA_BATCH_CONCURRENCY"],
+        bypass_gatekeeper=bypass_gatekeeper,
+        deadline=deadline,
+        submitted_type=submitted_type,
+    )
+
+    entries = [None] * len(files)
+    persisted = []
+    for index, (f, scan) in enumerate(zip(files, scans)):
+        if isinstance(scan, Exception):
+            entries[index] = manifest_entry(f, *scan_error_payload(scan))
+            continue
+
+        # A savepoint per row keeps one bad result from aborting the whole batch
+        try:
+            check_deadline(deadline)
+            with db.session.begin_nested():
+                new_submission = persist_submission(
+                    scan,
+                    f,
+                    user,
+                    submitted_description,
+                    submitted_type,
+                    submitted_from_ip,
+                    submitted_from_client,
+                )
+        except Exception as e:
+            entries[index] = manifest_entry(f, *scan_error_payload(e))
+            continue
+
+        # Build the entry before committing, as the commit expires the row
+        entries[index] = manifest_entry(f, submission_payload(new_submission, scan), 200)
+        persisted.append(index)
+
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Failed to save batch submission: {e}")
+        for index in persisted:
+            entries[index] = manifest_entry(files[index], *scan_error_payload(e))
+    else:
+        for index in persisted:
+            schedule_virustotal_enrichment(entries[index]["file_id"], scans[index]["response"])
+
+    succeeded = sum(1 for entry in entries if entry["status_code"] == 200)
+    return (
+        {
+            "submitted": len(files),
+            "succeeded": succeeded,
+            "failed": len(files) - succeeded,
+            "files": entries,
+        },
+        200,
+    )
+
+
+def discard_download(future: Future) -> None:
+    """
+    Closes the files of a download_in_app_context future that will not be used.
+    """
+    if not future.cancelled() and future.exception() is None:
+        for f in future.result():
+            f.stream.close()
+
+
+def import_virustotal_batch(
+    user,
+    file_hashes,
+    files,
+    submitted_description,
+    submitted_from_ip,
+    submitted_from_client,
+    bypass_gatekeeper=False,
+):
+    """
+    Scans the files VirusTotal returned for a batch of hashes with
+    process_batch, then maps each requested hash to its file's outcome.
+
+    Args:
+        user: User object representing the authenticated user.
+        file_hashes: The MD5, SHA1 or SHA256 hashes the batch was requested for.
+        files: The files unpacked from the batch's ZIP.
+        submitted_description: Description applied to every file.
+        submitted_from_ip: IP address the submission came from.
+        submitted_from_client: User-Agent of the submitting client.
+        bypass_gatekeeper: If True, bypasses gatekeeper caching and result reuse.
+
+    Returns:
+        A manifest entry for each requested hash, in order.
+    """
+    entries_by_digest = {}
+    if files:
+        with get_admission_controller().admit(user.id, BULK_LANE, background=True):
+            manifest, _ = process_batch(
+                user,
+                files,
+                submitted_description,
+                "virustotal",
+                submitted_from_ip,
+                submitted_from_client,
+                bypass_gatekeeper=bypass_gatekeeper,
+            )
+        for f, entry in zip(files, manifest["files"]):
+            for digest in file_digests(f).values():
+                entries_by_digest[digest] = entry
+
+    entries = []
+    for file_hash in file_hashes:
+        entry = entries_by_digest.get(file_hash.lower())
+        if entry is None:
+            entry = {"status_code": 404, "error": "Hash not found on VirusTotal."}
+        entries.append(dict(entry, hash=file_hash))
+    return entries
+
+
+def process_virustotal_import(
+    user,
+    file_hashes,
+    submitted_description,
+    submitted_from_ip,
+    submitted_from_client,
+    bypass_gatekeeper=False,
+):
+    """
+    Downloads many files from VirusTotal by hash and submits them to Strelka.
+    Meant to run as a background job.
+
+    Hashes are requested VIRUSTOTAL_ZIP_BATCH_SIZE at a time, one ZIP per
+    batch. Up to VIRUSTOTAL_ZIP_CONCURRENCY batches are prepared and
+    downloaded ahead while the files of the current batch are scanned
+    concurrently, and each batch is saved in a single transaction.
+
+    Args:
+        user: User object representing the authenticated user.
+        file_hashes: The MD5, SHA1 or SHA256 hashes to import.
+        submitted_description: Description applied to every file.
+        submitted_from_ip: IP address the submission came from.
+        submitted_from_client: User-Agent of the submitting client.
+        bypass_gatekeeper: If True, bypasses gatekeeper caching and result reuse.
+
+    Returns:
+        A per-hash manifest of file_ids and errors, with a 200 status code.
+    """
+    config = current_app.config
+    batch_size = max(1, int(config["VIRUSTOTAL_ZIP_BATCH_SIZE"]))
+    prefetch = max(1, int(config["VIRUSTOTAL_ZIP_CONCURRENCY"]))
+    batches = [
+        file_hashes[start : start + batch_size]
+        for start in range(0, len(file_hashes), batch_size)
+    ]
+    app = current_app._get_current_object()
+
+    entries = []
+    with ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="vt-import") as pool:
+        futures = [pool.submit(download_in_app_context, app, batch) for batch in batches[:prefetch]]
+        scanned = 0
+        try:
+            for index, batch in enumerate(batches):
+                # Keep the next batches downloading while this one is scanned
+                if index + prefetch < len(batches):
+                    futures.append(
+                        pool.submit(download_in_app_context, app, batches[index + prefetch])
+                    )
+
+                scanned = index + 1
+                try:
+                    files = futures[index].result()
+                except Exception as e:
+                    logging.warning(f"Could not download {len(batch)} files from VirusTotal: {e}")
+                    entries.extend(
+                        {
+                            "hash": file_hash,
+                            "status_code": 502,
+                            "error": f"Could not download from VirusTotal: {e}",
+                        }
+                        for file_hash in batch
+                    )
+                    continue
+
+                try:
+                    entries.extend(
+                        import_virustotal_batch(
+                            user,
+                            batch,
+                            files,
+                            submitted_description,
+                            submitted_from_ip,
+                            submitted_from_client,
+                            bypass_gatekeeper=bypass_gatekeeper,
+                        )
+                    )
+                finally:
+                    for f in files:
+                        f.stream.close()
+        finally:
+            # If the import fails part way, release batches downloaded ahead of it
+            for future in futures[scanned:]:
+                future.cancel()
+                future.add_done_callback(discard_download)
+
+    succeeded = sum(1 for entry in entries if entry["status_code"] == 200)
+    return (
+        {
+            "submitted": len(file_hashes),
+            "succeeded": succeeded,
+            "failed": len(file_hashes) - succeeded,
+            "files": entries,
+        },
+        200,
+    )
@@ -1,26 +1,255 @@
+import datetime
+import email.utils
 import logging
+import random
+import tempfile
+import threading
 from io import BytesIO
 import os
+from typing import IO, Any, Dict, List, Optional
+
 import requests
 import time
+from flask import current_app
+from requests.adapters import HTTPAdapter
+
+from strelka_ui.services.ratelimit import TokenBucket
+from strelka_ui.services.virustotal_cache import (
+    get_virustotal_cache,
+    get_virustotal_cache_stats,
+)
+from strelka_ui.services.virustotal_quota import (
+    get_virustotal_quota,
+    get_virustotal_quota_stats,
+)
+from strelka_ui.services.virustotal_widget import (
+    get_virustotal_widget_cache,
+    get_virustotal_widget_cache_stats,
+)
+
+
+# Returned when a lookup fails, or VirusTotal has not seen the file
+LOOKUP_ERROR = -1
+# Returned when a lookup was skipped, or throttled by VirusTotal, for lack of quota
+LIMIT_REACHED = -3
+# Stored until the background enricher looks the file up
+LOOKUP_PENDING = -4
+
+# Responses worth retrying: throttling and transient server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Weight of the latest request in the moving latency average
+LATENCY_SMOOTHING = 0.2
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header, given either as seconds or as an HTTP date.
 
+    Returns:
+        Optional[float]: Seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
 
-def get_virustotal_positives(api_key: str, file_hash: str) -> int:
+
+class VirusTotalClient:
     """
-    Retrieves the count of malicious detections for a specific file from VirusTotal using the requests library.
+    An HTTP client for the VirusTotal API shared by all threads, so connections
+    are pooled and reused rather than set up for every call.
+
+    Every request is bounded by connect and read timeouts. Throttled requests
+    and transient failures are retried with jittered exponential backoff, or
+    after the Retry-After the response asks for. Requests that are not
+    idempotent are only retried if VirusTotal throttled them or the
+    connection could not be made, as they cannot have been processed.
+
+    Attributes:
+        connect_timeout (float): Seconds to wait for a connection.
+        read_timeout (float): Seconds to wait for each read from the server.
+        max_retries (int): Retries after the first attempt.
+        backoff (float): Base delay in seconds, doubled with each retry.
+        max_retry_wait (float): Longest delay to retry after; a longer Retry-After is not honoured.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff: float = 1.0,
+        max_retry_wait: float = 30.0,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff = max(0.0, backoff)
+        self.max_retry_wait = max(0.0, max_retry_wait)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size))
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._retries = 0
+        self._throttled = 0
+        self._failures = 0
+        self._latency_ms: Optional[float] = None
+        self._last_latency_ms: Optional[float] = None
+
+    def _retry_wait(self, attempt: int, response: Optional[requests.Response]) -> Optional[float]:
+        if attempt >= self.max_retries:
+            return None
+        wait = parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+        if wait is None:
+            # Full jitter, so throttled threads do not all retry at once
+            wait = random.uniform(0, self.backoff * 2**attempt)
+        return wait if wait <= self.max_retry_wait else None
+
+    def _record(self, elapsed_ms: Optional[float], status_code: Optional[int]) -> None:
+        with self._lock:
+            if elapsed_ms is None:
+                self._failures += 1
+                return
+            if status_code == 429:
+                self._throttled += 1
+            self._last_latency_ms = elapsed_ms
+            if self._latency_ms is None:
+                self._latency_ms = elapsed_ms
+            else:
+                self._latency_ms += LATENCY_SMOOTHING * (elapsed_ms - self._latency_ms)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """
+        Sends a request, retrying it if it is throttled or fails transiently.
+
+        Args:
+            method: The HTTP method.
+            url: The URL to request.
+            **kwargs: Passed on to requests.Session.request. A timeout may be
+                given to override the client's.
+
+        Returns:
+            requests.Response: The final response, which may still be an error.
+
+        Raises:
+            requests.RequestException: If no response was received.
+        """
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        idempotent = method.upper() in ("GET", "HEAD")
+        with self._lock:
+            self._requests += 1
+
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                self._record(None, None)
+                retryable = isinstance(e, requests.ConnectTimeout) or (
+                    idempotent and isinstance(e, (requests.ConnectionError, requests.Timeout))
+                )
+                wait = self._retry_wait(attempt, None) if retryable else None
+                if wait is None:
+                    raise
+                logging.warning(f"Retrying VirusTotal request in {wait:.1f}s after error: {e}")
+            else:
+                self._record((time.monotonic() - start) * 1000, response.status_code)
+                status_code = response.status_code
+                if status_code not in RETRY_STATUS_CODES or (not idempotent and status_code != 429):
+                    return response
+                wait = self._retry_wait(attempt, response)
+                if wait is None:
+                    return response
+                logging.warning(f"Retrying VirusTotal request in {wait:.1f}s after HTTP {status_code}")
+                response.close()
+
+            with self._lock:
+                self._retries += 1
+            time.sleep(wait)
+            attempt += 1
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "retries": self._retries,
+                "throttled": self._throttled,
+                "failures": self._failures,
+                "latency_ms": round(self._latency_ms, 1) if self._latency_ms is not None else None,
+                "last_latency_ms": (
+                    round(self._last_latency_ms, 1) if self._last_latency_ms is not None else None
+                ),
+            }
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_client: Optional[VirusTotalClient] = None
+_client_lock = threading.Lock()
+
+
+def get_virustotal_client() -> VirusTotalClient:
+    """
+    Returns the process-wide VirusTotal client, creating it from the Flask
+    application configuration on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = current_app.config
+                _client = VirusTotalClient(
+                    int(config["VIRUSTOTAL_POOL_SIZE"]),
+                    float(config["VIRUSTOTAL_CONNECT_TIMEOUT"]),
+                    float(config["VIRUSTOTAL_READ_TIMEOUT"]),
+                    int(config["VIRUSTOTAL_MAX_RETRIES"]),
+                    float(config["VIRUSTOTAL_RETRY_BACKOFF"]),
+                    float(config["VIRUSTOTAL_RETRY_MAX_WAIT"]),
+                )
+    return _client
+
+
+def query_virustotal_positives(
+    api_key: str, file_hash: str, client: Optional[VirusTotalClient] = None
+) -> Optional[int]:
+    """
+    Queries VirusTotal for the count of malicious detections for a file, bypassing the verdict cache.
 
     Args:
         api_key (str): The API key used to authenticate with the VirusTotal API.
         file_hash (str): The hash of the file (MD5, SHA1, or SHA256) to query for detections.
+        client (VirusTotalClient): The client to use, required outside an application context.
+            Defaults to the process-wide client.
 
     Returns:
-        int: The number of malicious detections found for the file. Returns -1 if an error occurs.
+        Optional[int]: The number of malicious detections found for the file, None if
+        VirusTotal has not seen the file, LIMIT_REACHED if VirusTotal throttled the
+        lookup, or LOOKUP_ERROR if an error occurs.
     """
     url = f"https://www.virustotal.com/api/v3/files/{file_hash}"
     headers = {"x-apikey": api_key}
 
     try:
-        response = requests.get(url, headers=headers)
+        response = (client or get_virustotal_client()).get(url, headers=headers)
         if response.ok:
             file_analysis = response.json()
             logging.info(f"VirusTotal response: {str(response.json().get('data').get('id'))}")
@@ -33,77 +262,233 @@ def get_virustotal_positives(api_key: str, file_hash: str) -> int:
         else:
             if response.status_code == 404:
                 logging.info(f"Not found querying VirusTotal: {' '.join(response.text.split(os.linesep))}")
-            else:
-                logging.error(f"Error querying VirusTotal: {' '.join(response.text.split(os.linesep))}")
+                return None
+            if response.status_code == 429:
+                logging.warning(f"VirusTotal quota exceeded: {' '.join(response.text.split(os.linesep))}")
+                return LIMIT_REACHED
 
-            return -1
+            logging.error(f"Error querying VirusTotal: {' '.join(response.text.split(os.linesep))}")
+            return LOOKUP_ERROR
     except Exception as e:
         logging.error(f"Exception querying VirusTotal: {e}")
-        return -1
+        return LOOKUP_ERROR
 
 
-def create_vt_zip_and_download(api_key, file_hash, password, max_attempts=3):
+def get_virustotal_positives(api_key: str, file_hash: str) -> int:
     """
-    Creates a password-protected ZIP file containing the specified file from VirusTotal,
-    then downloads and returns it.
+    Retrieves the count of malicious detections for a specific file from VirusTotal using the requests library.
+    A cached verdict is returned if there is one, and fresh verdicts are cached.
 
     Args:
-        api_key (str): The API key for VirusTotal.
-        file_hash (list): The hash of the file to download.
-        password (str): The password to set for the ZIP file.
-        max_attempts (int): The maximum number of attempts to check for ZIP readiness.
+        api_key (str): The API key used to authenticate with the VirusTotal API.
+        file_hash (str): The SHA256 hash of the file to query for detections.
+
+    Returns:
+        int: The number of malicious detections found for the file. Returns -1 if an error occurs,
+        or -3 if the shared VirusTotal quota is used up.
+    """
+    cache = get_virustotal_cache()
+    if cache is not None:
+        cached, positives = cache.get(file_hash)
+        if cached:
+            return LOOKUP_ERROR if positives is None else positives
+
+    quota = get_virustotal_quota()
+    if quota is not None and not quota.reserve(1):
+        return LIMIT_REACHED
+
+    positives = query_virustotal_positives(api_key, file_hash)
+    if positives in (LOOKUP_ERROR, LIMIT_REACHED):
+        return positives
+    if cache is not None:
+        cache.put_many({file_hash: positives})
+    return LOOKUP_ERROR if positives is None else positives
+
+
+_rate_limiter: Optional[TokenBucket] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_virustotal_rate_limiter() -> Optional[TokenBucket]:
+    """
+    Returns the process-wide limiter for VirusTotal lookups, creating it from
+    VIRUSTOTAL_REQUESTS_PER_MINUTE on first use, or None if lookups are unlimited.
+    """
+    global _rate_limiter
+    rate = float(current_app.config["VIRUSTOTAL_REQUESTS_PER_MINUTE"])
+    if rate <= 0:
+        return None
+
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = TokenBucket(rate, per=60.0)
+    return _rate_limiter
+
+
+def get_virustotal_stats() -> Dict[str, Any]:
+    """
+    Returns usage counters for VirusTotal lookups made by this process.
+    """
+    return {
+        "client": _client.stats() if _client is not None else None,
+        "rate_limiter": _rate_limiter.stats() if _rate_limiter is not None else None,
+        "quota": get_virustotal_quota_stats(),
+        "cache": get_virustotal_cache_stats(),
+        "widget_cache": get_virustotal_widget_cache_stats(),
+    }
+
+
+VIRUSTOTAL_ZIP_URL = "https://www.virustotal.com/api/v3/intelligence/zip_files"
+
+# Longest pause between checks on a ZIP VirusTotal is still preparing
+ZIP_POLL_MAX_INTERVAL = 30.0
+
+# Downloaded ZIPs stay in memory up to this size before spilling to disk
+ZIP_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+ZIP_CHUNK_SIZE = 64 * 1024
+
+
+class VirusTotalZipTimeout(Exception):
+    pass
+
+
+def create_vt_zip(api_key: str, file_hashes: List[str], password: str) -> str:
+    """
+    Asks VirusTotal to prepare a password-protected ZIP of the given files.
+
+    Args:
+        api_key: The API key for VirusTotal.
+        file_hashes: The hashes of the files to include.
+        password: The password to set for the ZIP file.
 
     Returns:
-        BytesIO: A buffer containing the downloaded ZIP file.
+        str: The ID of the ZIP file.
 
     Raises:
-        Exception: If any step in the process fails.
+        Exception: If VirusTotal rejects the request.
     """
-    create_zip_url = "https://www.virustotal.com/api/v3/intelligence/zip_files"
-    payload = {
-        "data": {"password": password, "hashes": file_hash}
-    }  # Assuming file_hash should be a list
     headers = {
         "x-apikey": api_key,
         "accept": "application/json",
         "content-type": "application/json",
     }
-    response = requests.post(create_zip_url, json=payload, headers=headers)
-
+    payload = {"data": {"password": password, "hashes": file_hashes}}
+    response = get_virustotal_client().post(VIRUSTOTAL_ZIP_URL, json=payload, headers=headers)
     if not response.ok:
         raise Exception(f"Error creating ZIP: {response.text}")
+    return response.json()["data"]["id"]
+
 
-    zip_id = response.json()["data"]["id"]
+def wait_for_vt_zip(
+    api_key: str, zip_id: str, max_wait: float = 300.0, poll_interval: float = 2.0
+) -> None:
+    """
+    Waits for VirusTotal to finish preparing a ZIP file, checking again after
+    a pause that doubles each time, up to ZIP_POLL_MAX_INTERVAL.
 
-    check_zip_url = f"https://www.virustotal.com/api/v3/intelligence/zip_files/{zip_id}"
-    attempts = 0
-    while attempts < max_attempts:
-        response = requests.get(check_zip_url, headers=headers)
+    Args:
+        api_key: The API key for VirusTotal.
+        zip_id: The ID returned by create_vt_zip.
+        max_wait: The longest to wait, in seconds.
+        poll_interval: The pause before the second check, in seconds.
+
+    Raises:
+        VirusTotalZipTimeout: If the ZIP is not ready in time.
+        Exception: If the ZIP fails.
+    """
+    client = get_virustotal_client()
+    url = f"{VIRUSTOTAL_ZIP_URL}/{zip_id}"
+    deadline = time.monotonic() + max_wait
+    interval = max(0.1, poll_interval)
+    while True:
+        response = client.get(url, headers={"x-apikey": api_key, "accept": "application/json"})
         if not response.ok:
             raise Exception(f"Error checking ZIP status: {response.text}")
 
-        if response.json()["data"]["attributes"]["status"] == "finished":
-            break
+        status = response.json()["data"]["attributes"]["status"]
+        if status == "finished":
+            return
+        if status not in ("starting", "creating", "queued"):
+            raise Exception(f"ZIP file could not be created, status: {status}")
 
-        time.sleep(10)
-        attempts += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise VirusTotalZipTimeout(
+                f"ZIP file was not ready after {max_wait:g}s, status: {status}"
+            )
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, ZIP_POLL_MAX_INTERVAL)
+
+
+def download_vt_zip(api_key: str, zip_id: str) -> IO[bytes]:
+    """
+    Downloads a finished ZIP file from VirusTotal, streaming it into a
+    spooled temporary file rather than holding the whole response in memory.
 
-    if attempts == max_attempts:
-        raise Exception("Maximum polling attempts reached, ZIP file may not be ready.")
+    Args:
+        api_key: The API key for VirusTotal.
+        zip_id: The ID returned by create_vt_zip.
 
-    get_download_url = f"{check_zip_url}/download_url"
-    response = requests.get(get_download_url, headers=headers)
+    Returns:
+        IO[bytes]: The ZIP file, positioned at its start. The caller closes it.
 
+    Raises:
+        Exception: If the download fails.
+    """
+    client = get_virustotal_client()
+    response = client.get(
+        f"{VIRUSTOTAL_ZIP_URL}/{zip_id}/download_url",
+        headers={"x-apikey": api_key, "accept": "application/json"},
+    )
     if not response.ok:
         raise Exception(f"Error getting download URL: {response.text}")
-
     download_url = response.json()["data"]
 
-    response = requests.get(download_url, headers={"x-apikey": api_key})
-    if not response.ok:
-        raise Exception(f"Error downloading ZIP: {response.text}")
+    spooled = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_MAX_MEMORY)
+    try:
+        with client.get(download_url, headers={"x-apikey": api_key}, stream=True) as response:
+            if not response.ok:
+                raise Exception(f"Error downloading ZIP: {response.text}")
+            for chunk in response.iter_content(chunk_size=ZIP_CHUNK_SIZE):
+                spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return spooled
 
-    return BytesIO(response.content)
+
+def create_vt_zip_and_download(
+    api_key: str,
+    file_hash: List[str],
+    password: str,
+    max_wait: float = 300.0,
+    poll_interval: float = 2.0,
+) -> IO[bytes]:
+    """
+    Creates a password-protected ZIP file containing the specified files from VirusTotal,
+    then downloads and returns it.
+
+    This waits for VirusTotal to prepare the ZIP, so should be called from a
+    background job rather than while handling a request.
+
+    Args:
+        api_key (str): The API key for VirusTotal.
+        file_hash (list): The hashes of the files to download.
+        password (str): The password to set for the ZIP file.
+        max_wait (float): The longest to wait for the ZIP to be ready, in seconds.
+        poll_interval (float): The pause before checking the ZIP again, in seconds.
+
+    Returns:
+        IO[bytes]: A spooled temporary file holding the ZIP. The caller closes it.
+
+    Raises:
+        Exception: If any step in the process fails.
+    """
+    zip_id = create_vt_zip(api_key, file_hash, password)
+    wait_for_vt_zip(api_key, zip_id, max_wait=max_wait, poll_interval=poll_interval)
+    return download_vt_zip(api_key, zip_id)
 
 
 def download_vt_bytes(api_key: str, file_hash: str) -> BytesIO:
@@ -123,7 +508,7 @@ def download_vt_bytes(api_key: str, file_hash: str) -> BytesIO:
     download_url = f"https://www.virustotal.com/api/v3/files/{file_hash}/download"
     headers = {"x-apikey": api_key}
 
-    response = requests.get(download_url, headers=headers, stream=True)
+    response = get_virustotal_client().get(download_url, headers=headers, stream=True)
 
     if response.ok:
         file_buffer = BytesIO(response.content)
@@ -136,6 +521,33 @@ def download_vt_bytes(api_key: str, file_hash: str) -> BytesIO:
 
 def get_virustotal_widget_url(
     api_key: str, resource: str, fg1: str, bg1: str, bg2: str, bd1: str
+) -> str:
+    """
+    Returns a URL for embedding the VirusTotal widget with customized theme
+    colors, from the widget URL cache when the same resource and theme were
+    requested recently. Concurrent requests for the same widget share one
+    call to VirusTotal.
+
+    Args:
+        api_key (str): The API key for accessing VirusTotal.
+        resource (str): The resource identifier (file hash, URL, IP, or domain).
+        fg1 (str): Theme primary foreground color in hex notation.
+        bg1 (str): Theme primary background color in hex notation.
+        bg2 (str): Theme secondary background color in hex notation.
+        bd1 (str): Theme border color.
+
+    Returns:
+        str: A URL for embedding the VirusTotal widget with the specified theme.
+    """
+    # Hex colors are case-insensitive, so differently cased themes share an entry
+    key = (resource, fg1.upper(), bg1.upper(), bg2.upper(), bd1.upper())
+    return get_virustotal_widget_cache().get(
+        key, lambda: fetch_virustotal_widget_url(api_key, resource, fg1, bg1, bg2, bd1)
+    )
+
+
+def fetch_virustotal_widget_url(
+    api_key: str, resource: str, fg1: str, bg1: str, bg2: str, bd1: str
 ) -> str:
     """
     Retrieves a URL for embedding the VirusTotal widget with customized theme colors.
@@ -155,7 +567,7 @@ def get_virustotal_widget_url(
     headers = {"x-apikey": api_key}
 
     try:
-        response = requests.get(url, headers=headers)
+        response = get_virustotal_client().get(url, headers=headers)
         response.raise_for_status()
         widget_data = response.json()
         return widget_data.get("data", {}).get("url", "")
@@ -0,0 +1,237 @@
+import datetime
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from strelka_ui.database import db
+from strelka_ui.models import VirusTotalVerdict
+
+# Expired rows are deleted at most this often, by whichever process stores next
+PURGE_INTERVAL = datetime.timedelta(hours=1)
+
+
+class VerdictCache:
+    """
+    Caches VirusTotal positives by SHA256, in the virustotal_verdict table
+    shared by all processes, with an LRU of recent verdicts in front of it.
+
+    Files with detections, files without, and files VirusTotal has not seen
+    expire after their own TTLs, as each is likely to change at a different
+    rate. A TTL of 0 stops that kind of result from being cached. Lookup
+    errors are never cached.
+
+    Attributes:
+        positive_ttl (int): Seconds to keep a verdict with one or more detections.
+        negative_ttl (int): Seconds to keep a verdict with no detections.
+        not_found_ttl (int): Seconds to keep a file being unknown to VirusTotal.
+        max_entries (int): Verdicts held in memory, or 0 to only use the database.
+    """
+
+    def __init__(self, positive_ttl: int, negative_ttl: int, not_found_ttl: int, max_entries: int):
+        self.positive_ttl = max(0, positive_ttl)
+        self.negative_ttl = max(0, negative_ttl)
+        self.not_found_ttl = max(0, not_found_ttl)
+        self.max_entries = max(0, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Optional[int], datetime.datetime]]" = OrderedDict()
+        self._purged_at = datetime.datetime.min
+        self._lookups = 0
+        self._memory_hits = 0
+        self._database_hits = 0
+        self._stored = 0
+        self._errors = 0
+
+    def ttl(self, positives: Optional[int]) -> int:
+        """
+        Returns the seconds to cache a verdict for.
+
+        Args:
+            positives: The number of detections, or None if VirusTotal has not seen the file.
+        """
+        if positives is None:
+            return self.not_found_ttl
+        return self.positive_ttl if positives > 0 else self.negative_ttl
+
+    def _remember(self, sha256: str, positives: Optional[int], expires_at: datetime.datetime) -> None:
+        # Callers hold the lock
+        if not self.max_entries:
+            return
+        self._entries[sha256] = (positives, expires_at)
+        self._entries.move_to_end(sha256)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, Optional[int]]:
+        """
+        Looks up cached verdicts, first in memory and then in the database.
+
+        Args:
+            hashes: The SHA256 hashes to look up.
+
+        Returns:
+            Dict[str, Optional[int]]: The positives for each hash with an unexpired
+            verdict, or None for files VirusTotal has not seen. Other hashes are absent.
+        """
+        hashes = list(dict.fromkeys(hashes))
+        now = datetime.datetime.utcnow()
+        verdicts: Dict[str, Optional[int]] = {}
+
+        with self._lock:
+            self._lookups += len(hashes)
+            for sha256 in hashes:
+                entry = self._entries.get(sha256)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del self._entries[sha256]
+                    continue
+                self._entries.move_to_end(sha256)
+                verdicts[sha256] = entry[0]
+            self._memory_hits += len(verdicts)
+
+        misses = [sha256 for sha256 in hashes if sha256 not in verdicts]
+        if not misses:
+            return verdicts
+
+        try:
+            # A connection of its own, so the caller's session is left untouched
+            with db.engine.connect() as conn:
+                rows = conn.execute(
+                    select(
+                        VirusTotalVerdict.sha256,
+                        VirusTotalVerdict.positives,
+                        VirusTotalVerdict.expires_at,
+                    ).where(
+                        VirusTotalVerdict.sha256.in_(misses),
+                        VirusTotalVerdict.expires_at > now,
+                    )
+                ).all()
+        except Exception as e:
+            logging.warning(f"Could not read cached VirusTotal verdicts: {e}")
+            with self._lock:
+                self._errors += 1
+            return verdicts
+
+        with self._lock:
+            for sha256, positives, expires_at in rows:
+                verdicts[sha256] = positives
+                self._remember(sha256, positives, expires_at)
+            self._database_hits += len(rows)
+        return verdicts
+
+    def get(self, sha256: str) -> Tuple[bool, Optional[int]]:
+        """
+        Looks up a single cached verdict.
+
+        Returns:
+            Tuple[bool, Optional[int]]: Whether a verdict was cached, and its positives.
+        """
+        verdicts = self.get_many([sha256])
+        return sha256 in verdicts, verdicts.get(sha256)
+
+    def put_many(self, verdicts: Dict[str, Optional[int]]) -> None:
+        """
+        Caches fresh verdicts, replacing any cached for the same files.
+
+        Args:
+            verdicts: The positives for each SHA256, or None for files VirusTotal has not seen.
+        """
+        now = datetime.datetime.utcnow()
+        rows = []
+        with self._lock:
+            for sha256, positives in verdicts.items():
+                ttl = self.ttl(positives)
+                if not ttl:
+                    continue
+                expires_at = now + datetime.timedelta(seconds=ttl)
+                self._remember(sha256, positives, expires_at)
+                rows.append(
+                    {
+                        "sha256": sha256,
+                        "positives": positives,
+                        "checked_at": now,
+                        "expires_at": expires_at,
+                    }
+                )
+            purge = now - self._purged_at >= PURGE_INTERVAL
+            if purge:
+                self._purged_at = now
+        if not rows:
+            return
+
+        stmt = insert(VirusTotalVerdict).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[VirusTotalVerdict.sha256],
+            set_={
+                "positives": stmt.excluded.positives,
+                "checked_at": stmt.excluded.checked_at,
+                "expires_at": stmt.excluded.expires_at,
+            },
+        )
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(stmt)
+                if purge:
+                    conn.execute(
+                        delete(VirusTotalVerdict).where(VirusTotalVerdict.expires_at <= now)
+                    )
+        except Exception as e:
+            logging.warning(f"Could not cache VirusTotal verdicts: {e}")
+            with self._lock:
+                self._errors += 1
+            return
+
+        with self._lock:
+            self._stored += len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self._memory_hits + self._database_hits
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "lookups": self._lookups,
+                "memory_hits": self._memory_hits,
+                "database_hits": self._database_hits,
+                "misses": self._lookups - hits,
+                "hit_rate": round(hits / self._lookups, 4) if self._lookups else None,
+                "stored": self._stored,
+                "errors": self._errors,
+            }
+
+
+_cache: Optional[VerdictCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_virustotal_cache() -> Optional[VerdictCache]:
+    """
+    Returns the process-wide VirusTotal verdict cache, creating it from the
+    Flask application configuration on first use, or None if every TTL is 0.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = current_app.config
+                _cache = VerdictCache(
+                    int(config["VIRUSTOTAL_CACHE_POSITIVE_TTL"]),
+                    int(config["VIRUSTOTAL_CACHE_NEGATIVE_TTL"]),
+                    int(config["VIRUSTOTAL_CACHE_NOT_FOUND_TTL"]),
+                    int(config["VIRUSTOTAL_CACHE_SIZE"]),
+                )
+    if not (_cache.positive_ttl or _cache.negative_ttl or _cache.not_found_ttl):
+        return None
+    return _cache
+
+
+def get_virustotal_cache_stats() -> Optional[Dict[str, Any]]:
+    """
+    Returns hit and miss counters for the VirusTotal verdict cache.
+    """
+    return _cache.stats() if _cache is not None else None
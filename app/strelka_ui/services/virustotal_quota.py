@@ -0,0 +1,186 @@
+import datetime
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from flask import current_app
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from strelka_ui.database import db
+from strelka_ui.models import VirusTotalQuota
+
+# Windows older than this are deleted, at most once per PURGE_INTERVAL per process
+RETENTION = datetime.timedelta(days=2)
+PURGE_INTERVAL = datetime.timedelta(hours=1)
+
+
+class QuotaLedger:
+    """
+    Tracks VirusTotal lookups per minute and per day across every process
+    and node, in the virustotal_quota table.
+
+    Lookups are reserved before they are made. A reservation locks the
+    current windows' rows, so concurrent reservations from different
+    processes cannot both spend the last of the budget. Reserved lookups
+    that end up not being made, for instance because the per-process rate
+    limiter skipped them, are not returned, so the ledger errs on the side
+    of leaving quota unused.
+
+    Attributes:
+        per_minute (int): Lookups allowed per minute, or 0 for no limit.
+        per_day (int): Lookups allowed per UTC day, or 0 for no limit.
+    """
+
+    def __init__(self, per_minute: int, per_day: int):
+        self.per_minute = max(0, per_minute)
+        self.per_day = max(0, per_day)
+        self._lock = threading.Lock()
+        self._purged_at = datetime.datetime.min
+        self._requested = 0
+        self._granted = 0
+        self._errors = 0
+        self._used: Dict[str, int] = {}
+
+    def _limits(self) -> Dict[str, int]:
+        # Always in the same order, so every process locks the rows in the same order
+        limits = {"day": self.per_day, "minute": self.per_minute}
+        return {period: limit for period, limit in limits.items() if limit}
+
+    def reserve(self, lookups: int) -> int:
+        """
+        Reserves up to the given number of lookups from the shared budget.
+
+        If the database cannot be reached, every lookup is granted, since
+        VirusTotal itself still enforces the quota.
+
+        Args:
+            lookups: The lookups wanted.
+
+        Returns:
+            int: The lookups granted, which may be fewer than requested, or none.
+        """
+        limits = self._limits()
+        if lookups <= 0 or not limits:
+            return max(0, lookups)
+
+        now = datetime.datetime.utcnow()
+        windows = {
+            "day": now.replace(hour=0, minute=0, second=0, microsecond=0),
+            "minute": now.replace(second=0, microsecond=0),
+        }
+
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    insert(VirusTotalQuota)
+                    .values(
+                        [
+                            {"period": period, "window_start": windows[period], "used": 0}
+                            for period in limits
+                        ]
+                    )
+                    .on_conflict_do_nothing()
+                )
+
+                used = {}
+                for period in limits:
+                    used[period] = conn.execute(
+                        select(VirusTotalQuota.used)
+                        .where(
+                            VirusTotalQuota.period == period,
+                            VirusTotalQuota.window_start == windows[period],
+                        )
+                        .with_for_update()
+                    ).scalar_one()
+
+                granted = max(
+                    0, min([lookups] + [limit - used[period] for period, limit in limits.items()])
+                )
+                if granted:
+                    for period in limits:
+                        conn.execute(
+                            update(VirusTotalQuota)
+                            .where(
+                                VirusTotalQuota.period == period,
+                                VirusTotalQuota.window_start == windows[period],
+                            )
+                            .values(used=VirusTotalQuota.used + granted)
+                        )
+        except Exception as e:
+            logging.warning(f"Could not reserve VirusTotal quota, allowing lookups: {e}")
+            with self._lock:
+                self._requested += lookups
+                self._granted += lookups
+                self._errors += 1
+            return lookups
+
+        with self._lock:
+            self._requested += lookups
+            self._granted += granted
+            self._used = {period: used[period] + granted for period in limits}
+            purge = now - self._purged_at >= PURGE_INTERVAL
+            if purge:
+                self._purged_at = now
+
+        if purge:
+            self._purge(now)
+        if granted < lookups:
+            logging.info(
+                f"VirusTotal quota low: {granted} of {lookups} lookups granted, usage {self._used}"
+            )
+        return granted
+
+    def _purge(self, now: datetime.datetime) -> None:
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(
+                    delete(VirusTotalQuota).where(VirusTotalQuota.window_start < now - RETENTION)
+                )
+        except Exception as e:
+            logging.warning(f"Could not purge old VirusTotal quota windows: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "per_minute": self.per_minute,
+                "per_day": self.per_day,
+                # Usage across all processes, as of this process's last reservation
+                "minute_used": self._used.get("minute"),
+                "day_used": self._used.get("day"),
+                "requested": self._requested,
+                "granted": self._granted,
+                "denied": self._requested - self._granted,
+                "errors": self._errors,
+            }
+
+
+_ledger: Optional[QuotaLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_virustotal_quota() -> Optional[QuotaLedger]:
+    """
+    Returns the process-wide VirusTotal quota ledger, creating it from the
+    Flask application configuration on first use, or None if neither a
+    per-minute nor a per-day quota is set.
+    """
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                config = current_app.config
+                _ledger = QuotaLedger(
+                    int(config["VIRUSTOTAL_QUOTA_PER_MINUTE"]),
+                    int(config["VIRUSTOTAL_QUOTA_PER_DAY"]),
+                )
+    if not (_ledger.per_minute or _ledger.per_day):
+        return None
+    return _ledger
+
+
+def get_virustotal_quota_stats() -> Optional[Dict[str, Any]]:
+    """
+    Returns usage counters for the VirusTotal quota ledger.
+    """
+    return _ledger.stats() if _ledger is not None else None
@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from flask import current_app
+
+from strelka_ui.services.singleflight import SingleFlight
+
+
+class WidgetUrlCache:
+    """
+    Caches VirusTotal widget URLs in memory, keyed by resource and theme
+    colors, so reopening the same submission does not call VirusTotal again.
+
+    Concurrent requests for a URL that is not cached yet share a single call
+    to VirusTotal. Errors and empty URLs are never cached.
+
+    Attributes:
+        ttl (int): Seconds to keep a URL, or 0 to only coalesce concurrent requests.
+        max_entries (int): URLs held in memory, least recently used evicted first.
+    """
+
+    def __init__(self, ttl: int, max_entries: int):
+        self.ttl = max(0, ttl)
+        self.max_entries = max(0, max_entries)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[str, float]]" = OrderedDict()
+        self._flight = SingleFlight()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+
+    def _lookup(self, key: Hashable, now: float) -> Optional[str]:
+        # Callers hold the lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, key: Hashable, fetch: Callable[[], str]) -> str:
+        """
+        Returns the cached URL for a key, fetching and caching it if necessary.
+
+        Args:
+            key: Identifies the widget, e.g. its resource and theme colors.
+            fetch: Retrieves the URL from VirusTotal.
+
+        Returns:
+            str: The widget URL.
+
+        Raises:
+            Exception: Whatever fetch raised.
+        """
+        with self._lock:
+            url = self._lookup(key, time.monotonic())
+            if url is not None:
+                self._hits += 1
+                return url
+            self._misses += 1
+
+        url, shared = self._flight.do(key, fetch)
+        if shared:
+            with self._lock:
+                self._coalesced += 1
+            return url
+
+        if url and self.ttl and self.max_entries:
+            with self._lock:
+                self._entries[key] = (url, time.monotonic() + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return url
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "ttl": self.ttl,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                # Misses answered by another request's call to VirusTotal
+                "coalesced": self._coalesced,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else None,
+            }
+
+
+_cache: Optional[WidgetUrlCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_virustotal_widget_cache() -> WidgetUrlCache:
+    """
+    Returns the process-wide VirusTotal widget URL cache, creating it from
+    the Flask application configuration on first use.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = current_app.config
+                _cache = WidgetUrlCache(
+                    int(config["VIRUSTOTAL_WIDGET_CACHE_TTL"]),
+                    int(config["VIRUSTOTAL_WIDGET_CACHE_SIZE"]),
+                )
+    return _cache
+
+
+def get_virustotal_widget_cache_stats() -> Optional[Dict[str, Any]]:
+    """
+    Returns hit and miss counters for the VirusTotal widget URL cache.
+    """
+    return _cache.stats() if _cache is not None else None
@@ -0,0 +1,281 @@
+import asyncio
+import atexit
+import itertools
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+import grpc
+import grpc.aio
+
+import strelka_ui.strelka.strelka_pb2 as strelka_pb2
+import strelka_ui.strelka.strelka_pb2_grpc as strelka_pb2_grpc
+
+
+class EventLoopThread:
+    """
+    A daemon thread running an asyncio event loop that other threads can
+    submit coroutines to.
+
+    Attributes:
+        name (str): The name of the thread.
+    """
+
+    def __init__(self, name: str = "strelka-aio"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _run(self, started: threading.Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        started.set()
+        self._loop.run_forever()
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """
+        Returns the event loop, starting its thread on first use.
+        """
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                started = threading.Event()
+                self._thread = threading.Thread(
+                    target=self._run, args=(started,), name=self.name, daemon=True
+                )
+                self._thread.start()
+                started.wait()
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """
+        Schedules a coroutine on the loop from any other thread.
+
+        Returns:
+            Future: A concurrent.futures.Future for the coroutine's result.
+                Cancelling it cancels the coroutine.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop())
+
+    def stop(self) -> None:
+        """
+        Stops the loop and waits for its thread to exit.
+        """
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is not None and loop.is_running():
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+
+
+_loop_thread = EventLoopThread()
+
+
+def get_event_loop_thread() -> EventLoopThread:
+    """
+    Returns the process-wide event loop thread used by asynchronous Strelka clients.
+    """
+    return _loop_thread
+
+
+async def read_requests(
+    requests: Iterable[strelka_pb2.ScanFileRequest],
+) -> AsyncIterator[strelka_pb2.ScanFileRequest]:
+    """
+    Adapts a synchronous request iterator for grpc.aio. Building each request
+    reads a chunk of the file, which can block on disk or S3, so it runs in the
+    loop's default executor rather than on the shared event loop thread.
+
+    Args:
+        requests: The ScanFileRequest messages for the file.
+
+    Yields:
+        strelka_pb2.ScanFileRequest: Each request, once its chunk has been read.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = iter(requests)
+    done = object()
+    while True:
+        request = await loop.run_in_executor(None, next, iterator, done)
+        if request is done:
+            return
+        yield request
+
+
+class AsyncStrelkaClient:
+    """
+    A grpc.aio client holding a small pool of channels to one Strelka frontend.
+
+    Scans run as coroutines on the shared event loop thread, so any number of
+    them can be in flight without a thread each. Channels are created lazily
+    on the loop, as grpc.aio requires.
+
+    Attributes:
+        target (str): The host:port of the Strelka frontend.
+        in_flight (int): Number of ScanFile calls currently running.
+        calls (int): Total number of ScanFile calls made.
+    """
+
+    def __init__(
+        self,
+        target: str,
+        credentials: Optional[grpc.ChannelCredentials],
+        options: List[Tuple[str, Any]],
+        pool_size: int = 1,
+    ):
+        self.target = target
+        self.in_flight = 0
+        self.calls = 0
+        self._credentials = credentials
+        self._options = options
+        self._pool_size = max(1, pool_size)
+        self._stubs: List[strelka_pb2_grpc.FrontendStub] = []
+        self._channels: List[grpc.aio.Channel] = []
+        self._next = itertools.count()
+
+    def _stub(self) -> strelka_pb2_grpc.FrontendStub:
+        # Only ever called on the event loop thread, so no locking is needed
+        if not self._stubs:
+            for _ in range(self._pool_size):
+                if self._credentials is not None:
+                    channel = grpc.aio.secure_channel(
+                        self.target, self._credentials, options=self._options
+                    )
+                else:
+                    channel = grpc.aio.insecure_channel(self.target, options=self._options)
+                self._channels.append(channel)
+                self._stubs.append(strelka_pb2_grpc.FrontendStub(channel))
+        return self._stubs[next(self._next) % len(self._stubs)]
+
+    async def _scan(
+        self,
+        requests: Iterable[strelka_pb2.ScanFileRequest],
+        timeout: float,
+        on_event: Callable[[str], None],
+    ) -> None:
+        self.in_flight += 1
+        self.calls += 1
+        try:
+            call = self._stub().ScanFile(read_requests(requests), timeout=timeout)
+            async for response in call:
+                on_event(response.event)
+        finally:
+            self.in_flight -= 1
+
+    async def scan_file_async(
+        self, requests: Iterable[strelka_pb2.ScanFileRequest], timeout: float
+    ) -> List[str]:
+        """
+        Streams a file to Strelka and collects the raw JSON events it returns.
+
+        Args:
+            requests: The ScanFileRequest messages for the file.
+            timeout: Seconds before the call fails with DEADLINE_EXCEEDED.
+
+        Returns:
+            List[str]: The events, as JSON strings.
+        """
+        events: List[str] = []
+        await self._scan(requests, timeout, events.append)
+        return events
+
+    def stream_file(
+        self,
+        requests: Iterable[strelka_pb2.ScanFileRequest],
+        timeout: float,
+        on_cancel: Optional[Callable[[Callable[[], Any]], Callable[[], None]]] = None,
+    ) -> Iterator[str]:
+        """
+        Synchronous adapter for use from Flask request and worker threads. The
+        gRPC call runs on the shared event loop, and each event is handed to the
+        calling thread as soon as it arrives. Closing the iterator early cancels
+        the call.
+
+        Args:
+            requests: The ScanFileRequest messages for the file.
+            timeout: Seconds before the call fails with DEADLINE_EXCEEDED.
+            on_cancel: A callable that registers a cancellation callback and
+                returns a function to unregister it, such as ScanDeadline.on_cancel.
+
+        Yields:
+            str: Each event, as a JSON string.
+
+        Raises:
+            grpc.RpcError: If the call fails.
+            concurrent.futures.CancelledError: If the call was cancelled through on_cancel.
+        """
+        events: "queue.Queue[Any]" = queue.Queue()
+        done = object()
+
+        future = get_event_loop_thread().submit(self._scan(requests, timeout, events.put))
+        future.add_done_callback(lambda _: events.put(done))
+        unregister = on_cancel(future.cancel) if on_cancel else None
+        try:
+            while True:
+                event = events.get()
+                if event is done:
+                    break
+                yield event
+            # Raises whatever ended the call, if it did not complete
+            future.result()
+        finally:
+            future.cancel()
+            if unregister:
+                unregister()
+
+    def scan_file(
+        self,
+        requests: Iterable[strelka_pb2.ScanFileRequest],
+        timeout: float,
+        on_cancel: Optional[Callable[[Callable[[], Any]], Callable[[], None]]] = None,
+    ) -> List[str]:
+        """
+        Like stream_file, but waits for the scan to finish and returns every event.
+        """
+        return list(self.stream_file(requests, timeout, on_cancel))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "channels": len(self._channels),
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+        }
+
+    async def close_async(self) -> None:
+        channels, self._channels, self._stubs = self._channels, [], []
+        for channel in channels:
+            await channel.close()
+
+    def close(self) -> None:
+        """
+        Closes the client's channels on the event loop.
+        """
+        if not self._channels:
+            return
+        try:
+            get_event_loop_thread().submit(self.close_async()).result(timeout=5)
+        except Exception as e:
+            logging.warning(f"Error closing async Strelka channels to {self.target}: {e}")
+
+
+@atexit.register
+def stop_event_loop_thread() -> None:
+    """
+    Stops the shared event loop thread. Registered to run at interpreter exit,
+    after the clients using it have been closed.
+    """
+    _loop_thread.stop()
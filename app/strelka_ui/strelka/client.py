@@ -0,0 +1,607 @@
+import atexit
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import grpc
+from flask import current_app
+
+import strelka_ui.strelka.strelka_pb2_grpc as strelka_pb2_grpc
+from strelka_ui.strelka.aio_client import AsyncStrelkaClient
+
+
+class StrelkaChannel:
+    """
+    A single long-lived gRPC channel to a Strelka frontend.
+
+    The underlying grpc.Channel is created lazily on first use and can be
+    discarded with reset(), in which case the next call builds a fresh one.
+
+    Attributes:
+        index (int): Position of the channel in its client's pool.
+        in_flight (int): Number of ScanFile calls currently using this channel.
+        calls (int): Total number of ScanFile calls made over this channel.
+        resets (int): Number of times the channel has been rebuilt.
+    """
+
+    def __init__(self, index: int, client: "StrelkaClient"):
+        self.index = index
+        self.in_flight = 0
+        self.calls = 0
+        self.resets = 0
+        self._client = client
+        self._channel: Optional[grpc.Channel] = None
+        self._stub: Optional[strelka_pb2_grpc.FrontendStub] = None
+
+    def stub(self) -> strelka_pb2_grpc.FrontendStub:
+        """
+        Returns the FrontendStub for this channel, connecting if required.
+        Must be called with the owning client's lock held.
+        """
+        if self._channel is None:
+            self._channel = self._client._create_channel()
+            self._stub = strelka_pb2_grpc.FrontendStub(self._channel)
+        return self._stub
+
+    def reset(self) -> None:
+        """
+        Closes the underlying grpc.Channel so it is rebuilt on next use.
+        Must be called with the owning client's lock held.
+        """
+        if self._channel is not None:
+            try:
+                self._channel.close()
+            except Exception as e:
+                logging.warning(f"Error closing Strelka channel {self.index}: {e}")
+            self._channel = None
+            self._stub = None
+            self.resets += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "index": self.index,
+            "connected": self._channel is not None,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "resets": self.resets,
+        }
+
+
+class StrelkaClient:
+    """
+    Client holding a small pool of long-lived channels to one Strelka frontend.
+
+    Calls are placed on the channel with the fewest in-flight requests. The
+    TLS certificate is read once, channels connect lazily and are rebuilt
+    after an UNAVAILABLE error, and close() shuts everything down. An
+    asynchronous client for the same frontend, sharing the certificate and
+    channel options, is available from aio().
+
+    Attributes:
+        target (str): The host:port of the Strelka frontend.
+    """
+
+    def __init__(
+        self,
+        target: str,
+        cert_path: str = "",
+        pool_size: int = 1,
+        keepalive_time_ms: int = 300000,
+        keepalive_timeout_ms: int = 20000,
+    ):
+        self.target = target
+        self._options = [
+            ("grpc.keepalive_time_ms", keepalive_time_ms),
+            ("grpc.keepalive_timeout_ms", keepalive_timeout_ms),
+            ("grpc.keepalive_permit_without_calls", 0),
+            ("grpc.http2.max_pings_without_data", 0),
+        ]
+        self._credentials = None
+        if cert_path:
+            with open(cert_path, "rb") as f:
+                self._credentials = grpc.ssl_channel_credentials(f.read())
+
+        self._lock = threading.Lock()
+        self._channels = [StrelkaChannel(i, self) for i in range(max(1, pool_size))]
+        self._aio: Optional[AsyncStrelkaClient] = None
+        self._closed = False
+
+    def _create_channel(self) -> grpc.Channel:
+        if self._credentials is not None:
+            return grpc.secure_channel(
+                self.target, self._credentials, options=self._options
+            )
+        return grpc.insecure_channel(self.target, options=self._options)
+
+    @contextmanager
+    def stub(self) -> Iterator[strelka_pb2_grpc.FrontendStub]:
+        """
+        Context manager yielding a FrontendStub on the least loaded channel.
+
+        The channel's in-flight count covers the whole block, so callers must
+        consume the ScanFile response stream inside it. If the call fails with
+        UNAVAILABLE the channel is reset so the next call reconnects.
+
+        Yields:
+            strelka_pb2_grpc.FrontendStub: A stub bound to a pooled channel.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Strelka client for {self.target} is closed")
+            channel = min(self._channels, key=lambda c: c.in_flight)
+            stub = channel.stub()
+            channel.in_flight += 1
+            channel.calls += 1
+
+        try:
+            yield stub
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.UNAVAILABLE:
+                with self._lock:
+                    channel.reset()
+            raise
+        finally:
+            with self._lock:
+                channel.in_flight -= 1
+
+    def aio(self) -> AsyncStrelkaClient:
+        """
+        Returns the asynchronous client for this frontend, creating it on first use.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Strelka client for {self.target} is closed")
+            if self._aio is None:
+                self._aio = AsyncStrelkaClient(
+                    self.target, self._credentials, self._options, len(self._channels)
+                )
+            return self._aio
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns per-channel usage counters for sizing the pool.
+        """
+        with self._lock:
+            channels = [c.as_dict() for c in self._channels]
+        stats = {
+            "target": self.target,
+            "secure": self._credentials is not None,
+            "in_flight": sum(c["in_flight"] for c in channels),
+            "channels": channels,
+        }
+        if self._aio is not None:
+            stats["aio"] = self._aio.stats()
+        return stats
+
+    def close(self) -> None:
+        """
+        Closes every channel in the pool. Further calls raise RuntimeError.
+        """
+        with self._lock:
+            self._closed = True
+            for channel in self._channels:
+                channel.reset()
+            aio, self._aio = self._aio, None
+        if aio is not None:
+            aio.close()
+
+
+# The cluster used when no routing rule applies
+DEFAULT_CLUSTER = "default"
+
+# Errors that say something about the frontend itself, rather than the request
+ENDPOINT_FAILURE_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.INTERNAL,
+    grpc.StatusCode.UNKNOWN,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+)
+
+# Weight of the latest call in each endpoint's moving latency average
+LATENCY_SMOOTHING = 0.2
+
+
+class StrelkaEndpoint:
+    """
+    One Strelka frontend in a balancer, with its health and latency statistics.
+
+    An endpoint is ejected after a run of consecutive failures. Once its
+    ejection period has passed it is probed with a single call: success brings
+    it back, failure ejects it again.
+
+    Attributes:
+        client (StrelkaClient): The pooled client for the frontend.
+        weight (int): The endpoint's share of traffic relative to the others.
+        state (str): "healthy", "ejected" or "probing".
+    """
+
+    def __init__(self, client: StrelkaClient, weight: int = 1):
+        self.client = client
+        self.weight = max(1, weight)
+        self.state = "healthy"
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.latency_ms: Optional[float] = None
+        self.last_latency_ms: Optional[float] = None
+        self.current_weight = 0
+
+    @property
+    def target(self) -> str:
+        return self.client.target
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "target": self.target,
+            "weight": self.weight,
+            "state": self.state,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ejections": self.ejections,
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "last_latency_ms": (
+                round(self.last_latency_ms, 1) if self.last_latency_ms is not None else None
+            ),
+        }
+
+
+class EndpointCall:
+    """
+    One call made through a balancer endpoint. The caller notes each response
+    and, once the call has finished, that it completed, so the endpoint's
+    latency runs up to the last response rather than until the caller is done
+    with the results.
+
+    Attributes:
+        endpoint (StrelkaEndpoint): The endpoint the call was made to.
+        completed (bool): Whether the call ran to completion.
+    """
+
+    def __init__(self, endpoint: StrelkaEndpoint):
+        self.endpoint = endpoint
+        self.completed = False
+        self._started = time.monotonic()
+        self._last_response: Optional[float] = None
+
+    def responded(self) -> None:
+        """
+        Notes that a response arrived.
+        """
+        self._last_response = time.monotonic()
+
+    def complete(self) -> None:
+        """
+        Notes that the call finished normally.
+        """
+        if self._last_response is None:
+            self._last_response = time.monotonic()
+        self.completed = True
+
+    def elapsed_ms(self) -> float:
+        end = self._last_response if self._last_response is not None else time.monotonic()
+        return (end - self._started) * 1000
+
+
+class StrelkaBalancer:
+    """
+    Spreads ScanFile calls over several Strelka frontends.
+
+    Two policies are supported: "least_outstanding" picks the endpoint with the
+    fewest in-flight calls per unit of weight, and "weighted_round_robin"
+    rotates through endpoints in proportion to their weights. Ejected
+    endpoints are skipped; if every endpoint is ejected, all of them are used
+    rather than failing outright.
+
+    Attributes:
+        name (str): The name the balancer is registered under.
+        policy (str): The balancing policy.
+        endpoints (List[StrelkaEndpoint]): The frontends being balanced.
+    """
+
+    POLICIES = ("least_outstanding", "weighted_round_robin")
+
+    def __init__(
+        self,
+        name: str,
+        endpoints: List[StrelkaEndpoint],
+        policy: str = "least_outstanding",
+        eject_after: int = 3,
+        eject_seconds: float = 30,
+    ):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown Strelka balancing policy: {policy}")
+        if not endpoints:
+            raise ValueError(f"Strelka balancer {name} has no frontends")
+
+        self.name = name
+        self.policy = policy
+        self.endpoints = endpoints
+        self.eject_after = max(1, eject_after)
+        self.eject_seconds = eject_seconds
+        self._lock = threading.Lock()
+
+    def _available(self, exclude: Sequence[StrelkaEndpoint]) -> List[StrelkaEndpoint]:
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e not in exclude] or list(self.endpoints)
+
+        available = [e for e in candidates if e.state == "healthy"]
+        # At most one probe at a time for an endpoint whose ejection has run out
+        available += [
+            e for e in candidates if e.state == "ejected" and now >= e.ejected_until
+        ][:1]
+        return available or candidates
+
+    def _pick(self, endpoints: List[StrelkaEndpoint]) -> StrelkaEndpoint:
+        if len(endpoints) == 1:
+            return endpoints[0]
+
+        if self.policy == "weighted_round_robin":
+            # Smooth weighted round robin, so heavier endpoints are not picked in bursts
+            total = sum(e.weight for e in endpoints)
+            for endpoint in endpoints:
+                endpoint.current_weight += endpoint.weight
+            chosen = max(endpoints, key=lambda e: e.current_weight)
+            chosen.current_weight -= total
+            return chosen
+
+        return min(
+            endpoints,
+            key=lambda e: (e.in_flight / e.weight, e.latency_ms or 0.0),
+        )
+
+    @contextmanager
+    def endpoint(self, exclude: Sequence[StrelkaEndpoint] = ()) -> Iterator[EndpointCall]:
+        """
+        Context manager yielding a call on an endpoint chosen by the balancing
+        policy. The call's outcome and latency are recorded against the
+        endpoint when the block exits.
+
+        The call succeeded if it was marked complete, or the block exited
+        normally, and failed if it raised a gRPC error blaming the frontend.
+        A call that was cancelled or timed out, or abandoned because the
+        caller stopped reading, is neither, and leaves the endpoint's health
+        as it was.
+
+        Args:
+            exclude: Endpoints to avoid if any others are available, e.g. ones
+                that already failed for this submission.
+
+        Yields:
+            EndpointCall: The call, with the chosen endpoint.
+        """
+        with self._lock:
+            endpoint = self._pick(self._available(exclude))
+            if endpoint.state == "ejected":
+                endpoint.state = "probing"
+            endpoint.in_flight += 1
+            endpoint.calls += 1
+
+        call = EndpointCall(endpoint)
+        # True for a failure, False for a success, None for neither
+        failed: Optional[bool] = None
+        try:
+            yield call
+            failed = False
+        except grpc.RpcError as e:
+            if e.code() in ENDPOINT_FAILURE_CODES:
+                failed = True
+            elif e.code() not in (grpc.StatusCode.CANCELLED, grpc.StatusCode.DEADLINE_EXCEEDED):
+                # The frontend answered, even if it rejected the request
+                failed = False
+            raise
+        finally:
+            if failed is None and call.completed:
+                failed = False
+            self._record(endpoint, call.elapsed_ms(), failed)
+
+    @contextmanager
+    def stub(
+        self, exclude: Sequence[StrelkaEndpoint] = ()
+    ) -> Iterator[Tuple[StrelkaEndpoint, strelka_pb2_grpc.FrontendStub]]:
+        """
+        Like endpoint(), but yields the chosen endpoint and a FrontendStub on
+        one of its pooled synchronous channels. The call succeeded if the block
+        exits normally.
+
+        Yields:
+            Tuple[StrelkaEndpoint, strelka_pb2_grpc.FrontendStub]: The chosen endpoint and its stub.
+        """
+        with self.endpoint(exclude) as call:
+            with call.endpoint.client.stub() as stub:
+                yield call.endpoint, stub
+
+    def _record(
+        self, endpoint: StrelkaEndpoint, elapsed_ms: float, failed: Optional[bool]
+    ) -> None:
+        with self._lock:
+            endpoint.in_flight -= 1
+
+            if failed is None:
+                # Nothing was learned, so a probe can be tried again
+                if endpoint.state == "probing":
+                    endpoint.state = "ejected"
+                return
+
+            if not failed:
+                endpoint.consecutive_failures = 0
+                endpoint.state = "healthy"
+                endpoint.last_latency_ms = elapsed_ms
+                if endpoint.latency_ms is None:
+                    endpoint.latency_ms = elapsed_ms
+                else:
+                    endpoint.latency_ms += LATENCY_SMOOTHING * (elapsed_ms - endpoint.latency_ms)
+                return
+
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if (
+                endpoint.state == "probing"
+                or endpoint.consecutive_failures >= self.eject_after
+            ):
+                if endpoint.state != "ejected":
+                    endpoint.ejections += 1
+                    logging.warning(
+                        f"Ejecting Strelka frontend {endpoint.target} for {self.eject_seconds}s "
+                        f"after {endpoint.consecutive_failures} consecutive failures"
+                    )
+                endpoint.state = "ejected"
+                endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns health, latency and channel counters for every endpoint.
+        """
+        with self._lock:
+            endpoints = [e.as_dict() for e in self.endpoints]
+        for endpoint, e in zip(endpoints, self.endpoints):
+            endpoint["client"] = e.client.stats()
+        return {"name": self.name, "policy": self.policy, "endpoints": endpoints}
+
+    def close(self) -> None:
+        """
+        Closes every endpoint's client.
+        """
+        for endpoint in self.endpoints:
+            endpoint.client.close()
+
+
+def parse_frontends(value: str) -> List[Tuple[str, int]]:
+    """
+    Parses a comma-separated list of Strelka frontends, each given as
+    host:port with an optional =weight suffix.
+
+    Args:
+        value (str): e.g. "strelka-a:57314=2,strelka-b:57314".
+
+    Returns:
+        List[Tuple[str, int]]: The frontends' targets and weights.
+    """
+    frontends = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        target, _, weight = entry.partition("=")
+        frontends.append((target.strip(), int(weight) if weight else 1))
+    return frontends
+
+
+def get_configured_frontends() -> List[Tuple[str, int]]:
+    """
+    Returns the frontends of the default cluster: those named in
+    STRELKA_FRONTENDS, or the single STRELKA_HOST:STRELKA_PORT frontend if it
+    is not set.
+    """
+    config = current_app.config
+    return parse_frontends(config["STRELKA_FRONTENDS"]) or [
+        (f"{config['STRELKA_HOST']}:{config['STRELKA_PORT']}", 1)
+    ]
+
+
+def get_configured_clusters() -> Dict[str, List[Tuple[str, int]]]:
+    """
+    Returns the frontends of every configured Strelka cluster: the default
+    cluster, plus any named in the STRELKA_CLUSTERS JSON object, which maps
+    cluster names to frontend lists in the STRELKA_FRONTENDS format.
+
+    Raises:
+        ValueError: If STRELKA_CLUSTERS is malformed.
+    """
+    value = current_app.config["STRELKA_CLUSTERS"]
+    clusters = json.loads(value) if value.strip() else {}
+    if not isinstance(clusters, dict):
+        raise ValueError("STRELKA_CLUSTERS must be a JSON object of cluster names to frontends")
+
+    configured = {name: parse_frontends(frontends) for name, frontends in clusters.items()}
+    configured.setdefault(DEFAULT_CLUSTER, get_configured_frontends())
+    return configured
+
+
+_balancers: Dict[str, StrelkaBalancer] = {}
+_balancers_lock = threading.Lock()
+
+
+def create_strelka_balancer(name: str, frontends: List[Tuple[str, int]]) -> StrelkaBalancer:
+    """
+    Builds a balancer over the given frontends from the Flask application configuration.
+
+    Args:
+        name (str): The name to register the balancer under.
+        frontends (List[Tuple[str, int]]): The frontends' targets and weights.
+
+    Returns:
+        StrelkaBalancer: A new balancer with one pooled client per frontend.
+    """
+    config = current_app.config
+    endpoints = [
+        StrelkaEndpoint(
+            StrelkaClient(
+                target,
+                cert_path=config["STRELKA_CERT"],
+                pool_size=int(config["STRELKA_CHANNEL_POOL_SIZE"]),
+                keepalive_time_ms=int(config["STRELKA_KEEPALIVE_TIME_MS"]),
+                keepalive_timeout_ms=int(config["STRELKA_KEEPALIVE_TIMEOUT_MS"]),
+            ),
+            weight,
+        )
+        for target, weight in frontends
+    ]
+    return StrelkaBalancer(
+        name,
+        endpoints,
+        policy=config["STRELKA_BALANCING_POLICY"],
+        eject_after=int(config["STRELKA_EJECT_AFTER_FAILURES"]),
+        eject_seconds=float(config["STRELKA_EJECT_SECONDS"]),
+    )
+
+
+def get_strelka_balancer(name: str = DEFAULT_CLUSTER) -> StrelkaBalancer:
+    """
+    Returns the shared balancer for a Strelka cluster's frontends, creating
+    it from the Flask application configuration on first use.
+
+    Args:
+        name (str): The name of the cluster.
+
+    Returns:
+        StrelkaBalancer: The process-wide balancer.
+    """
+    balancer = _balancers.get(name)
+    if balancer is not None:
+        return balancer
+
+    with _balancers_lock:
+        balancer = _balancers.get(name)
+        if balancer is None:
+            clusters = get_configured_clusters()
+            if name not in clusters:
+                raise ValueError(f"Unknown Strelka cluster: {name}")
+            balancer = create_strelka_balancer(name, clusters[name])
+            _balancers[name] = balancer
+    return balancer
+
+
+def get_strelka_stats() -> List[Dict[str, Any]]:
+    """
+    Returns usage counters for every Strelka balancer created by this process.
+    """
+    return [balancer.stats() for balancer in list(_balancers.values())]
+
+
+@atexit.register
+def close_strelka_balancers() -> None:
+    """
+    Closes all shared Strelka balancers. Registered to run at interpreter exit.
+    """
+    with _balancers_lock:
+        for balancer in _balancers.values():
+            balancer.close()
+        _balancers.clear()
@@ -1,25 +1,111 @@
+from concurrent.futures import CancelledError
+from functools import lru_cache
 from importlib.metadata import version
-import json
 import os
 import socket
-from typing import Dict, List, Union
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union
 
 import grpc
 from flask import current_app
 
 import strelka_ui.strelka.strelka_pb2 as strelka_pb2
-import strelka_ui.strelka.strelka_pb2_grpc as strelka_pb2_grpc
+from strelka_ui.services import json_codec
+from strelka_ui.services.deadline import ScanCancelled, ScanDeadline
+from strelka_ui.strelka.client import StrelkaBalancer
+
+
+# Bounds for adaptive chunk sizing. Larger chunks mean fewer gRPC messages per file,
+# but must stay well under the frontend's 4MB default maximum message size.
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+TARGET_CHUNK_COUNT = 64
+
+
+@lru_cache(maxsize=1)
+def get_client_metadata() -> Dict[str, str]:
+    """
+    Returns the client identification metadata attached to every submission.
+    Resolved once per process, as the hostname and package version do not change.
+
+    Returns:
+        Dict[str, str]: The client metadata fields.
+    """
+    client_metadata = {
+        "client_name": "fileshot-webui",
+        "client_hostname": socket.gethostname(),
+        "client_version": version("strelka-ui"),
+    }
+
+    if os.environ.get("ENV"):
+        client_metadata["client_environment"] = os.environ.get("ENV")
+
+    return client_metadata
+
+
+def get_chunk_size(setting: Union[str, int], size: Optional[int] = None) -> int:
+    """
+    Resolves the chunk size to use when streaming a file to Strelka.
+
+    Args:
+        setting (Union[str, int]): A fixed chunk size in bytes, or "auto" to size chunks from the file size.
+        size (Optional[int]): The size of the file in bytes, if known.
+
+    Returns:
+        int: The chunk size in bytes.
+    """
+    if str(setting).lower() != "auto":
+        return max(1, int(setting))
+
+    if not size:
+        return MIN_CHUNK_SIZE
+
+    # Aim for roughly TARGET_CHUNK_COUNT messages, rounded up to a whole MIN_CHUNK_SIZE
+    chunk = -(-size // TARGET_CHUNK_COUNT)
+    chunk = -(-chunk // MIN_CHUNK_SIZE) * MIN_CHUNK_SIZE
+    return min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, chunk))
+
+
+def iter_chunks(data: Union[bytes, BinaryIO], chunk: int) -> Iterator[bytes]:
+    """
+    Generator function that yields the file contents in chunks.
+
+    In-memory data is walked through a memoryview, so the only copy made is the
+    chunk handed to protobuf (which requires bytes), never an intermediate slice
+    of the whole buffer.
+
+    Args:
+        data (Union[bytes, BinaryIO]): The file contents, or a readable stream positioned at the start of the file.
+        chunk (int): The maximum size of each chunk.
+
+    Yields:
+        bytes: The next chunk of file data.
+    """
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        with memoryview(data) as view:
+            for c in range(0, len(view), chunk):
+                yield view[c : c + chunk].tobytes()
+        return
+
+    while True:
+        buffer = data.read(chunk)
+        if not buffer:
+            return
+        yield buffer
 
 
 def yield_file(
-    filename: str, data: bytes, metadata: Dict[str, Union[str, int]], chunk: int = 8192, bypass_gatekeeper: bool = False
+    filename: str, data: Union[bytes, BinaryIO], metadata: Dict[str, Union[str, int]], chunk: int = MIN_CHUNK_SIZE, bypass_gatekeeper: bool = False
 ) -> strelka_pb2.ScanFileRequest:
     """
     Generator function that yields ScanFileRequest for the given filename and data.
+    When given a stream, data is read lazily so only one chunk is held in memory at a time.
+
+    The Strelka frontend takes the request and attributes from the first message of
+    the stream, so they are only attached there and later messages carry data alone.
 
     Args:
         filename (str): The name of the file to scan.
-        data (bytes): The file contents.
+        data (Union[bytes, BinaryIO]): The file contents, or a readable stream of them.
         metadata (Dict[str, Union[str, int]]): The metadata associated with the file.
         chunk (int): The chunk size to use when streaming the file data.
         bypass_gatekeeper (bool): If True, bypasses gatekeeper caching for this request.
@@ -28,59 +114,178 @@ def yield_file(
         strelka_pb2.ScanFileRequest: A ScanFileRequest object for each chunk of file data.
     """
 
-    metadata.update({
-        "client_name": "fileshot-webui",
-        "client_hostname": socket.gethostname(),
-        "client_version": version("strelka-ui"),
-    })
-
-    if os.environ.get("ENV"):
-        metadata.update({
-            "client_environment": os.environ.get("ENV"),
-        })
+    metadata.update(get_client_metadata())
 
-    for c in range(0, len(data), chunk):
+    chunks = iter_chunks(data, chunk)
+    for buffer in chunks:
         yield strelka_pb2.ScanFileRequest(
-            data=data[c : c + chunk],
+            data=buffer,
             request=strelka_pb2.Request(client="fileshot-webui", gatekeeper=not bypass_gatekeeper),
             attributes=strelka_pb2.Attributes(filename=filename, metadata=metadata),
         )
+        break
+
+    for buffer in chunks:
+        yield strelka_pb2.ScanFileRequest(data=buffer)
+
+
+def stream_file_to_strelka(
+    filename: str,
+    data: Union[bytes, BinaryIO],
+    balancer: StrelkaBalancer,
+    metadata: Dict[str, Union[str, int]],
+    bypass_gatekeeper: bool = False,
+    size: Optional[int] = None,
+    deadline: Optional[ScanDeadline] = None,
+    raw: bool = False,
+) -> Iterator[Union[Dict[str, Any], str]]:
+    """
+    Submit the given file to Strelka for scanning on a frontend chosen by the
+    balancer, yielding each event as soon as Strelka returns it.
+
+    The call's gRPC deadline is whatever remains of the submission's budget,
+    and cancelling that budget (e.g. because the HTTP client went away)
+    cancels the call, as does closing the generator early. If the chosen
+    frontend is unavailable before any event arrives, the file is sent to the
+    next one, once per frontend.
+
+    With STRELKA_CLIENT_MODE set to "aio", the call runs on the shared grpc.aio
+    event loop rather than on the calling thread's own channel.
+
+    Args:
+        filename (str): The name of the file to scan.
+        data (Union[bytes, BinaryIO]): The file contents, or a readable, seekable stream of them.
+        balancer (StrelkaBalancer): The Strelka frontends to submit to.
+        metadata (Dict[str, Union[str, int]]): The metadata associated with the file.
+        bypass_gatekeeper (bool): If True, bypasses gatekeeper caching for this request.
+        size (Optional[int]): The size of the file in bytes, used for adaptive chunk sizing.
+        deadline (Optional[ScanDeadline]): The submission's time budget. Defaults to STRELKA_SCAN_TIMEOUT.
+        raw (bool): If True, yield each event's JSON text exactly as Strelka sent it, unparsed.
+
+    Yields:
+        Union[Dict[str, Any], str]: Each JSON event generated by Strelka.
+
+    Raises:
+        ScanCancelled: If the deadline ran out or was cancelled before the scan finished.
+        grpc.RpcError: If the scan failed for any other reason.
+    """
+    if deadline is None:
+        deadline = ScanDeadline(float(current_app.config["STRELKA_SCAN_TIMEOUT"]))
+
+    chunk = get_chunk_size(current_app.config["STRELKA_CHUNK_SIZE"], size)
+    use_aio = current_app.config["STRELKA_CLIENT_MODE"] == "aio"
+    decode = (lambda event: event) if raw else json_codec.loads
+    start = data.tell() if hasattr(data, "seek") else None
+    tried = []
+
+    while True:
+        deadline.check()
+        received = 0
+
+        try:
+            with balancer.endpoint(exclude=tried) as call:
+                endpoint = call.endpoint
+                tried.append(endpoint)
+                requests = yield_file(filename, data, metadata, chunk=chunk, bypass_gatekeeper=bypass_gatekeeper)
+
+                # Events are yielded inside the call, so note when each arrived
+                # to keep the consumer's time out of the endpoint's latency
+                if use_aio:
+                    for event in endpoint.client.aio().stream_file(
+                        requests, deadline.remaining(), on_cancel=deadline.on_cancel
+                    ):
+                        received += 1
+                        call.responded()
+                        yield decode(event)
+                    call.complete()
+                    return
+
+                with endpoint.client.stub() as stub:
+                    responses = stub.ScanFile(requests, timeout=deadline.remaining())
+                    unregister = deadline.on_cancel(responses.cancel)
+                    try:
+                        for response in responses:
+                            received += 1
+                            call.responded()
+                            yield decode(response.event)
+                        call.complete()
+                        return
+                    finally:
+                        unregister()
+                        # No-op once the call has completed, but stops an abandoned one
+                        responses.cancel()
+
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+                deadline.expire()
+            if deadline.cancelled:
+                current_app.logger.warning("scan of %s stopped: %s", filename, deadline.reason)
+                raise ScanCancelled(deadline.reason, deadline.status_code) from e
+
+            # An unreachable frontend scanned nothing, so the file can go to another one
+            if (
+                e.code() == grpc.StatusCode.UNAVAILABLE
+                and not received
+                and len(tried) < len(balancer.endpoints)
+                and (start is not None or isinstance(data, (bytes, bytearray, memoryview)))
+            ):
+                current_app.logger.warning(
+                    "%s unavailable for %s, trying another frontend", tried[-1].target, filename
+                )
+                if start is not None:
+                    data.seek(start)
+                continue
+
+            raise
+
+        except CancelledError as e:
+            # The asynchronous call was cancelled through the deadline
+            current_app.logger.warning("scan of %s stopped: %s", filename, deadline.reason)
+            raise ScanCancelled(deadline.reason, deadline.status_code) from e
 
 
 def submit_file_to_strelka(
-    filename: str, data: bytes, host: str, metadata: Dict[str, Union[str, int]], bypass_gatekeeper: bool = False
+    filename: str,
+    data: Union[bytes, BinaryIO],
+    balancer: StrelkaBalancer,
+    metadata: Dict[str, Union[str, int]],
+    bypass_gatekeeper: bool = False,
+    size: Optional[int] = None,
+    deadline: Optional[ScanDeadline] = None,
 ) -> Union[List[Dict[str, Union[str, int]]], str]:
     """
-    Submit the given file to Strelka for scanning.
+    Submit the given file to Strelka for scanning and wait for every event.
+    See stream_file_to_strelka for how frontends and the deadline are handled.
 
     Args:
         filename (str): The name of the file to scan.
-        data (bytes): The file contents.
-        host (str): The URL of the Strelka service to connect to.
+        data (Union[bytes, BinaryIO]): The file contents, or a readable, seekable stream of them.
+        balancer (StrelkaBalancer): The Strelka frontends to submit to.
         metadata (Dict[str, Union[str, int]]): The metadata associated with the file.
         bypass_gatekeeper (bool): If True, bypasses gatekeeper caching for this request.
+        size (Optional[int]): The size of the file in bytes, used for adaptive chunk sizing.
+        deadline (Optional[ScanDeadline]): The submission's time budget. Defaults to STRELKA_SCAN_TIMEOUT.
 
     Returns:
         Union[List[Dict[str, Union[str, int]]], str]: A list of JSON events generated by Strelka, or an empty string if an error occurred.
+
+    Raises:
+        ScanCancelled: If the deadline ran out or was cancelled before the scan finished.
     """
     try:
-        if current_app.config["STRELKA_CERT"]:
-            with open(current_app.config["STRELKA_CERT"], "rb") as f:
-                cert = f.read()
-            credentials = grpc.ssl_channel_credentials(cert)
-            with grpc.secure_channel(target=host, credentials=credentials) as chan:
-                stub = strelka_pb2_grpc.FrontendStub(chan)
-                responses = stub.ScanFile(
-                    yield_file(filename, data, metadata, bypass_gatekeeper=bypass_gatekeeper), timeout=960
-                )
-                return [json.loads(response.event) for response in responses]
-
-        else:
-            chan = grpc.insecure_channel(host)
-            stub = strelka_pb2_grpc.FrontendStub(chan)
-            responses = stub.ScanFile(yield_file(filename, data, metadata, bypass_gatekeeper=bypass_gatekeeper), timeout=960)
-            return [json.loads(response.event) for response in responses]
-
+        return list(
+            stream_file_to_strelka(
+                filename,
+                data,
+                balancer,
+                metadata,
+                bypass_gatekeeper=bypass_gatekeeper,
+                size=size,
+                deadline=deadline,
+            )
+        )
+    except ScanCancelled:
+        raise
     except Exception as e:
         current_app.logger.error("error submitting %s: %s", filename, e)
         return ""
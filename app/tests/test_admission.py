@@ -0,0 +1,213 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask, session
+
+from strelka_ui.services.admission import (
+    BULK_LANE,
+    INTERACTIVE_LANE,
+    AdmissionController,
+    AdmissionLane,
+    AdmissionRejected,
+    get_submission_key,
+    parse_lane_settings,
+)
+from strelka_ui.services.auth import API_KEY_HEADER, SESSION_USER_ID_KEY
+
+
+def wait_for(predicate, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end, "condition not reached"
+        time.sleep(0.001)
+
+
+def hold(controller, user_key, lane=INTERACTIVE_LANE, background=False):
+    """
+    Holds a slot on a thread until the returned event is set.
+    """
+    release = threading.Event()
+    admitted = threading.Event()
+    errors = []
+
+    def run():
+        try:
+            with controller.admit(user_key, lane, background=background):
+                admitted.set()
+                release.wait(5)
+        except AdmissionRejected as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, admitted, release, errors
+
+
+def test_no_limits_admit_everything():
+    controller = AdmissionController(0, 0, 0)
+    held = [hold(controller, "user") for _ in range(20)]
+    for _, admitted, _, _ in held:
+        assert admitted.wait(5)
+    assert controller.stats()["in_flight"] == 20
+
+    for thread, _, release, _ in held:
+        release.set()
+        thread.join(5)
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_per_user_limit_rejects_at_once_and_is_per_key():
+    controller = AdmissionController(0, 1, 30)
+    thread, admitted, release, _ = hold(controller, "alice")
+    assert admitted.wait(5)
+
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected):
+        with controller.admit("alice"):
+            pass
+    assert time.monotonic() - started < 1
+
+    # Other keys have their own limit
+    with controller.admit("bob"):
+        pass
+
+    release.set()
+    thread.join(5)
+    with controller.admit("alice"):
+        pass
+
+
+def test_background_work_skips_the_per_user_limit():
+    controller = AdmissionController(0, 1, 0)
+    with controller.admit("alice"):
+        with controller.admit("alice", BULK_LANE, background=True):
+            assert controller.stats()["in_flight"] == 2
+
+
+def test_total_limit_rejects_after_waiting():
+    controller = AdmissionController(1, 0, 0.05)
+    thread, admitted, release, _ = hold(controller, "alice")
+    assert admitted.wait(5)
+
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected) as excinfo:
+        with controller.admit("bob"):
+            pass
+    assert time.monotonic() - started >= 0.05
+    assert excinfo.value.retry_after == 1
+    assert controller.stats()["waiting"] == 0
+
+    release.set()
+    thread.join(5)
+
+
+def test_waiter_is_admitted_when_a_slot_frees():
+    controller = AdmissionController(1, 0, 5)
+    first, first_admitted, first_release, _ = hold(controller, "alice")
+    assert first_admitted.wait(5)
+
+    second, second_admitted, second_release, errors = hold(controller, "bob")
+    wait_for(lambda: controller.stats()["waiting"] == 1)
+    assert not second_admitted.is_set()
+
+    first_release.set()
+    assert second_admitted.wait(5)
+    second_release.set()
+    first.join(5)
+    second.join(5)
+    assert errors == []
+
+
+def test_slot_is_released_when_the_block_raises():
+    controller = AdmissionController(1, 1, 0)
+    with pytest.raises(RuntimeError):
+        with controller.admit("alice"):
+            raise RuntimeError("scan failed")
+
+    stats = controller.stats()
+    assert stats["in_flight"] == 0
+    assert stats["users"] == 0
+    with controller.admit("alice"):
+        pass
+
+
+def test_submission_key_separates_api_keys_from_the_ui_session():
+    app = Flask(__name__)
+    app.secret_key = "test"
+    user = SimpleNamespace(id=7, user_cn="alice")
+
+    with app.test_request_context(headers={API_KEY_HEADER: "key-1"}):
+        assert get_submission_key(user) == ("api_key", "key-1")
+
+    with app.test_request_context():
+        session[SESSION_USER_ID_KEY] = user.id
+        session["user_cn"] = user.user_cn
+        assert get_submission_key(user) == 7
+
+
+def lanes(**settings):
+    return {
+        name: AdmissionLane(name, weight, limit) for name, (weight, limit) in settings.items()
+    }
+
+
+def test_lane_limit_keeps_bulk_from_taking_every_slot():
+    controller = AdmissionController(4, 0, 0.05, lanes(interactive=(1, 0), bulk=(1, 1)))
+    thread, admitted, release, _ = hold(controller, "robot", BULK_LANE)
+    assert admitted.wait(5)
+
+    # A second bulk submission waits for the lane even though slots are free
+    with pytest.raises(AdmissionRejected):
+        with controller.admit("robot-2", BULK_LANE):
+            pass
+
+    with controller.admit("analyst", INTERACTIVE_LANE):
+        assert controller.stats()["lanes"]["bulk"]["in_flight"] == 1
+
+    release.set()
+    thread.join(5)
+    assert controller.stats()["lanes"]["bulk"]["rejected"] == 1
+
+
+def test_waiting_lanes_share_freed_slots_by_weight():
+    controller = AdmissionController(1, 0, 5, lanes(interactive=(3, 0), bulk=(1, 0)))
+    holder, admitted, release, _ = hold(controller, "holder")
+    assert admitted.wait(5)
+
+    order = []
+
+    def wait_in(lane):
+        with controller.admit(lane, lane, background=True):
+            order.append(lane)
+
+    waiters = []
+    for lane in [BULK_LANE] * 4 + [INTERACTIVE_LANE] * 4:
+        thread = threading.Thread(target=wait_in, args=(lane,))
+        thread.start()
+        waiters.append(thread)
+        wait_for(lambda n=len(waiters): controller.stats()["waiting"] == n)
+
+    release.set()
+    holder.join(5)
+    for thread in waiters:
+        thread.join(5)
+
+    assert len(order) == 8
+    # Interactive arrived last but gets three of every four slots
+    assert order[:4].count(INTERACTIVE_LANE) == 3
+
+
+def test_lanes_are_not_scheduled_without_a_total_limit():
+    controller = AdmissionController(0, 0, 0, lanes(bulk=(1, 1)))
+    with controller.admit("robot", BULK_LANE):
+        with controller.admit("robot-2", BULK_LANE):
+            assert controller.stats()["lanes"]["bulk"]["in_flight"] == 2
+
+
+def test_parse_lane_settings():
+    assert parse_lane_settings("interactive=8, bulk=1,,resubmission=") == {
+        "interactive": 8,
+        "bulk": 1,
+    }
@@ -0,0 +1,222 @@
+from collections import Counter
+from types import SimpleNamespace
+
+import grpc
+import pytest
+
+from strelka_ui.services.deadline import ScanCancelled
+from strelka_ui.strelka import client as client_module
+from strelka_ui.strelka.client import StrelkaBalancer, StrelkaEndpoint
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, code):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(client_module, "time", clock)
+    return clock
+
+
+def endpoint(target, weight=1):
+    return StrelkaEndpoint(SimpleNamespace(target=target), weight)
+
+
+def fail(balancer, code=grpc.StatusCode.UNAVAILABLE, **kwargs):
+    with pytest.raises(FakeRpcError):
+        with balancer.endpoint(**kwargs):
+            raise FakeRpcError(code)
+
+
+def test_least_outstanding_picks_the_least_busy_endpoint(clock):
+    a, b = endpoint("a"), endpoint("b")
+    balancer = StrelkaBalancer("test", [a, b])
+
+    with balancer.endpoint() as first:
+        with balancer.endpoint() as second:
+            assert {first.endpoint, second.endpoint} == {a, b}
+    assert a.in_flight == b.in_flight == 0
+
+
+def test_weighted_round_robin_follows_weights(clock):
+    a, b = endpoint("a", 2), endpoint("b", 1)
+    balancer = StrelkaBalancer("test", [a, b], policy="weighted_round_robin")
+
+    picks = []
+    for _ in range(30):
+        with balancer.endpoint() as call:
+            picks.append(call.endpoint.target)
+
+    assert Counter(picks) == {"a": 20, "b": 10}
+    # Smooth round robin interleaves rather than sending bursts
+    assert picks[:3] == ["a", "b", "a"]
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        StrelkaBalancer("test", [endpoint("a")], policy="random")
+
+
+def test_endpoint_is_ejected_after_consecutive_failures(clock):
+    a, b = endpoint("a"), endpoint("b")
+    balancer = StrelkaBalancer("test", [a, b], eject_after=2, eject_seconds=30)
+
+    fail(balancer, exclude=[b])
+    assert a.state == "healthy"
+    fail(balancer, exclude=[b])
+    assert a.state == "ejected"
+    assert a.ejections == 1
+
+    # Ejected endpoints are skipped while a healthy one remains
+    for _ in range(3):
+        with balancer.endpoint() as call:
+            assert call.endpoint is b
+
+
+def test_successful_probe_restores_an_ejected_endpoint(clock):
+    a, b = endpoint("a"), endpoint("b")
+    balancer = StrelkaBalancer("test", [a, b], eject_after=1, eject_seconds=30)
+    fail(balancer, exclude=[b])
+    assert a.state == "ejected"
+
+    clock.advance(31)
+    with balancer.endpoint(exclude=[b]) as call:
+        assert call.endpoint is a
+        assert a.state == "probing"
+        # Only one probe at a time
+        with balancer.endpoint() as other:
+            assert other.endpoint is b
+    assert a.state == "healthy"
+    assert a.consecutive_failures == 0
+
+
+def test_failed_probe_ejects_again(clock):
+    a, b = endpoint("a"), endpoint("b")
+    balancer = StrelkaBalancer("test", [a, b], eject_after=3, eject_seconds=30)
+    for _ in range(3):
+        fail(balancer, exclude=[b])
+
+    clock.advance(31)
+    fail(balancer, exclude=[b])
+    assert a.state == "ejected"
+    assert a.ejected_until == clock.now + 30
+    assert a.failures == 4
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        ScanCancelled("Client disconnected", 499),
+        GeneratorExit(),
+        FakeRpcError(grpc.StatusCode.CANCELLED),
+        FakeRpcError(grpc.StatusCode.DEADLINE_EXCEEDED),
+    ],
+)
+def test_cancelled_probe_is_neither_success_nor_failure(clock, error):
+    a, b = endpoint("a"), endpoint("b")
+    balancer = StrelkaBalancer("test", [a, b], eject_after=1, eject_seconds=30)
+    fail(balancer, exclude=[b])
+    clock.advance(31)
+
+    with pytest.raises(type(error)):
+        with balancer.endpoint(exclude=[b]) as call:
+            assert a.state == "probing"
+            raise error
+
+    assert call.endpoint is a
+    assert a.state == "ejected"
+    assert a.failures == 1
+    assert a.latency_ms is None
+    assert a.in_flight == 0
+
+    # It can be probed again straight away
+    with balancer.endpoint(exclude=[b]) as call:
+        assert call.endpoint is a
+    assert a.state == "healthy"
+
+
+def test_cancellation_does_not_reset_consecutive_failures(clock):
+    a = endpoint("a")
+    balancer = StrelkaBalancer("test", [a], eject_after=3)
+    fail(balancer)
+    fail(balancer)
+
+    with pytest.raises(ScanCancelled):
+        with balancer.endpoint():
+            raise ScanCancelled("Scan did not finish", 504)
+    assert a.consecutive_failures == 2
+
+    fail(balancer)
+    assert a.state == "ejected"
+
+
+def test_rejected_request_counts_as_a_response(clock):
+    a = endpoint("a")
+    balancer = StrelkaBalancer("test", [a], eject_after=1)
+    fail(balancer, code=grpc.StatusCode.INVALID_ARGUMENT)
+    assert a.state == "healthy"
+    assert a.failures == 0
+
+
+def test_completed_call_is_a_success_even_if_closed_afterwards(clock):
+    a = endpoint("a")
+    balancer = StrelkaBalancer("test", [a], eject_after=1)
+    a.consecutive_failures = 1
+
+    with pytest.raises(GeneratorExit):
+        with balancer.endpoint() as call:
+            call.responded()
+            call.complete()
+            raise GeneratorExit()
+    assert a.consecutive_failures == 0
+    assert a.latency_ms == 0
+
+
+def test_latency_runs_to_the_last_response(clock):
+    a = endpoint("a")
+    balancer = StrelkaBalancer("test", [a])
+
+    with balancer.endpoint() as call:
+        clock.advance(0.05)
+        call.responded()
+        clock.advance(0.05)
+        call.responded()
+        call.complete()
+        # Time the caller spends with the results is not the endpoint's
+        clock.advance(10)
+
+    assert a.last_latency_ms == pytest.approx(100)
+    assert a.latency_ms == pytest.approx(100)
+
+    with balancer.endpoint() as call:
+        clock.advance(0.2)
+        call.complete()
+    # Moving average with LATENCY_SMOOTHING
+    assert a.latency_ms == pytest.approx(100 + client_module.LATENCY_SMOOTHING * 100)
+
+
+def test_every_endpoint_ejected_still_returns_one(clock):
+    a = endpoint("a")
+    balancer = StrelkaBalancer("test", [a], eject_after=1, eject_seconds=30)
+    fail(balancer)
+    assert a.state == "ejected"
+
+    with balancer.endpoint() as call:
+        assert call.endpoint is a
@@ -0,0 +1,102 @@
+import threading
+
+import pytest
+
+from strelka_ui.services import ratelimit
+from strelka_ui.services.ratelimit import TokenBucket
+
+
+class FakeTime:
+    """
+    Stands in for the time module. Sleeps are recorded rather than taken so
+    the test decides how much time passes between acquisitions.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeTime()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def test_bursts_up_to_capacity_without_waiting(clock):
+    bucket = TokenBucket(4, per=60)
+    for _ in range(4):
+        assert bucket.acquire()
+    assert clock.sleeps == []
+    assert bucket.stats()["tokens"] == 0
+
+
+def test_waits_for_the_next_token_once_empty(clock):
+    bucket = TokenBucket(4, per=60)
+    for _ in range(4):
+        bucket.acquire()
+
+    assert bucket.acquire()
+    assert clock.sleeps == [pytest.approx(15)]
+
+
+def test_waiting_callers_are_served_in_arrival_order(clock):
+    bucket = TokenBucket(2, per=60, capacity=1)
+    bucket.acquire()
+
+    for _ in range(3):
+        assert bucket.acquire()
+    # Each caller reserves the token after the one promised before it
+    assert clock.sleeps == [pytest.approx(30), pytest.approx(60), pytest.approx(90)]
+    assert bucket.stats()["waited_seconds"] == pytest.approx(180)
+
+
+def test_refills_over_time_up_to_capacity(clock):
+    bucket = TokenBucket(4, per=60)
+    for _ in range(4):
+        bucket.acquire()
+
+    clock.advance(30)
+    assert bucket.stats()["tokens"] == 2
+    clock.advance(600)
+    assert bucket.stats()["tokens"] == 4
+
+
+def test_rejects_when_no_token_is_due_within_the_timeout(clock):
+    bucket = TokenBucket(1, per=60)
+    assert bucket.acquire(timeout=0)
+
+    assert not bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=59)
+    assert clock.sleeps == []
+
+    # A rejected caller does not use up a token
+    clock.advance(60)
+    assert bucket.acquire(timeout=0)
+
+    stats = bucket.stats()
+    assert stats["acquired"] == 2
+    assert stats["rejected"] == 2
+
+
+def test_concurrent_callers_never_exceed_the_rate(clock):
+    bucket = TokenBucket(5, per=60)
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    # Five from the burst, then one every 12 seconds
+    assert sorted(clock.sleeps) == [pytest.approx(12 * n) for n in range(1, 16)]
+    assert bucket.stats()["acquired"] == 20
@@ -0,0 +1,184 @@
+import threading
+import time
+
+import pytest
+
+from strelka_ui.services.deadline import CLIENT_CLOSED_REQUEST, ScanCancelled, ScanDeadline
+from strelka_ui.services.singleflight import SingleFlight
+
+
+def wait_for(predicate, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end, "condition not reached"
+        time.sleep(0.001)
+
+
+def start_leader(flight, key, release, result="result"):
+    """
+    Starts a call that runs until release is set, returning its thread and outcome.
+    """
+    outcome = {}
+
+    def fn():
+        release.wait(5)
+        return result
+
+    def run():
+        outcome["value"] = flight.do(key, fn)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    wait_for(lambda: flight.stats()["in_flight"] == 1)
+    return thread, outcome
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader, outcome = start_leader(flight, "k", release)
+
+    calls = []
+    results = []
+
+    def follower():
+        results.append(flight.do("k", lambda: calls.append(1)))
+
+    followers = [threading.Thread(target=follower) for _ in range(5)]
+    for thread in followers:
+        thread.start()
+    wait_for(lambda: flight.stats()["waiting"] == 5)
+
+    release.set()
+    leader.join(5)
+    for thread in followers:
+        thread.join(5)
+
+    assert outcome["value"] == ("result", False)
+    assert results == [("result", True)] * 5
+    assert calls == []
+    assert flight.stats() == {
+        "in_flight": 0,
+        "waiting": 0,
+        "leaders": 1,
+        "followers": 5,
+        "abandoned": 0,
+    }
+
+
+def test_followers_receive_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fn():
+        release.wait(5)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flight.do("k", fn)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    wait_for(lambda: flight.stats()["in_flight"] == 1)
+    follower = threading.Thread(target=call)
+    follower.start()
+    wait_for(lambda: flight.stats()["waiting"] == 1)
+
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(errors) == 2
+    assert errors[0] is errors[1]
+
+
+def test_results_are_not_cached():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == (1, False)
+    assert flight.do("k", lambda: 2) == (2, False)
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader, _ = start_leader(flight, "a", release)
+    try:
+        assert flight.do("b", lambda: "b") == ("b", False)
+    finally:
+        release.set()
+        leader.join(5)
+
+
+def test_follower_stops_waiting_when_its_deadline_runs_out():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader, outcome = start_leader(flight, "k", release)
+
+    started = time.monotonic()
+    with pytest.raises(ScanCancelled) as excinfo:
+        flight.do("k", lambda: "unused", deadline=ScanDeadline(0.05))
+    elapsed = time.monotonic() - started
+
+    assert excinfo.value.status_code == 504
+    assert elapsed < 2
+    stats = flight.stats()
+    assert stats["waiting"] == 0
+    assert stats["abandoned"] == 1
+
+    # The leader is unaffected by the follower giving up
+    release.set()
+    leader.join(5)
+    assert outcome["value"] == ("result", False)
+
+
+def test_follower_stops_waiting_when_its_deadline_is_cancelled():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader, _ = start_leader(flight, "k", release)
+
+    deadline = ScanDeadline(30)
+    errors = []
+
+    def follower():
+        try:
+            flight.do("k", lambda: "unused", deadline=deadline)
+        except ScanCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=follower)
+    thread.start()
+    wait_for(lambda: flight.stats()["waiting"] == 1)
+
+    deadline.cancel("Client disconnected", CLIENT_CLOSED_REQUEST)
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert errors[0].status_code == CLIENT_CLOSED_REQUEST
+    assert flight.stats()["abandoned"] == 1
+
+    release.set()
+    leader.join(5)
+
+
+def test_follower_with_deadline_gets_result_in_time():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader, _ = start_leader(flight, "k", release)
+
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(flight.do("k", lambda: "unused", deadline=ScanDeadline(30)))
+    )
+    thread.start()
+    wait_for(lambda: flight.stats()["waiting"] == 1)
+
+    release.set()
+    leader.join(5)
+    thread.join(5)
+
+    assert results == [("result", True)]
+    assert flight.stats()["abandoned"] == 0
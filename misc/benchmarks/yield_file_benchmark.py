@@ -0,0 +1,85 @@
+"""
+Compares ScanFile request framing before and after chunk/attribute changes.
+
+Reports the bytes that would go on the wire (serialized messages plus the
+5 byte gRPC length prefix per message) and the CPU time spent per MB to build
+and serialize the request stream.
+
+Run from ./app so strelka_ui is importable:
+    python ../misc/benchmarks/yield_file_benchmark.py --size-mb 50
+"""
+
+import argparse
+import os
+import socket
+import time
+from importlib.metadata import PackageNotFoundError, version
+
+import strelka_ui.strelka.strelka_pb2 as strelka_pb2
+from strelka_ui.strelka.submit_to_strelka import get_chunk_size, yield_file
+
+GRPC_PREFIX_BYTES = 5
+
+
+def legacy_yield_file(filename, data, metadata, chunk=8192, bypass_gatekeeper=False):
+    # The framing used before: 8KB slices, with request and attributes (and the
+    # hostname/version lookups) rebuilt for every chunk.
+    for c in range(0, len(data), chunk):
+        metadata.update({
+            "client_name": "fileshot-webui",
+            "client_hostname": socket.gethostname(),
+            "client_version": client_version(),
+        })
+        yield strelka_pb2.ScanFileRequest(
+            data=data[c : c + chunk],
+            request=strelka_pb2.Request(client="fileshot-webui", gatekeeper=not bypass_gatekeeper),
+            attributes=strelka_pb2.Attributes(filename=filename, metadata=metadata),
+        )
+
+
+def client_version():
+    try:
+        return version("strelka-ui")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def measure(messages):
+    start = time.process_time()
+    count = 0
+    wire_bytes = 0
+    for message in messages:
+        wire_bytes += len(message.SerializeToString()) + GRPC_PREFIX_BYTES
+        count += 1
+    return count, wire_bytes, time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=int, default=50)
+    parser.add_argument("--chunk-size", default="auto")
+    args = parser.parse_args()
+
+    data = os.urandom(args.size_mb * 1024 * 1024)
+    metadata = {"user_name": "benchmark", "client_user_name": "benchmark"}
+    chunk = get_chunk_size(args.chunk_size, len(data))
+
+    results = {
+        "before (8KB, attributes per chunk)": measure(
+            legacy_yield_file("sample.bin", data, dict(metadata))
+        ),
+        f"after ({chunk // 1024}KB, attributes once)": measure(
+            yield_file("sample.bin", data, dict(metadata), chunk=chunk)
+        ),
+    }
+
+    print(f"payload: {len(data)} bytes")
+    for name, (count, wire_bytes, cpu) in results.items():
+        print(
+            f"{name}: {count} messages, {wire_bytes} bytes on the wire "
+            f"({wire_bytes - len(data)} overhead), {cpu / args.size_mb * 1000:.2f} ms CPU/MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
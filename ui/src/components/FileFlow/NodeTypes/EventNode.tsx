@@ -259,7 +259,7 @@ const EventNode = memo(({ data, selected }: EventNodeProps) => {
   const [isBlurred] = useState(!!data.nodeQrData)
   const [vtStatus, setVtStatus] = useState('...')
   const [vtColor, setVtColor] = useState<
-    'default' | 'success' | 'warning' | 'error'
+    'default' | 'success' | 'warning' | 'error' | 'processing'
   >('default')
 
   const previewStyle = isBlurred ? { filter: 'blur(4px)' } : {}
@@ -285,6 +285,9 @@ const EventNode = memo(({ data, selected }: EventNodeProps) => {
       } else if (virusTotalResponse === -3) {
         setVtStatus('Exceeded VirusTotal Limit')
         setVtColor('warning')
+      } else if (virusTotalResponse === -4) {
+        setVtStatus('VirusTotal Lookup Pending')
+        setVtColor('processing')
       } else if (virusTotalResponse > 5) {
         setVtStatus(`${virusTotalResponse} Positives`)
         setVtColor('error')
@@ -9,6 +9,40 @@ interface VirusTotalUploaderProps {
   onUploadSuccess: () => void
 }
 
+// Hashes are downloaded from VirusTotal in the background; poll the job until it finishes
+const JOB_POLL_INTERVAL = 2000
+const JOB_POLL_MAX_INTERVAL = 10000
+
+const waitForJob = async (jobId: string) => {
+  let interval = JOB_POLL_INTERVAL
+  for (;;) {
+    await new Promise((resolve) => setTimeout(resolve, interval))
+    interval = Math.min(interval * 2, JOB_POLL_MAX_INTERVAL)
+
+    const response = await fetchWithTimeout(
+      `${APP_CONFIG.BACKEND_URL}/strelka/jobs/${jobId}`,
+      {
+        method: 'GET',
+        mode: 'cors',
+        credentials: 'include',
+        timeout: APP_CONFIG.API_TIMEOUT,
+      },
+    )
+    const job = await response.json()
+    if (!response.ok) {
+      throw new Error(job.details || 'Error occurred while checking submission')
+    }
+    if (job.status === 'succeeded') {
+      return job
+    }
+    if (job.status === 'failed') {
+      throw new Error(
+        job.result?.details || 'Error occurred while submitting hash',
+      )
+    }
+  }
+}
+
 const VirusTotalUploader = (props: VirusTotalUploaderProps) => {
   const { onUploadSuccess } = props
   const [form] = Form.useForm()
@@ -26,7 +60,8 @@ const VirusTotalUploader = (props: VirusTotalUploaderProps) => {
         }
 
         // TODO: move this to a service
-        fetchWithTimeout(`${APP_CONFIG.BACKEND_URL}/strelka/upload`, {
+        // Asynchronous, as VirusTotal can take minutes to prepare the download
+        fetchWithTimeout(`${APP_CONFIG.BACKEND_URL}/strelka/upload?async=true`, {
           method: 'POST',
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify(payload),
@@ -42,7 +77,9 @@ const VirusTotalUploader = (props: VirusTotalUploaderProps) => {
                 )
               })
             }
-            return response.json()
+            return response.json().then((data) =>
+              response.status === 202 ? waitForJob(data.job_id) : data,
+            )
           })
           .then(() => {
             onUploadSuccess() // Trigger table refresh
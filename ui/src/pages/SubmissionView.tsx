@@ -182,6 +182,9 @@ const SubmissionsPage = () => {
         } else if (virustotalPositives === -3) {
           disposition = 'Exceeded VirusTotal Limit for Submission'
           color = 'warning'
+        } else if (virustotalPositives === -4) {
+          disposition = 'VirusTotal Lookup Pending'
+          color = 'processing'
         } else if (virustotalPositives === -2) {
           disposition = 'VirusTotal Not Enabled'
           color = 'default'